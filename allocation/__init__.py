@@ -0,0 +1,57 @@
+"""
+個別指導塾 授業スケジュール自動配置エンジン.
+
+Shared logic used by the Colab cells (colab/) and the scripts (scripts/).
+"""
+
+from allocation.anytime import print_progress, solve_anytime
+from allocation.candidates import build_candidates
+from allocation.decompose import find_components, solve_decomposed
+from allocation.elastic import diagnose_infeasible, print_elastic_report
+from allocation.engines import ENGINES, STATUS_LABELS, is_solution_status, make_engine, mip_gap
+from allocation.inputs import (
+    ALLOCATED_SHEET,
+    DAILY_UTILIZATION_SHEET,
+    FULFILLMENT_SHEET,
+    RUN_RECORD_SHEET,
+    SCENARIO_SHEET,
+    SHEET_NAMES,
+    TEACHER_UTILIZATION_SHEET,
+    UNALLOCATED_SHEET,
+    CsvWorkbook,
+    load_inputs,
+    load_sheets,
+    normalize_inputs,
+    parse_constraint_flags,
+    read_csv_dir,
+    read_existing_csv,
+)
+from allocation.input_cache import SOURCE_LABELS, keep_revision, load_inputs_cached, print_cache_report
+from allocation.lexicographic import solve_lexicographic
+from allocation.lns import solve_lns
+from allocation.model import build_model, solution_keys
+from allocation.model_cache import load_model, load_solution, print_model_cache_report
+from allocation.monitor import RunRecord
+from allocation.prep import prepare_data
+from allocation.report import (
+    build_outputs,
+    fulfillment_summary,
+    outputs_from_keys,
+    print_infeasible_report,
+    print_input_report,
+    utilization_report,
+)
+from allocation.preview import flow_upper_bound, greedy_schedule, preview_schedule, print_preview
+from allocation.rolling import horizon_weeks, solve_rolling
+from allocation.scenarios import print_scenarios, scenario_grid, solve_scenarios
+from allocation.runner import (
+    print_result,
+    print_utilization,
+    run_allocation,
+    run_csv_dir,
+    split_existing,
+    write_outputs,
+)
+from allocation.symmetry import find_symmetry_classes
+from allocation.synthetic import generate_instance, generate_multi_course
+from allocation.warmstart import apply_hint, load_solution_file, print_hint_result, save_solution_file
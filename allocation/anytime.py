@@ -0,0 +1,145 @@
+"""
+Anytime solve with incumbent snapshots.
+
+A long solve used to show nothing until the time limit: a crash or a closed
+Colab tab lost the whole run. solve_anytime() passes an on_incumbent
+callback to engine.solve() (CP-SAT solution callback / SCIP time slices, see
+allocation.engines) and, for every improved schedule, records objective,
+bound, gap and elapsed time and writes a snapshot:
+
+    <prefix>_O01.csv        best schedule so far (solution file layout, so it
+                            can be passed back as HINT_FILE / --hint-file)
+    <prefix>_O03.csv        fulfillment of that schedule
+    <prefix>_progress.csv   one row per incumbent
+
+Files are replaced atomically, so a snapshot is never half written. The
+search stops at the time limit, when the gap falls below gap_limit, or when
+the user interrupts it (Ctrl+C / Colab "stop") - the best schedule found so
+far is kept in every case.
+"""
+
+import os
+import time
+
+import pandas as pd
+
+from allocation.engines import is_solution_status
+from allocation.report import build_outputs
+
+PROGRESS_COLUMNS = ['n', 'elapsed_s', 'objective', 'bound', 'gap_pct', 'lessons']
+
+# スナップショットを書き出す最短間隔（秒）。短時間に解が続く間は進捗の記録だけにする
+SNAPSHOT_INTERVAL = 2.0
+
+
+def snapshot_paths(prefix):
+    """{'O01', 'O03', 'progress'}: the snapshot files of prefix."""
+    return {name: f'{prefix}_{name}.csv' for name in ('O01', 'O03', 'progress')}
+
+
+def _write_csv_atomic(df, path):
+    tmp = f'{path}.tmp'
+    df.to_csv(tmp, index=False, encoding='utf-8')
+    os.replace(tmp, path)
+
+
+def write_snapshot(prefix, outputs, df_progress):
+    """Write the O01 / O03 snapshot of one schedule and the progress table."""
+    paths = snapshot_paths(prefix)
+    os.makedirs(os.path.dirname(os.path.abspath(paths['O01'])), exist_ok=True)
+    df_final, _, _, df_fulfill = outputs
+    _write_csv_atomic(df_final, paths['O01'])
+    _write_csv_atomic(df_fulfill, paths['O03'])
+    _write_csv_atomic(df_progress, paths['progress'])
+
+
+def solve_anytime(data, model, snapshot_prefix=None, gap_limit=None):
+    """
+    Solve the built model and stream every improved incumbent.
+
+    Args:
+        data: output of prep.prepare_data
+        model: output of model.build_model (its engine is solved)
+        snapshot_prefix: path prefix of the snapshot files (None: only
+            record the progress)
+        gap_limit: stop when the relative gap is at most this (0.01 = 1%);
+            None solves to optimality or the time limit
+
+    Returns:
+        dict with 'status', 'values' (x values of the best incumbent, None
+        without one), 'objective', 'bound', 'gap' and 'progress'
+        (DataFrame with PROGRESS_COLUMNS)
+    """
+    engine = model['engine']
+    engine.gap_limit = gap_limit
+    x_vars = list(model['x'].values())
+    progress = []
+    best = {'values': None, 'objective': None, 'bound': None, 'written': -1, 'last_write': 0.0}
+    t0 = time.perf_counter()
+
+    def save(final=False):
+        if snapshot_prefix is None or best['values'] is None or best['written'] == len(progress):
+            return
+        now = time.perf_counter()
+        if not final and now - best['last_write'] < SNAPSHOT_INTERVAL:
+            return
+        outputs = build_outputs(data, model, best['values'])
+        write_snapshot(snapshot_prefix, outputs, pd.DataFrame(progress, columns=PROGRESS_COLUMNS))
+        best['written'], best['last_write'] = len(progress), now
+
+    def on_incumbent(incumbent):
+        objective, bound = incumbent['objective'], incumbent['bound']
+        gap = abs(bound - objective) / max(abs(objective), 1e-9)
+        values = incumbent['values'](x_vars)
+        best.update(values=values, objective=objective, bound=bound)
+        progress.append({
+            'n': len(progress) + 1,
+            'elapsed_s': round(time.perf_counter() - t0, 2),
+            'objective': round(objective, 4),
+            'bound': round(bound, 4),
+            'gap_pct': round(gap * 100, 3),
+            'lessons': int((values > 0.5).sum()),
+        })
+        print(f"    ⏱ {progress[-1]['elapsed_s']:.1f}秒: 目的関数 {objective:.2f} / 上界 {bound:.2f} "
+              f"/ ギャップ {gap:.2%} / 新規 {progress[-1]['lessons']}コマ")
+        save()
+        return gap_limit is not None and gap <= gap_limit
+
+    interrupted = False
+    try:
+        status = engine.solve(on_incumbent)
+    except KeyboardInterrupt:
+        print("    ⏹ 中断しました。ここまでの最良解を使います。")
+        interrupted = True
+        status = 'FEASIBLE' if best['values'] is not None else 'NOT_SOLVED'
+
+    if is_solution_status(status) and not interrupted:
+        # 解が途中で報告されなかった場合（変数なし等）はソルバーの最終解、上界は最後まで探索した値
+        if best['values'] is None:
+            best.update(values=engine.values(x_vars) if x_vars else None, objective=engine.objective_value())
+        best['bound'] = engine.best_bound()
+    save(final=True)
+
+    gap = None
+    if best['objective'] is not None:
+        gap = abs(best['bound'] - best['objective']) / max(abs(best['objective']), 1e-9)
+        # ギャップ基準で止めた場合もソルバーは OPTIMAL を返すので、最適性が示されていなければ FEASIBLE にする
+        if status == 'OPTIMAL' and gap > 1e-6:
+            status = 'FEASIBLE'
+    return {'status': status, 'values': best['values'], 'objective': best['objective'],
+            'bound': best['bound'], 'gap': gap, 'progress': pd.DataFrame(progress, columns=PROGRESS_COLUMNS)}
+
+
+def print_progress(anytime, gap_limit=None, snapshot_prefix=None):
+    """Summary of a solve_anytime result: incumbents, final objective and gap."""
+    progress = anytime['progress']
+    if anytime['objective'] is None:
+        print("  ⏱ 途中解はありませんでした。")
+        return
+    last = f" (最後の改善 {progress['elapsed_s'].iloc[-1]:.1f}秒)" if not progress.empty else ""
+    print(f"  ⏱ 途中解 {len(progress)} 回{last} / 最終: 目的関数 {anytime['objective']:.2f}, "
+          f"上界 {anytime['bound']:.2f}, ギャップ {anytime['gap']:.2%}")
+    if gap_limit is not None and anytime['gap'] <= gap_limit and anytime['status'] != 'OPTIMAL':
+        print(f"  ✅ ギャップが {gap_limit:.2%} 以下になったため終了しました。")
+    if snapshot_prefix:
+        print(f"  💾 スナップショット: {snapshot_paths(snapshot_prefix)['O01']} ほか")
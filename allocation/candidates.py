@@ -0,0 +1,127 @@
+"""
+Columnar candidate-variable builder.
+
+Computes every valid (student, subject, teacher, slot) tuple for the
+allocation model in one batch: requests are joined with I06 as a pandas
+frame, and the I51 x I52 availability intersection (minus the busy slots
+of existing O01 allocations) is evaluated as boolean person x slot
+matrices instead of nested Python loops over requests, teachers and slots.
+"""
+
+import numpy as np
+import pandas as pd
+
+CANDIDATE_COLUMNS = ['sid', 'cid', 'tid', 'slid']
+
+# 1チャンクあたりの (ペア × スロット) セル数の上限
+CHUNK_CELLS = 20_000_000
+
+
+def _int_frame(df, columns, names):
+    """Select columns from df as a clean int64 frame with renamed columns."""
+    if df is None or df.empty or not set(columns) <= set(df.columns):
+        return pd.DataFrame({n: pd.Series(dtype='int64') for n in names})
+    out = df[columns].apply(pd.to_numeric, errors='coerce').dropna().astype('int64')
+    out.columns = names
+    return out.drop_duplicates()
+
+
+def _free_matrix(avail, busy, col, ids, slot_ids):
+    """Boolean (person x slot) matrix of available and not-yet-busy slots."""
+    free = np.zeros((len(ids), len(slot_ids)), dtype=bool)
+    for df, value in [(avail, True), (busy, False)]:
+        df = df[df[col].isin(ids) & df['slid'].isin(slot_ids)]
+        free[np.searchsorted(ids, df[col].to_numpy()),
+             np.searchsorted(slot_ids, df['slid'].to_numpy())] = value
+    return free
+
+
+def requests_frame(requests):
+    """Explode the request list into one (req_idx, sid, cid, tid) row per allowed teacher."""
+    rows = [
+        (idx, req['sid'], req['cid'], tid)
+        for idx, req in enumerate(requests)
+        for tid in req['allowed_teachers']
+    ]
+    return pd.DataFrame(
+        np.array(rows, dtype='int64').reshape(-1, 4),
+        columns=['req_idx', 'sid', 'cid', 'tid'],
+    )
+
+
+def build_candidates(requests, df_teachable, df_s_avail, df_t_avail,
+                     df_existing=None, limit_constraints=None):
+    """
+    Build the candidate (sid, cid, tid, slid) table for the allocation model.
+
+    Equivalent to, for each request and each allowed teacher who can teach
+    the subject and whose max_slot limit is still positive, taking the
+    intersection of student and teacher availability and removing slots
+    already used by the student or the teacher in existing allocations (O01).
+
+    Args:
+        requests: list of {'sid', 'cid', 'sessions', 'allowed_teachers'}
+        df_teachable: I06 (teacher_id, subject_id)
+        df_s_avail: I51 (student_id, slot_id)
+        df_t_avail: I52 (teacher_id, slot_id)
+        df_existing: O01 rows to keep fixed, or None
+        limit_constraints: {(sid, cid, tid): remaining max_slot}
+
+    Returns:
+        DataFrame with int64 columns sid, cid, tid, slid, one row per
+        variable, ordered by request, then allowed-teacher order, then slot.
+    """
+    pairs = requests_frame(requests)
+    pairs['t_order'] = pairs.groupby('req_idx').cumcount()
+
+    # 講師が指導可能な科目のみ
+    teachable = _int_frame(df_teachable, ['teacher_id', 'subject_id'], ['tid', 'cid'])
+    pairs = pairs.merge(teachable, on=['tid', 'cid'], how='inner')
+
+    # max_slot が使い切られた講師を除外
+    if limit_constraints:
+        keys = pd.MultiIndex.from_frame(pairs[['sid', 'cid', 'tid']])
+        limits = pd.Series(limit_constraints, dtype='int64')
+        limits.index = pd.MultiIndex.from_tuples(limits.index, names=['sid', 'cid', 'tid'])
+        pair_limit = limits.reindex(keys).fillna(999).to_numpy()
+        pairs = pairs[pair_limit > 0]
+
+    # 同じ (sid, cid, tid) が重複して指定されていても変数は1つ
+    pairs = pairs.drop_duplicates(['sid', 'cid', 'tid'])
+    pairs = pairs.sort_values(['req_idx', 't_order'], kind='stable')
+
+    s_avail = _int_frame(df_s_avail, ['student_id', 'slot_id'], ['sid', 'slid'])
+    t_avail = _int_frame(df_t_avail, ['teacher_id', 'slot_id'], ['tid', 'slid'])
+    s_busy = _int_frame(df_existing, ['student_id', 'slot_id'], ['sid', 'slid'])
+    t_busy = _int_frame(df_existing, ['teacher_id', 'slot_id'], ['tid', 'slid'])
+
+    # ID を 0 始まりの連番に符号化し、人 × スロットの bool 行列で空きを表現する
+    slot_ids = np.unique(np.concatenate([s_avail['slid'].to_numpy(), t_avail['slid'].to_numpy()]))
+    sid_ids = np.unique(pairs['sid'].to_numpy())
+    tid_ids = np.unique(pairs['tid'].to_numpy())
+    s_free = _free_matrix(s_avail, s_busy, 'sid', sid_ids, slot_ids)
+    t_free = _free_matrix(t_avail, t_busy, 'tid', tid_ids, slot_ids)
+
+    pair_s = np.searchsorted(sid_ids, pairs['sid'].to_numpy())
+    pair_t = np.searchsorted(tid_ids, pairs['tid'].to_numpy())
+
+    # (リクエスト, 講師) ペア × スロット の共通空きを一括計算（メモリ上限のためチャンク分割）
+    n_slots = max(len(slot_ids), 1)
+    chunk = max(1, CHUNK_CELLS // n_slots)
+    pair_idx, slot_idx = [], []
+    for lo in range(0, len(pairs), chunk):
+        hi = min(lo + chunk, len(pairs))
+        p, k = np.nonzero(s_free[pair_s[lo:hi]] & t_free[pair_t[lo:hi]])
+        pair_idx.append(p + lo)
+        slot_idx.append(k)
+    pair_idx = np.concatenate(pair_idx) if pair_idx else np.empty(0, dtype='int64')
+    slot_idx = np.concatenate(slot_idx) if slot_idx else np.empty(0, dtype='int64')
+
+    # np.nonzero は行優先なので (リクエスト順, 講師順, スロット順) に並ぶ
+    cand = pd.DataFrame({
+        'sid': pairs['sid'].to_numpy()[pair_idx],
+        'cid': pairs['cid'].to_numpy()[pair_idx],
+        'tid': pairs['tid'].to_numpy()[pair_idx],
+        'slid': slot_ids[slot_idx] if len(slot_ids) else np.empty(0, dtype='int64'),
+    })
+    return cand[CANDIDATE_COLUMNS]
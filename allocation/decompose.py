@@ -0,0 +1,275 @@
+"""
+Connected-component decomposition of the allocation model.
+
+Students and teachers that can never meet (no candidate variable links
+them, directly or through other people) form independent parts of the
+model: the basic constraints, constraints 1-3, 5, 6 and S1/S2 are all per
+student or per teacher. The only coupling between parts is the booth cap of
+constraint 4 (max_lesson_per_timeslot).
+
+solve_decomposed() therefore
+  1. finds the connected components of the student-teacher candidate graph,
+  2. solves each component as its own small model in a process pool
+     (constraint 4 with the full remaining booth capacity),
+  3. master step: if the merged schedule exceeds the booth cap in some
+     slot, the components using those slots get per-slot booth quotas
+     (the booths split in proportion to their usage) and are re-solved in
+     parallel within their quotas,
+  4. builds the single full model once with x fixed to the merged schedule
+     and solves it, confirming that every constraint holds (this model is
+     returned for build_outputs).
+
+When no slot is over the cap, the merged schedule is optimal whenever
+every component was solved to optimality.
+"""
+
+import collections
+import concurrent.futures
+import contextlib
+import io
+import os
+import time
+
+from allocation.candidates import build_candidates
+from allocation.engines import is_solution_status, make_engine
+from allocation.model import build_model, solution_keys
+
+DEFAULT_PROCESSES = os.cpu_count() or 1
+
+
+def find_components(data):
+    """
+    Connected components of the student-teacher candidate graph.
+
+    Returns:
+        list of (student ids, teacher ids) frozenset pairs, largest first.
+        Students without any candidate are left out (they get no variables).
+    """
+    df_candidates = build_candidates(
+        data['requests'], data['dfs']['teachable'], data['dfs']['student_avail'],
+        data['dfs']['teacher_avail'], data['df_existing'] if data['use_existing'] else None,
+        data['limit_constraints']
+    )
+    edges = df_candidates[['sid', 'tid']].drop_duplicates()
+
+    # Union-Find（生徒は ('s', sid)、講師は ('t', tid) をノードとする）
+    parent = {}
+
+    def find(node):
+        root = node
+        while parent.setdefault(root, root) != root:
+            root = parent[root]
+        while parent[node] != root:
+            parent[node], node = root, parent[node]
+        return root
+
+    for sid, tid in edges.itertuples(index=False, name=None):
+        a, b = find(('s', sid)), find(('t', tid))
+        if a != b:
+            parent[a] = b
+
+    members = collections.defaultdict(lambda: (set(), set()))
+    for node in list(parent):
+        kind, pid = node
+        members[find(node)][0 if kind == 's' else 1].add(pid)
+
+    components = [(frozenset(s), frozenset(t)) for s, t in members.values()]
+    components.sort(key=lambda c: (-(len(c[0]) + len(c[1])), min(c[0])))
+    return components
+
+
+def _sub_data(data, students, teachers, booth_used=None):
+    """data restricted to one component; booth_used adds occupied booths per slot."""
+    sub = dict(data)
+    sub['requests'] = [req for req in data['requests'] if req['sid'] in students]
+    sub['s_map'] = {sid: name for sid, name in data['s_map'].items() if sid in students}
+    sub['t_map'] = {tid: name for tid, name in data['t_map'].items() if tid in teachers}
+    if booth_used:
+        counts = collections.defaultdict(int, data['existing_slot_counts'])
+        for slid, n in booth_used.items():
+            counts[slid] += n
+        sub['existing_slot_counts'] = counts
+    return sub
+
+
+def _solve_component(sub_data, constraint_flags, engine_name, time_limit, num_workers, c5_encoding):
+    """Build and solve one component (runs in a worker process); returns a picklable result."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine = make_engine(engine_name, time_limit, num_workers)
+        model = build_model(sub_data, constraint_flags, engine, c5_encoding)
+        status = engine.solve()
+    solved = is_solution_status(status)
+    return {
+        'status': status,
+        'keys': solution_keys(model) if solved else [],
+        'objective': engine.objective_value() if solved else None,
+        'variables': len(model['x']),
+        'wall_time': engine.wall_time,
+    }
+
+
+def _booth_remaining(data, constraint_flags):
+    """Remaining booths per slot under constraint 4 ({} when it is off)."""
+    c4 = constraint_flags.get('max_lesson_per_timeslot', {})
+    if not c4.get('activated'):
+        return {}
+    return {slid: int(max(0, c4['value'] - data['existing_slot_counts'][slid])) for slid in data['all_slots']}
+
+
+def _split(total, weights):
+    """Split an integer total in proportion to weights (largest remainder)."""
+    weight_sum = sum(weights.values())
+    if weight_sum <= 0:
+        shares = {i: total // len(weights) for i in weights}
+        for i in sorted(weights)[:total - sum(shares.values())]:
+            shares[i] += 1
+        return shares
+    exact = {i: total * w / weight_sum for i, w in weights.items()}
+    shares = {i: int(v) for i, v in exact.items()}
+    for i in sorted(exact, key=lambda i: (shares[i] - exact[i], i))[:total - sum(shares.values())]:
+        shares[i] += 1
+    return shares
+
+
+def _booth_quotas(remaining, usage, group):
+    """
+    Per-slot booth quotas for the components in group.
+
+    usage[i] is the Counter of slots used by component i in the independent
+    solve. Components outside the group keep their usage. In an overflowing
+    slot the booths left for the group are split in proportion to the group's
+    usage; in the other slots each group component keeps its usage and the
+    spare booths are split evenly, so the quotas never exceed the cap.
+    """
+    quotas = {i: {} for i in group}
+    for slid, cap in remaining.items():
+        outside = sum(u[slid] for i, u in usage.items() if i not in group)
+        demand = {i: usage[i][slid] for i in group}
+        free = max(0, cap - outside)
+        if sum(demand.values()) > free:
+            shares = _split(free, demand)
+        else:
+            spare = _split(free - sum(demand.values()), {i: 0 for i in group})
+            shares = {i: demand[i] + spare[i] for i in group}
+        for i in group:
+            quotas[i][slid] = shares[i]
+    return quotas
+
+
+def _solve_all(tasks, constraint_flags, engine_name, time_limit, num_workers, processes, c5_encoding):
+    """Solve {i: sub_data} in a process pool; returns {i: result}."""
+    n_procs = max(1, min(processes, len(tasks)))
+    workers_each = max(1, num_workers // n_procs)
+    results = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=n_procs) as pool:
+        futures = {
+            pool.submit(_solve_component, sub_data, constraint_flags, engine_name,
+                        time_limit, workers_each, c5_encoding): i
+            for i, sub_data in tasks.items()
+        }
+        for future in concurrent.futures.as_completed(futures):
+            results[futures[future]] = future.result()
+    return results
+
+
+def _fix_and_check(data, constraint_flags, engine_name, time_limit, num_workers, chosen, c5_encoding):
+    """Build the full model with x fixed to the merged schedule and solve it."""
+    engine = make_engine(engine_name, time_limit, num_workers)
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = build_model(data, constraint_flags, engine, c5_encoding)
+    engine.fix([(var, 1 if key in chosen else 0) for key, var in model['x'].items()])
+    return engine.solve(), model
+
+
+def solve_decomposed(data, constraint_flags, engine_name='SCIP', time_limit=30, num_workers=8,
+                     processes=None, c5_encoding='pairwise'):
+    """
+    Solve the allocation model component by component.
+
+    Args:
+        data: output of prep.prepare_data
+        constraint_flags: {code: {'activated', 'value'}}
+        engine_name, time_limit: engine and time limit used for every component
+        num_workers: CP-SAT search workers, shared among the processes
+        processes: size of the process pool (default: CPU count)
+        c5_encoding: passed to build_model
+
+    Returns:
+        (status, model) in the same form as engine.solve() / build_model()
+        so build_outputs can be used as is. For a merged schedule the model
+        is the final single-model check (model['merged'] is True, its bound
+        says nothing about the full problem) and the status is 'OPTIMAL'
+        only when every component was solved to optimality and no booth
+        quotas were needed, 'FEASIBLE' otherwise. With a single component,
+        or when a component fails, the full model is solved directly
+        instead.
+    """
+    t0 = time.perf_counter()
+    processes = processes or DEFAULT_PROCESSES
+    components = find_components(data)
+    sizes = [len(s) + len(t) for s, t in components]
+    print(f"  🧩 分割: {len(components)} 個の独立したグループ（最大 {max(sizes, default=0)} 人）")
+
+    def solve_full(reason):
+        print(f"  {reason} → 単一モデルで計算します。")
+        engine = make_engine(engine_name, time_limit, num_workers)
+        model = build_model(data, constraint_flags, engine, c5_encoding)
+        return engine.solve(), model
+
+    if len(components) <= 1:
+        return solve_full("分割できるグループがありません")
+
+    # --------------------------------------------------
+    # グループごとに並列で求解（制約4は残りブース数をそのまま使う）
+    # --------------------------------------------------
+    tasks = {i: _sub_data(data, s, t) for i, (s, t) in enumerate(components)}
+    results = _solve_all(tasks, constraint_flags, engine_name, time_limit, num_workers, processes, c5_encoding)
+
+    failed = [i for i, res in results.items() if not is_solution_status(res['status'])]
+    statuses = collections.Counter(res['status'] for res in results.values())
+    print(f"  -> 求解完了 {dict(statuses)} "
+          f"(最大 {max(res['wall_time'] for res in results.values()):.1f}秒 / グループ)")
+    if failed:
+        return solve_full(f"⚠️ {len(failed)} グループで解が得られませんでした")
+
+    # --------------------------------------------------
+    # マスター: ブース上限（制約4）を超えたスロットを使うグループに
+    # スロットごとのブース枠を割り当てて再計算
+    # --------------------------------------------------
+    remaining = _booth_remaining(data, constraint_flags)
+    usage = {i: collections.Counter(key[3] for key in res['keys']) for i, res in results.items()}
+    total = sum(usage.values(), collections.Counter())
+    over = {slid for slid, cap in remaining.items() if total[slid] > cap}
+    if over:
+        group = sorted(i for i in results if any(usage[i][slid] for slid in over))
+        print(f"  ⚠️ ブース上限を超えるスロット: {len(over)} 件 → {len(group)} グループにブース枠を割り当てて再計算します")
+        quotas = _booth_quotas(remaining, usage, group)
+        tasks = {
+            i: _sub_data(data, *components[i],
+                         booth_used={slid: cap - quotas[i][slid] for slid, cap in remaining.items()})
+            for i in group
+        }
+        resolved = _solve_all(tasks, constraint_flags, engine_name, time_limit, num_workers, processes,
+                              c5_encoding)
+        failed = [i for i, res in resolved.items() if not is_solution_status(res['status'])]
+        if failed:
+            return solve_full(f"⚠️ ブース枠での再計算で {len(failed)} グループの解が得られませんでした")
+        results.update(resolved)
+
+    # --------------------------------------------------
+    # 最終確認: 統合した配置を単一モデルで検証
+    # --------------------------------------------------
+    chosen = {key for res in results.values() for key in res['keys']}
+    status, model = _fix_and_check(data, constraint_flags, engine_name, time_limit, num_workers,
+                                   chosen, c5_encoding)
+    if not is_solution_status(status):
+        return solve_full(f"❌ 統合した配置が単一モデルの制約を満たしません（{status}）")
+
+    # x を固定した確認の解は常に OPTIMAL なので、状態はグループの求解結果から決める
+    all_optimal = all(res['status'] == 'OPTIMAL' for res in results.values())
+    status = 'OPTIMAL' if all_optimal and not over else 'FEASIBLE'
+    print(f"  ✅ 単一モデルで全制約を確認しました（{len(chosen)} コマ, "
+          f"{'最適' if status == 'OPTIMAL' else '実行可能解'}, 合計 {time.perf_counter() - t0:.1f}秒）")
+    model['engine'].wall_time = time.perf_counter() - t0
+    model['merged'] = True
+    return status, model
@@ -0,0 +1,106 @@
+"""
+Elastic infeasibility diagnosis.
+
+When the model is INFEASIBLE, switching constraints off one by one and
+re-running costs a full run per guess. diagnose_infeasible() builds the same
+model once more with build_model(elastic=True): every hard row (basic
+constraints and constraints 1-6) gets a non-negative slack variable and the
+objective minimizes the total slack. One solve of that model names exactly
+the rows - constraint, teacher / student, date and slots - that have to be
+violated, and by how much. Rows with zero slack are satisfiable together.
+"""
+
+import contextlib
+import io
+
+import pandas as pd
+
+from allocation.engines import STATUS_LABELS, is_solution_status, make_engine
+from allocation.inputs import CONSTRAINT_CODES
+from allocation.model import build_model
+
+# 行の区分 → constraint シートのコード（基本制約はシートで OFF にできない）
+SECTION_CODES = dict(zip(['制約1', '制約2', '制約3', '制約4', '制約5', '制約6'], CONSTRAINT_CODES))
+
+VIOLATION_COLUMNS = ['制約', '講師名', '生徒名', '科目名', '日付', '日時', '上限', '違反量',
+                     'teacher_id', 'student_id', 'subject_id', 'slot_id', 'slot_id_to']
+
+
+def diagnose_infeasible(data, constraint_flags, engine_name='SCIP', time_limit=30, num_workers=8,
+                        c5_encoding='pairwise'):
+    """
+    Solve the elastic model once and list the violated rows.
+
+    Args:
+        data: output of prep.prepare_data (the data of the infeasible model)
+        constraint_flags: {code: {'activated', 'value'}}
+        engine_name, time_limit, num_workers, c5_encoding: as for the
+            infeasible run
+
+    Returns:
+        (status of the elastic solve, DataFrame with VIOLATION_COLUMNS sorted
+        by violation, or None without a solution)
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine = make_engine(engine_name, time_limit, num_workers)
+        model = build_model(data, constraint_flags, engine, c5_encoding, elastic=True)
+        status = engine.solve()
+    if not is_solution_status(status):
+        return status, None
+
+    slacks = model['slacks']
+    amounts = engine.values([slack for slack, _ in slacks]) if slacks else []
+    s_map, t_map, c_map, slot_map = data['s_map'], data['t_map'], data['c_map'], data['slot_map']
+    rows = []
+    for (_, info), amount in zip(slacks, list(amounts)):
+        if amount < 0.5:
+            continue
+        slots = [slot_map.get(info[key], str(info[key])) for key in ('slot_id', 'slot_id_to') if key in info]
+        rows.append(dict(
+            info,
+            制約=info['section'],
+            講師名=t_map.get(info.get('teacher_id'), ''),
+            生徒名=s_map.get(info.get('student_id'), ''),
+            科目名=c_map.get(info.get('subject_id'), ''),
+            日付=info.get('date', ''),
+            日時=' 〜 '.join(slots),
+            上限=info.get('limit', ''),
+            違反量=int(round(amount)),
+        ))
+    df = pd.DataFrame(rows, columns=VIOLATION_COLUMNS)
+    df = df.sort_values(['違反量', '制約'], ascending=[False, True], kind='stable').reset_index(drop=True)
+    return status, df
+
+
+def print_elastic_report(status, df_violations, top=20):
+    """Print the violated rows per constraint and which constraint settings to relax."""
+    print(f"\n{'='*50}")
+    print("🧮 制約違反の最小化による診断（エラスティック）")
+    print(f"{'='*50}")
+    if df_violations is None:
+        print(f"  ⚠️ 診断用モデルも解けませんでした: {STATUS_LABELS.get(status, status)}")
+        return
+    if df_violations.empty:
+        print("  違反が必要な行はありません（制限時間内に実行不能の原因を特定できませんでした）。")
+        return
+
+    summary = df_violations.groupby('制約', sort=False).agg(行数=('違反量', 'size'), 違反量合計=('違反量', 'sum'))
+    print(f"\n📌 最小で {int(df_violations['違反量'].sum())} だけ制約を破れば解があります（{len(df_violations)} 行）:")
+    for section, row in summary.iterrows():
+        code = SECTION_CODES.get(section)
+        name = f"{section} ({code})" if code else section
+        print(f"  ❗ {name}: {row['行数']} 行 / 違反量 {row['違反量合計']}")
+
+    print(f"\n📌 違反した行（上位 {min(top, len(df_violations))} 件）:")
+    for row in df_violations.head(top).to_dict('records'):
+        who = ' '.join(str(v) for v in (row['講師名'], row['生徒名'], row['科目名']) if v)
+        when = row['日時'] or row['日付']
+        limit = f" 上限{row['上限']}" if row['上限'] != '' else ""
+        print(f"  ・{row['制約']}: {who} {when}{limit} → 違反量 {row['違反量']}")
+
+    print(f"\n💡 対処法:")
+    codes = [SECTION_CODES[section] for section in summary.index if section in SECTION_CODES]
+    for code in codes:
+        print(f"  ・constraint シートの {code} を緩める（個人別の値の見直し）か OFF にする")
+    print(f"  ・上記の講師・生徒・日付の既存配置（O01）や空き枠を見直す")
+    print(f"{'='*50}")
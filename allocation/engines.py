@@ -0,0 +1,498 @@
+"""
+Solver engines for the allocation model.
+
+The model builder (allocation.model) only talks to the small interface
+below, so the same basic, hard (1-6) and soft (S1/S2) constraints can be
+built either as a SCIP MIP (pywraplp, single core) or as a CP-SAT model
+solved with parallel search workers.
+
+solve(on_incumbent) reports every improved solution while solving (see
+allocation.anytime): CP-SAT through its solution callback, SCIP - which has
+no callbacks through pywraplp - by solving in growing time slices, each
+started from the previous incumbent as a hint.
+"""
+
+import time
+
+import numpy as np
+from google.protobuf import text_format
+from ortools.linear_solver import linear_solver_pb2, pywraplp
+from ortools.sat import cp_model_pb2
+from ortools.sat.python import cp_model
+
+ENGINES = ('SCIP', 'CP-SAT')
+
+# CP-SAT は整数係数のみ扱えるため、目的関数の係数を 10 の累乗倍して整数化する。
+# 倍率は係数の小数点以下の桁数から決め（重み 0.1 / 0.05 なら 100, 0.125 なら 1000）、
+# この桁数を超える端数だけを丸める
+CPSAT_MAX_DECIMALS = 6
+
+STATUS_LABELS = {
+    'OPTIMAL': "OPTIMAL",
+    'FEASIBLE': "FEASIBLE",
+    'INFEASIBLE': "INFEASIBLE（解なし）",
+    'UNBOUNDED': "UNBOUNDED（非有界）",
+    'ABNORMAL': "ABNORMAL（ソルバー異常）",
+    'NOT_SOLVED': "NOT_SOLVED（未計算）",
+    'MODEL_INVALID': "MODEL_INVALID（モデル不正）",
+}
+
+
+def is_solution_status(status):
+    """True when the status carries a usable (hard-feasible) solution."""
+    return status in ('OPTIMAL', 'FEASIBLE')
+
+
+def _relative_gap(objective, bound):
+    return abs(bound - objective) / max(abs(objective), 1e-9)
+
+
+def objective_scale(coeffs, max_decimals=CPSAT_MAX_DECIMALS):
+    """
+    (10**d, exact): the smallest d <= max_decimals that makes every
+    coefficient an integer, or (10**max_decimals, False) when none does.
+    """
+    coeffs = np.asarray(coeffs, dtype=float)
+    for d in range(max_decimals + 1):
+        scaled = coeffs * 10 ** d
+        if np.all(np.abs(scaled - np.round(scaled)) <= 1e-9 * np.maximum(1.0, np.abs(scaled))):
+            return 10 ** d, True
+    return 10 ** max_decimals, False
+
+
+def _pick(solution, variables, index):
+    """Values of variables from a full solution vector (index: var -> column)."""
+    return solution[np.fromiter((index(var) for var in variables), dtype='int64', count=len(variables))]
+
+
+class ScipEngine:
+    """SCIP through pywraplp (MIP, single core)."""
+
+    name = 'SCIP'
+
+    _STATUS = {
+        pywraplp.Solver.OPTIMAL: 'OPTIMAL',
+        pywraplp.Solver.FEASIBLE: 'FEASIBLE',
+        pywraplp.Solver.INFEASIBLE: 'INFEASIBLE',
+        pywraplp.Solver.UNBOUNDED: 'UNBOUNDED',
+        pywraplp.Solver.ABNORMAL: 'ABNORMAL',
+        pywraplp.Solver.NOT_SOLVED: 'NOT_SOLVED',
+    }
+
+    # solve(on_incumbent) の最初の時間枠（秒, 制限時間の 1/4 未満なら 1/4）。以降は2倍ずつ伸ばす
+    # 枠ごとに前処理とルート LP からやり直すため、短すぎる枠では解が進まない
+    SLICE_SECONDS = 5
+
+    def __init__(self, time_limit=30, num_workers=1):
+        self.solver = pywraplp.Solver.CreateSolver('SCIP')
+        self.time_limit = time_limit
+        self.num_workers = num_workers
+        self.gap_limit = None  # 相対ギャップがこれ以下になったら終了（None: 最適性の証明まで）
+        self.wall_time = 0.0
+        self._bound = None  # 時間枠で解いた場合の上界（solver には読み戻せない）
+        self._stats = None  # 時間枠で解いた場合のノード数・反復回数（全枠の合計）
+        self._solved = False  # solver の Solve() を呼んだか（2回目以降は新しい SCIP で解く）
+
+    def bool_var(self, name):
+        return self.solver.IntVar(0, 1, name)
+
+    def num_var(self, lb, ub, name):
+        return self.solver.NumVar(lb, ub, name)
+
+    def sum(self, items):
+        return self.solver.Sum(items)
+
+    def add(self, constraint):
+        self.solver.Add(constraint)
+
+    def maximize(self, terms):
+        """Set the objective to maximize sum(coeff * var) over [(var, coeff), ...] (replacing the previous one)."""
+        objective = self.solver.Objective()
+        objective.Clear()
+        for var, coeff in terms:
+            objective.SetCoefficient(var, coeff)
+        objective.SetMaximization()
+
+    def set_hint(self, pairs, repair=True):
+        """Pass [(var, value), ...] to SCIP as a (partial) MIP start (SCIP repairs or drops it itself)."""
+        self.solver.SetHint([var for var, _ in pairs], [float(value) for _, value in pairs])
+
+    def solution_pairs(self):
+        """[(var, value), ...] of every variable in the last solution (auxiliary variables included)."""
+        variables = self.solver.variables()
+        return list(zip(variables, _pick(self._solution(), variables, _scip_index).tolist()))
+
+    def fix(self, pairs):
+        """Fix the binary variables in [(var, value), ...] to their values."""
+        for var, value in pairs:
+            var.SetBounds(value, value)
+
+    def evaluate(self, pairs, time_limit=10):
+        """
+        Solve once with the binary variables in pairs fixed to their values.
+
+        Returns (status, objective or None); bounds are restored afterwards.
+        """
+        self.fix(pairs)
+        saved_limit, self.time_limit = self.time_limit, time_limit
+        status = self.solve()
+        objective = self.objective_value() if is_solution_status(status) else None
+        self.time_limit = saved_limit
+        for var, _ in pairs:
+            var.SetBounds(0, 1)
+        return status, objective
+
+    def _run(self, solver, seconds):
+        solver.SetTimeLimit(int(seconds * 1000))
+        params = pywraplp.MPSolverParameters()
+        if self.gap_limit is not None:
+            params.SetDoubleParam(pywraplp.MPSolverParameters.RELATIVE_MIP_GAP, float(self.gap_limit))
+        status = solver.Solve(params)
+        return self._STATUS.get(status, f'UNKNOWN({status})')
+
+    def _solve_once(self, seconds):
+        if not self._solved:
+            self._solved = True
+            return self._run(self.solver, seconds)
+        # 同じ solver での2回目以降の Solve()（2段階の最適化、ヒントの評価後の求解など）も
+        # _solve_sliced と同じ理由で、書き出したモデルを新しい SCIP で解いて解だけを読み戻す
+        model = linear_solver_pb2.MPModelProto()
+        self.solver.ExportModelToProto(model)
+        status, response, self._bound, self._stats = self._solve_copy(model, seconds)
+        if is_solution_status(status):
+            self.solver.LoadSolutionFromProto(response)
+        return status
+
+    def _solve_copy(self, model, seconds):
+        """
+        Solve an exported model (MPModelProto, with its hint) on a new SCIP
+        solver; returns (status, MPSolutionResponse, bound, statistics).
+        """
+        solver = pywraplp.Solver.CreateSolver('SCIP')
+        error = solver.LoadModelFromProto(model)
+        if error:
+            raise ValueError(f"モデルを読み込めませんでした: {error}")
+        status = self._run(solver, seconds)
+        response = linear_solver_pb2.MPSolutionResponse()
+        solver.FillSolutionResponseProto(response)
+        bound = solver.Objective().BestBound() if is_solution_status(status) else None
+        return status, response, bound, {'nodes': solver.nodes(), 'iterations': solver.iterations()}
+
+    def solve(self, on_incumbent=None):
+        """
+        Solve within time_limit (and gap_limit).
+
+        on_incumbent(incumbent) is called for every improved solution with a
+        dict of 'values' (function: variables -> array), 'objective',
+        'bound' and 'wall_time'; returning True stops the search. SCIP then
+        runs in time slices of max(SLICE_SECONDS, time_limit / 4), 2x, 4x,
+        ... each hinted with the incumbent, so improvements are reported
+        between slices.
+
+        Only the first plain solve runs on the pywraplp solver itself; later
+        solves of the same engine (evaluate, a second objective) and the
+        time slices run on a copy of the model in a new SCIP solver.
+        """
+        t0 = time.perf_counter()
+        self._bound = self._stats = None
+        if on_incumbent is None:
+            status = self._solve_once(self.time_limit)
+        else:
+            status = self._solve_sliced(on_incumbent, t0)
+        self.wall_time = time.perf_counter() - t0
+        return status
+
+    def _solve_sliced(self, on_incumbent, t0):
+        # pywraplp の Solve() を同じモデルで繰り返すと大きなモデルで SCIP が異常終了するため、
+        # 書き出したモデルを時間枠ごとに新しい SCIP で解き、最良解だけを solver に読み戻す
+        model = linear_solver_pb2.MPModelProto()
+        self.solver.ExportModelToProto(model)
+
+        best, status, slice_seconds = None, 'NOT_SOLVED', max(self.SLICE_SECONDS, self.time_limit / 4)
+        self._stats = {'nodes': 0, 'iterations': 0}
+        while True:
+            remaining = self.time_limit - (time.perf_counter() - t0)
+            status, response, bound, stats = self._solve_copy(model, max(0.1, min(slice_seconds, remaining)))
+            # 枠ごとに探索をやり直すので、ノード数・反復回数は全枠の合計
+            for key, n in stats.items():
+                self._stats[key] += n
+            if not is_solution_status(status):
+                break
+            objective = response.objective_value
+            stop = False
+            if best is None or objective > best.objective_value + 1e-9:
+                best = response
+                solution = np.asarray(response.variable_value, dtype=float)
+                stop = on_incumbent({'values': lambda variables, s=solution: _pick(s, variables, _scip_index),
+                                     'objective': objective, 'bound': bound,
+                                     'wall_time': time.perf_counter() - t0})
+            self._bound = bound if self._bound is None else min(self._bound, bound)
+            gap_reached = self.gap_limit is not None and _relative_gap(objective, bound) <= self.gap_limit
+            if status == 'OPTIMAL' or stop or gap_reached or time.perf_counter() - t0 >= self.time_limit:
+                break
+            # 次の時間枠は最良解から始める
+            hint = model.solution_hint
+            hint.Clear()
+            hint.var_index.extend(range(len(best.variable_value)))
+            hint.var_value.extend(best.variable_value)
+            slice_seconds *= 2
+
+        if best is None:
+            return status
+        self.solver.LoadSolutionFromProto(best)
+        return status if is_solution_status(status) else 'FEASIBLE'
+
+    def _solution(self):
+        response = linear_solver_pb2.MPSolutionResponse()
+        self.solver.FillSolutionResponseProto(response)
+        return np.asarray(response.variable_value, dtype=float)
+
+    def value(self, var):
+        return var.solution_value()
+
+    def values(self, variables):
+        """Solution values of many variables as a float array (one copy of the solution vector)."""
+        return _pick(self._solution(), variables, _scip_index)
+
+    def objective_value(self):
+        return self.solver.Objective().Value()
+
+    def best_bound(self):
+        return self._bound if self._bound is not None else self.solver.Objective().BestBound()
+
+    def num_constraints(self):
+        return self.solver.NumConstraints()
+
+    def num_variables(self):
+        return self.solver.NumVariables()
+
+    def stats(self):
+        """Solver statistics of the last solve (branch-and-bound nodes, LP iterations)."""
+        if self._stats is not None:
+            return dict(self._stats)
+        return {'nodes': self.solver.nodes(), 'iterations': self.solver.iterations()}
+
+    def var_index(self, var):
+        """Column of var in the model (its position in load_model()'s list)."""
+        return _scip_index(var)
+
+    def export_model(self, path):
+        """Write the model (variables, rows, objective; no hint) to path as a binary MPModelProto."""
+        proto = linear_solver_pb2.MPModelProto()
+        self.solver.ExportModelToProto(proto)
+        with open(path, 'wb') as f:
+            f.write(proto.SerializeToString())
+
+    def load_model(self, path):
+        """Replace the model by an export_model() file; returns the variables in index order."""
+        with open(path, 'rb') as f:
+            proto = linear_solver_pb2.MPModelProto.FromString(f.read())
+        self.solver = pywraplp.Solver.CreateSolver('SCIP')
+        self._bound = self._stats = None
+        self._solved = False
+        error = self.solver.LoadModelFromProto(proto)
+        if error:
+            raise ValueError(f"モデルを読み込めませんでした: {error}")
+        return self.solver.variables()
+
+
+def _scip_index(var):
+    return var.index()
+
+
+def _cpsat_index(var):
+    return var.index
+
+
+class _IncumbentCallback(cp_model.CpSolverSolutionCallback):
+    """Passes every CP-SAT solution to on_incumbent (see ScipEngine.solve)."""
+
+    def __init__(self, on_incumbent):
+        super().__init__()
+        self._on_incumbent = on_incumbent
+
+    def on_solution_callback(self):
+        solution = np.asarray(self.response_proto.solution, dtype=float)
+        stop = self._on_incumbent({
+            'values': lambda variables: _pick(solution, variables, _cpsat_index),
+            'objective': self.objective_value,
+            'bound': self.best_objective_bound,
+            'wall_time': self.wall_time,
+        })
+        if stop:
+            self.stop_search()
+
+
+def _set_domain(proto_var, lb, ub):
+    """Overwrite the [lb, ub] domain of a CP-SAT variable proto in place."""
+    proto_var.domain.clear()
+    proto_var.domain.extend([lb, ub])
+
+
+class CpSatEngine:
+    """OR-Tools CP-SAT with parallel search workers."""
+
+    name = 'CP-SAT'
+
+    _STATUS = {
+        cp_model.OPTIMAL: 'OPTIMAL',
+        cp_model.FEASIBLE: 'FEASIBLE',
+        cp_model.INFEASIBLE: 'INFEASIBLE',
+        cp_model.MODEL_INVALID: 'MODEL_INVALID',
+        cp_model.UNKNOWN: 'NOT_SOLVED',
+    }
+
+    def __init__(self, time_limit=30, num_workers=8):
+        self.model = cp_model.CpModel()
+        self.solver = cp_model.CpSolver()
+        self.time_limit = time_limit
+        self.num_workers = num_workers
+        self.gap_limit = None  # 相対ギャップがこれ以下になったら終了（None: 最適性の証明まで）
+        self.wall_time = 0.0
+        self._num_constraints = 0
+
+    def bool_var(self, name):
+        return self.model.new_bool_var(name)
+
+    def num_var(self, lb, ub, name):
+        # 補助変数は最適解では整数値をとるため整数変数で表現する
+        return self.model.new_int_var(int(lb), int(ub), name)
+
+    def sum(self, items):
+        return cp_model.LinearExpr.sum(items)
+
+    def add(self, constraint):
+        self.model.add(constraint)
+        self._num_constraints += 1
+
+    def maximize(self, terms):
+        """
+        Set the objective to maximize sum(coeff * var) over [(var, coeff), ...].
+
+        The coefficients are scaled to integers by objective_scale; the
+        proto's scaling factor divides the scale out again, so objective
+        values and bounds are in the original units.
+        """
+        variables = [var for var, _ in terms]
+        coeffs = np.array([coeff for _, coeff in terms], dtype=float)
+        scale, exact = objective_scale(coeffs)
+        scaled = np.round(coeffs * scale).astype('int64')
+        if not exact:
+            lost = int(np.count_nonzero((scaled == 0) & (coeffs != 0)))
+            lost_note = f"（{lost} 個は 0 になりました）" if lost else ""
+            print(f"  ⚠️ CP-SAT: 目的関数の係数を小数点以下 {CPSAT_MAX_DECIMALS} 桁に丸めました{lost_note}。"
+                  f"SCIP とは結果が異なる場合があります")
+        self.model.maximize(cp_model.LinearExpr.weighted_sum(variables, scaled.tolist()))
+        # maximize は係数の符号を反転し倍率 -1 で表すので、同じ符号で 1 / scale を掛ける
+        self.model.proto.objective.scaling_factor = -1 / scale
+
+    def set_hint(self, pairs, repair=True):
+        """
+        Pass [(var, value), ...] to CP-SAT as a solution hint.
+
+        repair: let CP-SAT repair a partial or infeasible hint. A complete
+        feasible hint (solution_pairs) is passed with repair=False so that
+        CP-SAT starts from it as its first solution.
+        """
+        self.model.clear_hints()
+        for var, value in pairs:
+            self.model.add_hint(var, int(round(value)))
+        # 制約変更で実行不能になったヒントも修復して使う
+        self.solver.parameters.repair_hint = repair
+
+    def solution_pairs(self):
+        """[(var, value), ...] of every variable in the last solution (auxiliary variables included)."""
+        solution = self.solver.response_proto.solution
+        return [(self.model.get_int_var_from_proto_index(i), value) for i, value in enumerate(solution)]
+
+    def fix(self, pairs):
+        """Fix the binary variables in [(var, value), ...] to their values."""
+        variables = self.model.proto.variables
+        for var, value in pairs:
+            _set_domain(variables[var.index], int(value), int(value))
+
+    def evaluate(self, pairs, time_limit=10):
+        """
+        Solve once with the binary variables in pairs fixed to their values.
+
+        Returns (status, objective or None); domains are restored afterwards.
+        """
+        variables = self.model.proto.variables
+        self.fix(pairs)
+        saved_limit, self.time_limit = self.time_limit, time_limit
+        status = self.solve()
+        objective = self.objective_value() if is_solution_status(status) else None
+        self.time_limit = saved_limit
+        for var, _ in pairs:
+            _set_domain(variables[var.index], 0, 1)
+        return status, objective
+
+    def solve(self, on_incumbent=None):
+        """Solve within time_limit (and gap_limit); on_incumbent as in ScipEngine.solve."""
+        self.solver.parameters.max_time_in_seconds = float(self.time_limit)
+        self.solver.parameters.num_workers = int(self.num_workers)
+        self.solver.parameters.relative_gap_limit = float(self.gap_limit or 0.0)
+        t0 = time.perf_counter()
+        callback = _IncumbentCallback(on_incumbent) if on_incumbent is not None else None
+        status = self.solver.solve(self.model, callback)
+        self.wall_time = time.perf_counter() - t0
+        return self._STATUS.get(status, f'UNKNOWN({status})')
+
+    def value(self, var):
+        return self.solver.value(var)
+
+    def values(self, variables):
+        """Solution values of many variables as a float array (one copy of the solution vector)."""
+        return _pick(np.asarray(self.solver.response_proto.solution, dtype=float), variables, _cpsat_index)
+
+    def objective_value(self):
+        return self.solver.objective_value
+
+    def best_bound(self):
+        return self.solver.best_objective_bound
+
+    def num_constraints(self):
+        return self._num_constraints
+
+    def num_variables(self):
+        return len(self.model.proto.variables)
+
+    def stats(self):
+        """Solver statistics of the last solve (search branches and conflicts over all workers)."""
+        return {'nodes': self.solver.num_branches, 'conflicts': self.solver.num_conflicts}
+
+    def var_index(self, var):
+        """Position of var in the model proto (its position in load_model()'s list)."""
+        return _cpsat_index(var)
+
+    def export_model(self, path):
+        """Write the model to path as a binary CpModelProto."""
+        if not self.model.export_to_file(path):
+            raise OSError(f"モデルを書き出せませんでした: {path}")
+
+    def load_model(self, path):
+        """Replace the model by an export_model() file; returns the variables in index order."""
+        with open(path, 'rb') as f:
+            proto = cp_model_pb2.CpModelProto.FromString(f.read())
+        # cp_model の proto は C++ 側の実装でバイナリを直接読めないため、テキスト形式を経由する
+        self.model = cp_model.CpModel()
+        self.model.proto.parse_text_format(text_format.MessageToString(proto))
+        self._num_constraints = len(proto.constraints)
+        return [self.model.get_int_var_from_proto_index(i) for i in range(len(proto.variables))]
+
+
+def mip_gap(engine, status):
+    """Relative gap |bound - objective| / |objective| of the last solve (None without a solution)."""
+    if not is_solution_status(status):
+        return None
+    return _relative_gap(engine.objective_value(), engine.best_bound())
+
+
+def make_engine(name='SCIP', time_limit=30, num_workers=8):
+    """Create an engine by name ('SCIP' or 'CP-SAT')."""
+    key = name.upper().replace('_', '-')
+    if key == 'SCIP':
+        return ScipEngine(time_limit)
+    if key in ('CP-SAT', 'CPSAT'):
+        return CpSatEngine(time_limit, num_workers)
+    raise ValueError(f"未対応のソルバーエンジンです: {name}（{' / '.join(ENGINES)}）")
@@ -0,0 +1,171 @@
+"""
+Local cache of the loaded input sheets.
+
+Re-running the cells (or run_csv_dir) after only tweaking the constraint
+sheet used to download and decode every input sheet again.
+load_inputs_cached() keeps the typed DataFrames on local disk as Parquet
+files named by the content hash of the sheet's raw values, plus a manifest
+per spreadsheet / CSV directory with the revision and hash of each sheet:
+
+  1. Revision: a sheet whose revision is unchanged is read from Parquet
+     without any request. CsvWorkbook has a revision per file; a gspread
+     Spreadsheet only has the file's modifiedTime (Drive API), so there any
+     edit re-checks every sheet. keep_revision() carries the revision over
+     our own writes of the output sheets.
+  2. Content: the remaining sheets are fetched in one batched request and
+     hashed; sheets whose content did not change are read from Parquet
+     instead of being decoded again.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from allocation.inputs import SHEET_NAMES, decode_values, fetch_values
+
+CACHE_VERSION = 1  # decode_values の変換結果が変わったら上げる（古いキャッシュを使わない）
+
+SOURCE_LABELS = {
+    'revision': 'キャッシュ（更新なし）',
+    'content': 'キャッシュ（内容一致）',
+    'download': '読み込み',
+}
+
+
+def _manifest_path(cache_dir, wb):
+    source = hashlib.sha1(str(wb.id).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, f'manifest_{source}.json')
+
+
+def _read_manifest(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {'version': CACHE_VERSION, 'sheets': {}}
+    if manifest.get('version') != CACHE_VERSION:
+        return {'version': CACHE_VERSION, 'sheets': {}}
+    return manifest
+
+
+def _write_atomic(path, write):
+    tmp = f'{path}.tmp'
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def _write_manifest(path, manifest):
+    def write(tmp):
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+    _write_atomic(path, write)
+
+
+def _revisions(wb, sheet_names):
+    """{sheet_name: revision token}; empty when the backend cannot tell."""
+    if hasattr(wb, 'sheet_revisions'):
+        return wb.sheet_revisions(sheet_names)
+    try:
+        modified = wb.get_lastUpdateTime()
+    except Exception:
+        return {}
+    return {name: modified for name in sheet_names}
+
+
+def _content_hash(values):
+    payload = json.dumps([CACHE_VERSION, values], ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def load_inputs_cached(wb, cache_dir, sheet_names=None):
+    """
+    load_inputs() through the local Parquet cache.
+
+    Args:
+        wb: gspread Spreadsheet or inputs.CsvWorkbook
+        cache_dir: cache directory (created when missing)
+        sheet_names: {key: sheet_name} to load (default: SHEET_NAMES)
+
+    Returns:
+        (dfs keyed like sheet_names with missing sheets as empty DataFrames,
+        list of missing sheet names, {sheet_name: 'revision' | 'content' |
+        'download'} telling where each loaded sheet came from)
+    """
+    sheet_names = sheet_names or SHEET_NAMES
+    names = list(sheet_names.values())
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest_path = _manifest_path(cache_dir, wb)
+    manifest = _read_manifest(manifest_path)
+    revisions = _revisions(wb, names)
+
+    def parquet_path(digest):
+        return os.path.join(cache_dir, f'{digest}.parquet')
+
+    frames, sources = {}, {}
+    for name in names:
+        entry = manifest['sheets'].get(name)
+        if (entry and revisions.get(name) is not None and entry['revision'] == revisions[name]
+                and os.path.exists(parquet_path(entry['hash']))):
+            frames[name] = pd.read_parquet(parquet_path(entry['hash']))
+            sources[name] = 'revision'
+
+    todo = [name for name in names if name not in frames]
+    fetched = fetch_values(wb, todo) if todo else {}
+    for name, values in fetched.items():
+        digest = _content_hash(values)
+        path = parquet_path(digest)
+        if os.path.exists(path):
+            frames[name] = pd.read_parquet(path)
+            sources[name] = 'content'
+        else:
+            frames[name] = decode_values(values)
+            _write_atomic(path, lambda tmp, df=frames[name]: df.to_parquet(tmp, index=False))
+            sources[name] = 'download'
+        manifest['sheets'][name] = {'revision': revisions.get(name), 'hash': digest}
+    if fetched:
+        _write_manifest(manifest_path, manifest)
+
+    dfs = {key: frames.get(name, pd.DataFrame()) for key, name in sheet_names.items()}
+    return dfs, [name for name in names if name not in frames], sources
+
+
+def print_cache_report(sources, seconds=None):
+    """Print how many sheets came from the cache and which ones were read again."""
+    if not sources:
+        return
+    hits = [name for name, src in sources.items() if src != 'download']
+    loaded = [name for name, src in sources.items() if src == 'download']
+    took = f" ({seconds:.2f}秒)" if seconds is not None else ""
+    print(f"🗃 入力キャッシュ: ヒット {len(hits)} シート / 読み込み {len(loaded)} シート{took}")
+    if loaded:
+        print(f"   読み込み: {', '.join(loaded)}")
+
+
+@contextlib.contextmanager
+def keep_revision(wb, cache_dir):
+    """
+    Keep the cached revisions valid across our own writes (O01-O04).
+
+    With a spreadsheet-wide modifiedTime, writing the output sheets would
+    otherwise make the next load re-download every input sheet. When the
+    revision before the writes still matches the manifest (nobody edited the
+    inputs since they were loaded), the manifest is moved to the revision
+    after the writes.
+    """
+    if not cache_dir or hasattr(wb, 'sheet_revisions'):
+        yield
+        return
+    manifest_path = _manifest_path(cache_dir, wb)
+    manifest = _read_manifest(manifest_path)
+    before = _revisions(wb, [None]).get(None)
+    unchanged = before is not None and manifest['sheets'] and all(
+        entry['revision'] == before for entry in manifest['sheets'].values())
+    yield
+    if unchanged:
+        after = _revisions(wb, [None]).get(None)
+        for entry in manifest['sheets'].values():
+            entry['revision'] = after
+        _write_manifest(manifest_path, manifest)
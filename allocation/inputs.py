@@ -0,0 +1,286 @@
+"""
+Input sheet definitions, loading and normalization.
+
+Shared by the Colab data-input cell (colab/02_dataInput.py), which reads the
+sheets with gspread, and by the scripts, which read the same layout from a
+directory of CSV files (sample_sheet/, parse_pdfs.py output/).
+
+load_sheets() fetches any number of sheets with a single batched values
+request (Spreadsheet.values_batch_get) and decodes the cell strings into
+typed columns. CsvWorkbook serves the same requests from a CSV directory, so
+read_csv_dir and the spreadsheet path share one loader.
+"""
+
+import csv
+import os
+import types
+
+import pandas as pd
+
+# シート名の定義
+SHEET_NAMES = {
+    'subjects':       'I01_subject',
+    'time_ranges':   'I02_time_range',
+    'students':      'I03_student_list',
+    'teachers':      'I04_teacher_list',
+    'slots':         'I05_lesson_slot',
+    'teachable':     'I06_teachable_subjects',
+    'student_reqs':  'I07_student_subject',
+    'student_avail': 'I51_student_availability',
+    'teacher_avail': 'I52_teacher_availability',
+    'constraints':   'constraint'
+}
+
+# constraint シートのコードと説明（制約1〜6, ソフト制約1〜2 の順。CONSTRAINTS.md 参照）
+CONSTRAINT_CODES = {
+    'max_teacher_daily_slot': '講師の1日あたりの授業数上限定義',
+    'max_student_continuous_slot': '生徒の連続コマ上限定義',
+    'max_student_daily_slot': '生徒の1日あたり上限コマ数設定',
+    'max_lesson_per_timeslot': '同一時限の上限コマ数（ブース数に限りがあるため）',
+    'max_teacher_continuous_vacant_slot': '講師の空きコマ上限数（間空きすぎるのはNG）',
+    'max_student_subject_daily_slot': '生徒の科目ごとの1日受講コマ数上限（I07のmax_daily_subject_slot参照）',
+    'soft_spread_subject_across_days': '同じ科目は同じ日に固まらないほうがよい（ソフト制約）',
+    'soft_student_consecutive_slots': '生徒のコマはなるべく連続するようにする（ソフト制約）',
+}
+
+ALLOCATED_SHEET = 'O01_output_allocated_lessons'
+UNALLOCATED_SHEET = 'O02_output_unallocated_lessons'
+FULFILLMENT_SHEET = 'O03_output_fulfillment'
+RUN_RECORD_SHEET = 'O04_output_run_record'
+TEACHER_UTILIZATION_SHEET = 'O05_output_teacher_utilization'
+DAILY_UTILIZATION_SHEET = 'O06_output_daily_utilization'
+SCENARIO_SHEET = 'O07_output_scenarios'
+
+
+def to_int_col(df, col, fill=0):
+    """数値列をintに変換。変換不可はfill値で埋める。"""
+    df[col] = pd.to_numeric(df[col], errors='coerce').fillna(fill).astype(int)
+
+
+def normalize_inputs(dfs):
+    """
+    Unify ID column types (gspread can return a mix of int and str).
+
+    Modifies the DataFrames in dfs in place and replaces dfs['student_reqs']
+    with a copy that has the blank rows returned by gspread removed.
+    """
+    for key, cols in [
+        ('students', ['id']),
+        ('teachers', ['id']),
+        ('subjects', ['id']),
+        ('time_ranges', ['id']),
+        ('slots', ['id', 'time_range_id']),
+        ('teachable', ['teacher_id', 'subject_id']),
+        ('student_avail', ['student_id', 'slot_id']),
+        ('teacher_avail', ['teacher_id', 'slot_id']),
+    ]:
+        df = dfs[key]
+        if not df.empty:
+            for col in cols:
+                if col in df.columns:
+                    to_int_col(df, col)
+
+    df_reqs = dfs['student_reqs']
+    if not df_reqs.empty:
+        for col in ['student_id', 'subject_id', 'sessions']:
+            if col in df_reqs.columns:
+                to_int_col(df_reqs, col)
+        # desired_teacher_*, max_slot_* は空欄=NaNのまま残す（0にすると存在しない講師ID扱いになる）
+        for i in range(1, 4):
+            for prefix in ['desired_teacher_', 'max_slot_']:
+                col = f'{prefix}{i}'
+                if col in df_reqs.columns:
+                    df_reqs[col] = pd.to_numeric(df_reqs[col], errors='coerce')
+        # gspreadが返す空行を除去
+        dfs['student_reqs'] = df_reqs[df_reqs['student_id'] != 0].reset_index(drop=True)
+    return dfs
+
+
+def parse_constraint_flags(df_constraints):
+    """Return {code: {'activated': bool, 'value': float | None}} from the constraint sheet."""
+    constraint_flags = {}
+    if df_constraints.empty:
+        return constraint_flags
+    for row in df_constraints.to_dict('records'):
+        activated = str(row['activated']).upper() == 'TRUE'
+        try:
+            value = float(row['value'])
+        except (ValueError, TypeError):
+            value = None
+        if value is not None and value != value:  # NaN（空欄）
+            value = None
+        constraint_flags[row['code']] = {'activated': activated, 'value': value}
+    return constraint_flags
+
+
+# ============================================================
+# Batched loading (spreadsheet / CSV stand-in)
+# ============================================================
+
+def _decode_column(values):
+    """Typed column from cell strings: int64 / float64 (blank = NaN) when every filled cell is a number."""
+    col = pd.Series(values, dtype=object)
+    blank = col == ''
+    if blank.all():
+        return col
+    num = pd.to_numeric(col.mask(blank), errors='coerce')
+    if num[~blank].isna().any():
+        return col  # 文字列の列（空欄は ''）
+    if not blank.any() and (num % 1 == 0).all():
+        return num.astype('int64')
+    return num.astype('float64')
+
+
+def decode_values(values):
+    """
+    DataFrame from a values range (first row = header), like get_all_records.
+
+    Rows shorter than the header (the API drops trailing blank cells) are
+    padded with '' and longer rows are cut. Columns whose filled cells are
+    all numbers become int64 (float64 with NaN when some cells are blank);
+    other columns keep the strings.
+    """
+    if not values:
+        return pd.DataFrame()
+    header = [str(h) for h in values[0]]
+    width = len(header)
+    rows = [list(r[:width]) + [''] * (width - len(r)) for r in values[1:]]
+    columns = list(zip(*rows)) if rows else [()] * width
+    return pd.DataFrame({h: _decode_column(list(c)) for h, c in zip(header, columns)}, columns=header)
+
+
+def _range_name(sheet_name):
+    """A1 range covering a whole sheet ('' quoted)."""
+    return "'" + sheet_name.replace("'", "''") + "'"
+
+
+def fetch_values(wb, sheet_names):
+    """
+    Fetch the raw cell values of several sheets in one batched values request.
+
+    Args:
+        wb: gspread Spreadsheet or CsvWorkbook
+        sheet_names: sheet titles
+
+    Returns:
+        {sheet_name: [[cell, ...], ...]} of the sheets that exist (missing
+        sheets are left out; one metadata request lists them first, since a
+        missing range fails the whole batch)
+    """
+    titles = {ws.title for ws in wb.worksheets()}
+    present = [name for name in sheet_names if name in titles]
+    if not present:
+        return {}
+    response = wb.values_batch_get([_range_name(name) for name in present])
+    return {name: vr.get('values', []) for name, vr in zip(present, response['valueRanges'])}
+
+
+def load_sheets(wb, sheet_names):
+    """{sheet_name: typed DataFrame} of the existing sheets (fetch_values + decode_values)."""
+    return {name: decode_values(values) for name, values in fetch_values(wb, sheet_names).items()}
+
+
+def load_inputs(wb):
+    """
+    Load every input sheet (SHEET_NAMES) with load_sheets.
+
+    Returns:
+        (dfs keyed like SHEET_NAMES with missing sheets as empty DataFrames,
+        list of missing sheet names)
+    """
+    frames = load_sheets(wb, list(SHEET_NAMES.values()))
+    dfs = {key: frames.get(name, pd.DataFrame()) for key, name in SHEET_NAMES.items()}
+    return dfs, [name for name in SHEET_NAMES.values() if name not in frames]
+
+
+class CsvWorkbook:
+    """
+    Offline stand-in for a gspread Spreadsheet backed by a CSV directory.
+
+    Serves worksheets() and values_batch_get() from <csv_dir>/<sheet>.csv
+    the way the Sheets API returns them (trailing blank cells and rows
+    dropped), and counts the requests in .requests. sheet_revisions()
+    gives a per-file revision (mtime, size) for the input cache.
+    """
+
+    def __init__(self, csv_dir):
+        self.csv_dir = csv_dir
+        self.id = os.path.abspath(csv_dir)
+        self.requests = 0
+
+    def sheet_revisions(self, sheet_names):
+        """{sheet_name: 'mtime_ns:size'} of the existing files."""
+        revisions = {}
+        for name in sheet_names:
+            path = os.path.join(self.csv_dir, f'{name}.csv')
+            if os.path.exists(path):
+                st = os.stat(path)
+                revisions[name] = f'{st.st_mtime_ns}:{st.st_size}'
+        return revisions
+
+    def worksheets(self):
+        self.requests += 1
+        names = sorted(f[:-4] for f in os.listdir(self.csv_dir) if f.endswith('.csv'))
+        return [types.SimpleNamespace(title=name) for name in names]
+
+    def _values(self, sheet_name):
+        with open(os.path.join(self.csv_dir, f'{sheet_name}.csv'), newline='', encoding='utf-8-sig') as f:
+            rows = [list(row) for row in csv.reader(f)]
+        for row in rows:
+            while row and row[-1] == '':
+                row.pop()
+        while rows and not rows[-1]:
+            rows.pop()
+        return rows
+
+    def values_batch_get(self, ranges, params=None):
+        self.requests += 1
+        value_ranges = []
+        for a1 in ranges:
+            sheet_name = a1.split('!')[0]
+            if sheet_name.startswith("'"):
+                sheet_name = sheet_name[1:-1].replace("''", "'")
+            value_ranges.append({'range': a1, 'values': self._values(sheet_name)})
+        return {'valueRanges': value_ranges}
+
+
+# ============================================================
+# CSV directory (sample_sheet layout)
+# ============================================================
+
+def _numericise(value):
+    """Convert a cell string the way gspread's get_all_records does."""
+    if value == '':
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def read_csv_sheet(path):
+    """Read one CSV as gspread would return the sheet (blank = '', numbers as int/float)."""
+    df = pd.read_csv(path, dtype=str, keep_default_na=False, index_col=False, encoding='utf-8')
+    return df.map(_numericise).infer_objects()
+
+
+def read_csv_dir(csv_dir):
+    """
+    Read the input sheets from a directory in the sample_sheet/ layout.
+
+    Returns:
+        dict of {key: DataFrame} keyed like SHEET_NAMES (missing files -> empty)
+    """
+    return load_inputs(CsvWorkbook(csv_dir))[0]
+
+
+def read_existing_csv(csv_dir):
+    """Read O01 from a CSV directory; empty DataFrame when absent or without slot_id."""
+    df = load_sheets(CsvWorkbook(csv_dir), [ALLOCATED_SHEET]).get(ALLOCATED_SHEET, pd.DataFrame())
+    if df.empty or 'slot_id' not in df.columns:
+        return pd.DataFrame()
+    return df
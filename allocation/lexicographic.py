@@ -0,0 +1,119 @@
+"""
+Two-phase (lexicographic) solve.
+
+The single objective adds the soft constraints S1 (spread excess, -w1) and
+S2 (adjacency bonus, +w2) to the lesson count and relies on weights below 1
+so that the count never drops. The small fractional terms weaken the LP
+bound, and SCIP spends most of the time proving optimality over them.
+solve_lexicographic() solves the same built model in two phases instead:
+
+    1. maximize the allocated lessons only (integral objective)
+    2. keep at least that many lessons (one added row), start from the
+       phase-1 schedule and maximize the soft terms only, with its own
+       time limit
+
+The result has the same lessons as the weighted objective and its soft terms
+are optimized afterwards; the two objectives are reported separately.
+"""
+
+import pandas as pd
+
+from allocation.engines import is_solution_status, mip_gap
+
+PHASE_COLUMNS = ['phase', 'status', 'seconds', 'objective', 'bound', 'gap']
+
+
+def soft_value(engine, soft_vars):
+    """Value of the soft terms sum(coeff * var) in the last solution."""
+    if not soft_vars:
+        return 0.0
+    values = engine.values([var for var, _ in soft_vars])
+    return float(sum(coeff * value for (_, coeff), value in zip(soft_vars, values.tolist())))
+
+
+def _phase_row(phase, engine, status):
+    gap = mip_gap(engine, status)
+    return {
+        'phase': phase,
+        'status': status,
+        'seconds': round(engine.wall_time, 3),
+        'objective': round(engine.objective_value(), 6) if gap is not None else None,
+        'bound': round(engine.best_bound(), 6) if gap is not None else None,
+        'gap': round(gap, 6) if gap is not None else None,
+    }
+
+
+def phase_stats(lexicographic):
+    """Scalar summary of a solve_lexicographic result for the run record (monitor.RunRecord.solver)."""
+    soft = lexicographic['soft']
+    stats = {'lessons': lexicographic['lessons'], 'soft': round(soft, 6) if soft is not None else None}
+    for i, row in enumerate(lexicographic['phases'].to_dict('records'), start=1):
+        stats[f'phase{i}_seconds'] = row['seconds']
+        stats[f'phase{i}_status'] = row['status']
+    return stats
+
+
+def solve_lexicographic(model, phase2_time_limit=None):
+    """
+    Maximize the lessons, then the soft terms with the lessons kept.
+
+    Args:
+        model: output of model.build_model (its engine is solved)
+        phase2_time_limit: time limit of phase 2 in seconds (None: the
+            engine's time_limit, the same as phase 1)
+
+    Returns:
+        dict with 'status' (of the schedule returned), 'values' (x values,
+        None without a solution), 'lessons', 'soft' (None when phase 2
+        found no solution), 'objective' (lessons + soft, comparable to the
+        weighted objective) and 'phases' (DataFrame with PHASE_COLUMNS)
+    """
+    engine = model['engine']
+    x_vars = list(model['x'].values())
+    soft_vars = model['soft_vars']
+    result = {'status': 'NOT_SOLVED', 'values': None, 'lessons': None, 'soft': None, 'objective': None}
+    phases = []
+
+    # --- フェーズ1: 配置数のみを最大化 ---
+    engine.maximize([(v, 1) for v in x_vars])
+    status = engine.solve()
+    phases.append(_phase_row('1: 配置数', engine, status))
+    print(f"    フェーズ1（配置数）: {phases[-1]['seconds']:.1f}秒 [{status}]")
+    if not is_solution_status(status):
+        result['status'] = status
+        result['phases'] = pd.DataFrame(phases, columns=PHASE_COLUMNS)
+        return result
+
+    values = engine.values(x_vars) if x_vars else None
+    lessons = int(round(float(values.sum()))) if values is not None else 0
+    # フェーズ1ではソフト制約の補助変数は目的関数になく値に意味がないため、フェーズ2の結果だけを使う
+    result.update(status=status, values=values, lessons=lessons, soft=None if soft_vars else 0.0)
+    print(f"      → 新規 {lessons}コマ")
+
+    # --- フェーズ2: 配置数を下限に固定し、ソフト制約だけを最大化 ---
+    if soft_vars and x_vars:
+        # ヒントは x だけ（補助変数はフェーズ1では目的関数になく任意の値なので、ソルバーに補完させる）
+        engine.set_hint(list(zip(x_vars, values.tolist())))
+        engine.add(engine.sum(x_vars) >= lessons)
+        engine.maximize(soft_vars)
+        saved_limit = engine.time_limit
+        if phase2_time_limit is not None:
+            engine.time_limit = phase2_time_limit
+        status2 = engine.solve()
+        engine.time_limit = saved_limit
+        phases.append(_phase_row('2: ソフト制約', engine, status2))
+        if is_solution_status(status2):
+            values = engine.values(x_vars)
+            result.update(values=values, lessons=int(round(float(values.sum()))),
+                          soft=soft_value(engine, soft_vars))
+            # 全体の最適性はフェーズ1・2の両方が最適の場合のみ
+            if status2 != 'OPTIMAL':
+                result['status'] = 'FEASIBLE'
+            print(f"    フェーズ2（ソフト制約）: {phases[-1]['seconds']:.1f}秒 [{status2}] "
+                  f"→ ソフト制約 {result['soft']:+.2f}")
+        else:
+            print(f"    フェーズ2（ソフト制約）: 解なし [{status2}]。フェーズ1の配置を使います。")
+
+    result['objective'] = result['lessons'] + (result['soft'] or 0.0)
+    result['phases'] = pd.DataFrame(phases, columns=PHASE_COLUMNS)
+    return result
@@ -0,0 +1,385 @@
+"""
+Large-neighborhood search (LNS) around the allocation model.
+
+On large campuses SCIP finds a schedule quickly and then spends the rest of
+the time limit with a wide gap, because the branch-and-bound tree over the
+whole period does not get deep enough. solve_lns() spends a share of the
+time limit (INITIAL_SHARE) on the full model, started from the greedy
+schedule of allocation.preview, and then improves the incumbent round by
+round:
+
+  1. one kind of neighborhood per round, in turn - a few dates, a group of
+     teachers who share students, or the students of one subject - and as
+     many disjoint neighborhoods as there are worker processes,
+  2. in a worker process each neighborhood becomes a small model: every
+     lesson outside it is fixed (passed to prepare_data as existing
+     allocations, the same path as 追記配置), the lessons inside it are
+     free and the model is re-solved with a short time limit, started from
+     the current lessons,
+  3. the improved neighborhoods are merged, best first, as long as their
+     changes touch no (student, day) or (teacher, day) of a change already
+     merged - every per-day constraint and the soft terms S1/S2 are
+     separable then, so the gains add up - and the request totals,
+     desired-teacher limits and booths (constraint 4) still hold.
+
+The objective (lessons + soft terms) over wall-clock time is logged per
+round, in the same columns as the anytime solve. At the end the full model
+is built once more and solved with x fixed to the final schedule, which
+confirms every constraint and gives the model for build_outputs.
+"""
+
+import collections
+import concurrent.futures
+import contextlib
+import io
+import random
+import time
+
+import pandas as pd
+
+from allocation.anytime import PROGRESS_COLUMNS
+from allocation.candidates import CANDIDATE_COLUMNS
+from allocation.decompose import DEFAULT_PROCESSES
+from allocation.engines import is_solution_status, make_engine
+from allocation.model import build_model, solution_keys
+from allocation.prep import prepare_data
+from allocation.preview import greedy_schedule
+from allocation.warmstart import apply_hint
+
+LNS_PROGRESS_COLUMNS = PROGRESS_COLUMNS + ['kind', 'neighborhoods', 'improved', 'merged']
+
+# 近傍の種類（ラウンドごとに順番に使う）
+NEIGHBORHOOD_KINDS = ('dates', 'teachers', 'subject')
+KIND_LABELS = {'dates': '日付', 'teachers': '講師', 'subject': '科目', 'initial': '初期解'}
+
+# 制限時間のうち、全体モデルで初期解を求める割合
+INITIAL_SHARE = 0.2
+# 1つの近傍に含める日付・講師の割合
+NEIGHBORHOOD_SHARE = 0.1
+# 近傍1つあたりの制限時間（秒）
+NEIGHBORHOOD_TIME_LIMIT = 5.0
+# 最後の全体モデルでの確認用に残す時間（秒、全体モデルの作成時間に加える）
+FINAL_RESERVE = 5.0
+
+_KEY_COLUMNS = ['student_id', 'subject_id', 'teacher_id', 'slot_id']
+
+
+def _keys_frame(keys):
+    """Lessons (sid, cid, tid, slid) as O01-like rows for prepare_data / apply_hint."""
+    return pd.DataFrame(list(keys), columns=_KEY_COLUMNS)
+
+
+def _chunks(items, size, count):
+    """Up to count disjoint chunks of size from the shuffled items."""
+    return [items[i:i + size] for i in range(0, min(len(items), size * count), size)]
+
+
+def neighborhoods(data, students_by_teacher, kind, count, rng, share=NEIGHBORHOOD_SHARE):
+    """
+    Disjoint neighborhoods of one kind.
+
+    Args:
+        data: output of prep.prepare_data
+        students_by_teacher: {tid: set of sids} the teacher can teach (teacher_students())
+        kind: 'dates', 'teachers' or 'subject'
+        count: number of neighborhoods
+        rng: random.Random
+        share: fraction of the dates / teachers in one neighborhood
+
+    Returns:
+        list of {'kind', 'dates' | 'teachers' | 'subject'}
+    """
+    if kind == 'dates':
+        dates = sorted(data['slots_by_date'], key=str)
+        rng.shuffle(dates)
+        size = max(1, round(len(dates) * share))
+        return [{'kind': kind, 'dates': set(chunk)} for chunk in _chunks(dates, size, count)]
+
+    if kind == 'subject':
+        subjects = sorted({req['cid'] for req in data['requests']})
+        rng.shuffle(subjects)
+        return [{'kind': kind, 'subject': cid} for cid in subjects[:count]]
+
+    # 講師: 起点の講師から、担当しうる生徒の重なりが大きい講師を順に加える（生徒を講師間で付け替えられるように）
+    students = students_by_teacher
+    free = sorted(students)
+    rng.shuffle(free)
+    size = max(2, round(len(free) * share))
+    result = []
+    while free and len(result) < count:
+        group = [free.pop()]
+        covered = set(students[group[0]])
+        while free and len(group) < size:
+            best = max(free, key=lambda tid: len(students[tid] & covered))
+            free.remove(best)
+            group.append(best)
+            covered |= students[best]
+        result.append({'kind': kind, 'teachers': set(group)})
+    return result
+
+
+def teacher_students(x):
+    """{tid: set of sids} over the candidate variables of registry x."""
+    students = collections.defaultdict(set)
+    for sid, tid in set(zip(x.sid.tolist(), x.tid.tolist())):
+        students[tid].add(sid)
+    return dict(students)
+
+
+def _inside(nbhd, key, slot_to_date):
+    """Whether the lesson (sid, cid, tid, slid) is free in the neighborhood."""
+    if nbhd['kind'] == 'dates':
+        return slot_to_date[key[3]] in nbhd['dates']
+    if nbhd['kind'] == 'teachers':
+        return key[2] in nbhd['teachers']
+    return key[1] == nbhd['subject']
+
+
+def _neighborhood_dfs(dfs, nbhd, slot_ids=None):
+    """Input DataFrames restricted so that only lessons inside the neighborhood get candidates."""
+    sub = dict(dfs)
+    if nbhd['kind'] == 'dates':
+        for key in ['student_avail', 'teacher_avail']:
+            sub[key] = dfs[key][dfs[key]['slot_id'].isin(slot_ids)]
+    elif nbhd['kind'] == 'teachers':
+        sub['teacher_avail'] = dfs['teacher_avail'][dfs['teacher_avail']['teacher_id'].isin(nbhd['teachers'])]
+    else:
+        sub['student_reqs'] = dfs['student_reqs'][dfs['student_reqs']['subject_id'] == nbhd['subject']]
+    return sub
+
+
+def _solve_neighborhood(dfs, df_fixed, kept, current, nbhd, constraint_flags, engine_name, time_limit,
+                        num_workers, c5_encoding):
+    """
+    Re-solve one neighborhood with the lessons outside it fixed (runs in a worker process).
+
+    Returns:
+        picklable dict with 'status', 'old' / 'new' (objective of the small
+        model for the current lessons and for the result) and 'keys' (new
+        lessons inside the neighborhood)
+    """
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        parts = [df[_KEY_COLUMNS] for df in [df_fixed] if df is not None and not df.empty]
+        df_existing = pd.concat(parts + [_keys_frame(kept)], ignore_index=True)
+        slot_ids = None
+        if nbhd['kind'] == 'dates':
+            slot_ids = set(dfs['slots'].loc[dfs['slots']['date'].isin(nbhd['dates']), 'id'])
+        data = prepare_data(_neighborhood_dfs(dfs, nbhd, slot_ids), df_existing)
+        if nbhd['kind'] == 'dates':
+            # モデル作成の日付・スロットのループも近傍の日付だけにする
+            data['slots_by_date'] = collections.defaultdict(
+                list, {date: slots for date, slots in data['slots_by_date'].items() if date in nbhd['dates']}
+            )
+            data['all_slots'] = [slid for slid in data['all_slots'] if slid in slot_ids]
+        engine = make_engine(engine_name, time_limit, num_workers)
+        model = build_model(data, constraint_flags, engine, c5_encoding)
+        info = apply_hint(model, _keys_frame(current), eval_time_limit=time_limit)
+        status = engine.solve() if info['accepted'] else info['status']
+    solved = info['accepted'] and is_solution_status(status)
+    return {
+        'status': status,
+        'old': info['objective'],
+        'new': engine.objective_value() if solved else None,
+        'keys': solution_keys(model) if solved else [],
+        'variables': len(model['x']),
+        'wall_time': time.perf_counter() - t0,
+    }
+
+
+def _resources(keys, slot_to_date):
+    """(student, day) and (teacher, day) touched by the lessons."""
+    used = set()
+    for sid, _, tid, slid in keys:
+        date = slot_to_date[slid]
+        used.add(('s', sid, date))
+        used.add(('t', tid, date))
+    return used
+
+
+class _Caps:
+    """Request totals, desired-teacher limits and booths over the current schedule (checked on merge)."""
+
+    def __init__(self, data, constraint_flags, keys):
+        self.sessions = {(req['sid'], req['cid']): req['sessions'] for req in data['requests']}
+        self.pair_limits = data['limit_constraints']
+        c4 = constraint_flags.get('max_lesson_per_timeslot', {})
+        self.booths = None
+        if c4.get('activated') and c4.get('value') is not None:
+            self.booths = {slid: int(c4['value']) - data['existing_slot_counts'][slid] for slid in data['all_slots']}
+        self.request_used, self.pair_used, self.slot_used = (collections.Counter() for _ in range(3))
+        self.apply(keys, 1)
+
+    def apply(self, keys, sign):
+        for sid, cid, tid, slid in keys:
+            self.request_used[(sid, cid)] += sign
+            self.pair_used[(sid, cid, tid)] += sign
+            self.slot_used[slid] += sign
+
+    def fits(self, removed, added):
+        """Whether replacing removed by added keeps every cap."""
+        self.apply(removed, -1)
+        self.apply(added, 1)
+        ok = (all(self.request_used[(sid, cid)] <= self.sessions.get((sid, cid), 0) for sid, cid, _, _ in added)
+              and all(self.pair_used[(sid, cid, tid)] <= self.pair_limits[(sid, cid, tid)]
+                      for sid, cid, tid, _ in added if (sid, cid, tid) in self.pair_limits)
+              and (self.booths is None or all(self.slot_used[slid] <= self.booths.get(slid, 0)
+                                              for _, _, _, slid in added)))
+        if not ok:
+            self.apply(added, -1)
+            self.apply(removed, 1)
+        return ok
+
+
+def merge_improvements(data, constraint_flags, chosen, results, slot_to_date):
+    """
+    Merge improved neighborhoods into the schedule, best first.
+
+    Args:
+        chosen: set of current lessons (updated in place)
+        results: [(current lessons inside the neighborhood, worker result), ...]
+
+    Returns:
+        (gain merged, number merged)
+    """
+    caps = _Caps(data, constraint_flags, chosen)
+    improved = [(res['new'] - res['old'], set(current), set(res['keys']))
+                for current, res in results if res['new'] is not None and res['new'] - res['old'] > 1e-6]
+    improved.sort(key=lambda item: -item[0])
+
+    touched = set()
+    gain, merged = 0.0, 0
+    for delta, old, new in improved:
+        removed, added = old - new, new - old
+        resources = _resources(removed | added, slot_to_date)
+        if resources & touched or not caps.fits(removed, added):
+            continue
+        chosen.difference_update(removed)
+        chosen.update(added)
+        touched |= resources
+        gain += delta
+        merged += 1
+    return gain, merged
+
+
+def _full_model(data, constraint_flags, engine_name, time_limit, num_workers, c5_encoding, quiet=False):
+    engine = make_engine(engine_name, time_limit, num_workers)
+    with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+        model = build_model(data, constraint_flags, engine, c5_encoding)
+    return engine, model
+
+
+def solve_lns(data, constraint_flags, engine_name='SCIP', time_limit=30, num_workers=8, processes=None,
+              c5_encoding='pairwise', neighborhood_time_limit=NEIGHBORHOOD_TIME_LIMIT, seed=0):
+    """
+    Improve a schedule of the full model by re-solving neighborhoods (see the module docstring).
+
+    Args:
+        data: output of prep.prepare_data
+        constraint_flags: {code: {'activated', 'value'}}
+        engine_name, time_limit: engine and the total time limit (initial
+            solve, every round and the final check)
+        num_workers: CP-SAT search workers, shared among the processes
+        processes: worker processes, i.e. neighborhoods per round
+            (default: CPU count)
+        c5_encoding: passed to build_model
+        neighborhood_time_limit: time limit of one neighborhood in seconds
+        seed: seed of the neighborhood choice
+
+    Returns:
+        (status, model, df_progress): status and model of the final check
+        (the same form as engine.solve() / build_model(), so build_outputs
+        can be used as is) and one row per round with LNS_PROGRESS_COLUMNS.
+        When the initial solve is already optimal its result is returned.
+    """
+    t0 = time.perf_counter()
+    deadline = t0 + time_limit
+    processes = processes or DEFAULT_PROCESSES
+    rng = random.Random(seed)
+    slot_to_date = data['slot_to_date']
+    progress = []
+
+    def log(n, kind, objective, lessons, tried=0, improved=0, merged=0):
+        progress.append({'n': n, 'elapsed_s': round(time.perf_counter() - t0, 3),
+                         'objective': round(objective, 6), 'bound': None, 'gap_pct': None,
+                         'lessons': lessons, 'kind': kind, 'neighborhoods': tried,
+                         'improved': improved, 'merged': merged})
+
+    def frame():
+        return pd.DataFrame(progress, columns=LNS_PROGRESS_COLUMNS)
+
+    # --------------------------------------------------
+    # 初期解: 貪欲法の配置をヒントに全体モデルを短時間解く
+    # --------------------------------------------------
+    engine, model = _full_model(data, constraint_flags, engine_name, time_limit * INITIAL_SHARE,
+                                num_workers, c5_encoding)
+    build_time = time.perf_counter() - t0
+    x = model['x']
+    df_candidates = pd.DataFrame(dict(zip(CANDIDATE_COLUMNS, (x.sid, x.cid, x.tid, x.slid))))
+    greedy = set(greedy_schedule(data, constraint_flags, df_candidates))
+    pairs = [(var, 1 if key in greedy else 0) for key, var in x.items()]
+    engine.set_hint(pairs)
+    status = engine.solve()
+    if is_solution_status(status):
+        chosen = set(solution_keys(model))
+        objective = engine.objective_value()
+    else:
+        status, objective = engine.evaluate(pairs)
+        if not is_solution_status(status):
+            print(f"  ❌ 初期解が得られませんでした（{status}）")
+            return status, model, frame()
+        chosen = greedy
+    log(0, 'initial', objective, len(chosen))
+    print(f"  🔁 LNS 初期解: {objective:.2f} ({len(chosen)} コマ, 貪欲法 {len(greedy)} コマ, "
+          f"{status}, {progress[-1]['elapsed_s']:.1f}秒)")
+    if status == 'OPTIMAL':
+        print("    → 初期解が最適のため、近傍探索は行いません。")
+        return status, model, frame()
+    students = teacher_students(x)
+    del engine, model, x, df_candidates, pairs
+
+    # --------------------------------------------------
+    # 近傍探索: 近傍ごとに小さなモデルを並列で解き、重ならない改善を統合
+    # --------------------------------------------------
+    reserve = build_time + FINAL_RESERVE
+    workers_each = max(1, num_workers // processes)
+    df_fixed = data['df_existing'] if data['use_existing'] else None
+    n = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+        while True:
+            sub_limit = min(neighborhood_time_limit, deadline - reserve - time.perf_counter())
+            if sub_limit < 1:
+                break
+            kind = NEIGHBORHOOD_KINDS[n % len(NEIGHBORHOOD_KINDS)]
+            n += 1
+            tasks = []
+            for nbhd in neighborhoods(data, students, kind, processes, rng):
+                current, kept = [], []
+                for key in chosen:
+                    (current if _inside(nbhd, key, slot_to_date) else kept).append(key)
+                tasks.append((current, pool.submit(
+                    _solve_neighborhood, data['dfs'], df_fixed, kept, current, nbhd, constraint_flags,
+                    engine_name, sub_limit, workers_each, c5_encoding)))
+            results = [(current, future.result()) for current, future in tasks]
+            improved = sum(1 for _, res in results if res['new'] is not None and res['new'] - res['old'] > 1e-6)
+            gain, merged = merge_improvements(data, constraint_flags, chosen, results, slot_to_date)
+            objective += gain
+            log(n, kind, objective, len(chosen), len(results), improved, merged)
+            print(f"    第{n}ラウンド（{KIND_LABELS[kind]}）: 近傍 {len(results)} 個, 改善 {improved}, "
+                  f"統合 {merged} → {objective:.2f} ({gain:+.2f}, {progress[-1]['elapsed_s']:.1f}秒)")
+
+    # --------------------------------------------------
+    # 最終確認: 全体モデルで x を固定して全制約を確認
+    # --------------------------------------------------
+    engine, model = _full_model(data, constraint_flags, engine_name, max(deadline - time.perf_counter(), 10),
+                                num_workers, c5_encoding, quiet=True)
+    engine.fix([(var, 1 if key in chosen else 0) for key, var in model['x'].items()])
+    status = engine.solve()
+    if not is_solution_status(status):
+        print(f"  ❌ LNS の配置が全体モデルの制約を満たしません（{status}）")
+        return status, model, frame()
+    first = progress[0]['objective']
+    print(f"  ✅ LNS: {first:.2f} → {engine.objective_value():.2f}（{n} ラウンド, 全体モデルで全制約を確認, "
+          f"合計 {time.perf_counter() - t0:.1f}秒）")
+    engine.wall_time = time.perf_counter() - t0
+    return 'FEASIBLE', model, frame()
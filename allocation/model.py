@@ -0,0 +1,715 @@
+"""
+Allocation model builder.
+
+Creates the x[(sid, cid, tid, slid)] variables, the basic constraints, the
+hard constraints 1-6 and the soft constraints S1/S2 (see CONSTRAINTS.md) on
+any engine from allocation.engines.
+"""
+
+import collections
+import functools
+
+import numpy as np
+
+from allocation.candidates import build_candidates
+from allocation.prep import day_counts, person_limits, person_setting
+from allocation.presolve import print_presolve_report, prune_candidates
+from allocation.registry import VarRegistry
+from allocation.symmetry import add_symmetry_breaking, find_symmetry_classes, print_symmetry_report
+
+# 診断モードで基本制約（同時受講・同時指導など物理的に破れない行）を破る重み。
+# 基本制約だけでは実行不能にならないため、制約1〜6 の違反で説明できるならそちらを示す
+ELASTIC_BASIC_WEIGHT = 10
+
+
+def _no_slack(ub, **key):
+    return 0
+
+
+def _person_days(grouping, limits, people, slots_by_date):
+    """
+    Non-empty (person, date) buckets of the people with a limit.
+
+    Sorted like the old person x date loops (people in map order, dates in
+    slots_by_date order), so the rows are generated in the same order.
+    """
+    person_rank = {pid: k for k, pid in enumerate(people)}
+    date_rank = {date: k for k, date in enumerate(slots_by_date)}
+    keys = [key for key in grouping if key[0] in limits and key[1] in date_rank]
+    keys.sort(key=lambda key: (person_rank[key[0]], date_rank[key[1]]))
+    return keys
+
+
+def _spread_excess(engine, x, x_by_student_subject_date, existing_counts, pruned_days, day_caps):
+    """
+    Soft constraint 1 in the aggregated form.
+
+    The excess of one student-subject-day is max(0, n + e - 1) for n new
+    and e existing lessons. With an existing lesson (e >= 1) it is the
+    linear n + e - 1, so it is folded into the x coefficients and one
+    constant. Without one, an excess variable (excess >= n - 1) is only
+    needed when two or more new lessons fit on that day: different slots,
+    the remaining sessions and the day caps in day_caps ({(sid, cid, date):
+    cap} from constraints 3 and 6, only the active ones).
+
+    Returns:
+        (count, excess, fixed): count[i] = times x[i] is counted in the
+        folded part, excess = the excess variables and fixed = the constant
+        part (existing lessons, also on days without variables)
+    """
+    count = np.zeros(len(x))
+    excess, fixed = [], 0
+    for key in x_by_student_subject_date:
+        sid, cid, date = key
+        ids = x_by_student_subject_date.ids(key)
+        existing = existing_counts[key]
+        if existing:
+            count[ids] += 1
+            fixed += existing - 1
+            continue
+        n_max = min(len(np.unique(x.slid[ids])), day_caps.get(key, len(ids)))
+        if n_max <= 1:
+            continue  # 最大でも1コマなので超過なし
+        var = engine.num_var(0, n_max - 1, f'spread_{sid}_{cid}_{date}')
+        engine.add(var >= engine.sum(x_by_student_subject_date[key]) - 1)
+        excess.append(var)
+    for key in pruned_days:
+        if key not in x_by_student_subject_date and existing_counts[key] > 1:
+            fixed += existing_counts[key] - 1
+    return count, excess, fixed
+
+
+def _add_adjacency(engine, tag, busy, vars_k, cont=None, day_cap=None):
+    """
+    Soft constraint 2 for one student-day, only the pairs that can both be filled.
+
+    adj <= z_i and adj <= z_j only for the adjacent pairs that can both
+    hold a lesson under constraint 2 (cont, consecutive lessons) and
+    constraint 3 (day_cap, lessons per day) - the adj of the other pairs
+    would always be 0.
+
+    Returns:
+        (adj variables, rows added)
+    """
+    n = len(busy)
+    if cont is not None and cont < 2:
+        return [], 0  # 2コマ続けて入ることがない
+    new_left = None if day_cap is None else max(0, day_cap - sum(busy))
+    adj, rows = [], 0
+    for i in range(n - 1):
+        j = i + 1
+        if busy[i] and busy[j]:
+            continue  # 両方が既存配置（定数）
+        if not (busy[i] or vars_k[i]) or not (busy[j] or vars_k[j]):
+            continue
+        needed = (not busy[i]) + (not busy[j])
+        if new_left is not None and needed > new_left:
+            continue
+        if cont is not None and any(sum(busy[s:s + cont + 1]) + needed > cont
+                                    for s in range(max(0, j - cont), min(i, n - cont - 1) + 1)):
+            continue
+        var = engine.num_var(0, 1, f'adj_{tag}_{i}')
+        for k in (i, j):
+            if not busy[k]:
+                engine.add(var <= engine.sum(vars_k[k]))
+                rows += 1
+        adj.append(var)
+    return adj, rows
+
+
+def _add_vacant_pairwise(engine, tr_slots, val, busy, vars_k, relax=_no_slack):
+    """
+    Constraint 5, pairwise encoding: for every slot pair (i, j) further apart
+    than the limit, working both i and j requires enough work in between.
+    O(slots^2) big-M style rows per teacher-day.
+
+    relax(ub, **key) returns the slack added to the left side of a row
+    (build_model elastic mode) or 0.
+    """
+    count = 0
+    n = len(tr_slots)
+    for i in range(n):
+        for j in range(i + 1, n):
+            gap = j - i - 1
+            if gap <= val:
+                continue
+            needed = gap - val
+            vars_a, vars_b = vars_k[i], vars_k[j]
+            vars_inter = [v for k in range(i + 1, j) for v in vars_k[k]]
+            existing_inter = sum(busy[i + 1:j])
+            pair = {'slot_id': tr_slots[i][1], 'slot_id_to': tr_slots[j][1]}
+
+            if busy[i] and busy[j]:
+                # 両端が既存配置（固定）の場合
+                remaining_needed = needed - existing_inter
+                if remaining_needed > 0 and vars_inter:
+                    engine.add(engine.sum(vars_inter) + relax(remaining_needed, **pair) >= remaining_needed)
+                    count += 1
+            elif busy[i] and vars_b:
+                slack = relax(needed * len(vars_b), **pair)
+                engine.add(engine.sum(vars_inter) + existing_inter + slack >= needed * engine.sum(vars_b))
+                count += 1
+            elif busy[j] and vars_a:
+                slack = relax(needed * len(vars_a), **pair)
+                engine.add(engine.sum(vars_inter) + existing_inter + slack >= needed * engine.sum(vars_a))
+                count += 1
+            elif vars_a and vars_b:
+                slack = relax(needed * (len(vars_a) + len(vars_b) - 1), **pair)
+                engine.add(
+                    engine.sum(vars_inter) + existing_inter + slack >=
+                    needed * (engine.sum(vars_a) + engine.sum(vars_b) - 1)
+                )
+                count += 1
+    return count
+
+
+def _add_vacant_span(engine, val, busy, vars_k, tag, relax=_no_slack):
+    """
+    Constraint 5, first/last-lesson encoding, linear in the slots per teacher-day.
+
+    Binary first_j = 1 when the day's first lesson is at slot j and last_j = 1
+    when the last lesson is at slot j (at most one of each). Every worked slot
+    must come at or after some first_j and at or before some last_j:
+
+        w_k <= sum(first_j, j <= k)        w_k <= sum(last_j, j >= k)
+
+    The span length is then last - first + 1, so the vacant slots in it are
+
+        sum(j * last_j) - sum(j * first_j) + 1 - sum(w) <= val
+
+    (left side is negative on a day without lessons). A fixed existing lesson
+    at slot p means the first lesson is at or before p, so first_j is only
+    needed before the first existing lesson (and last_j after the last one),
+    and slots outside the first..last candidate / existing range are dropped.
+    Days whose range cannot exceed the limit get no rows at all. relax gives
+    the vacant-slot row its slack in elastic mode (see _add_vacant_pairwise).
+
+    Returns:
+        (rows added, auxiliary variables added)
+    """
+    # 授業が入り得るのは既存配置か候補のあるスロットのみ。その範囲外は空きに数えない
+    pos = [k for k in range(len(busy)) if busy[k] or vars_k[k]]
+    lo, hi = pos[0], pos[-1]
+    if (hi - lo - 1) - sum(busy[lo + 1:hi]) <= val:
+        return 0, 0  # 範囲内を全て空けても上限内 → 制約不要
+    busy, vars_k = busy[lo:hi + 1], vars_k[lo:hi + 1]
+    n = len(busy)
+    busy_pos = [k for k in range(n) if busy[k]]
+    p = busy_pos[0] if busy_pos else n        # 最初の既存配置
+    q = busy_pos[-1] if busy_pos else -1      # 最後の既存配置
+    rows = aux = 0
+
+    # 最初の授業の位置: p より前の候補スロットのみ変数、それ以外は既存配置 p で確定
+    first = {}
+    for k in range(p):
+        if vars_k[k]:
+            first[k] = engine.bool_var(f'vfirst_{tag}_{k}')
+            engine.add(engine.sum(vars_k[k]) <= engine.sum(list(first.values())))
+            rows += 1
+    last = {}
+    for k in range(n - 1, q, -1):
+        if vars_k[k]:
+            last[k] = engine.bool_var(f'vlast_{tag}_{k}')
+            engine.add(engine.sum(vars_k[k]) <= engine.sum(list(last.values())))
+            rows += 1
+    for markers in (first, last):
+        if len(markers) > 1:
+            engine.add(engine.sum(list(markers.values())) <= 1)
+            rows += 1
+    aux = len(first) + len(last)
+
+    # first = sum(j * first_j) + p * (1 - sum(first_j))（既存配置がなく授業もない日は 0 扱い）
+    # last  = sum(j * last_j)  + q * (1 - sum(last_j))
+    work = [v for vs in vars_k for v in vs]
+    start_terms = [(j - p) * m for j, m in first.items()] if busy_pos else [j * m for j, m in first.items()]
+    end_terms = [(j - q) * m for j, m in last.items()] if busy_pos else [j * m for j, m in last.items()]
+    if busy_pos:
+        const = q - p + 1 - len(busy_pos)
+    else:
+        # 授業がない日は first = last = 0 なので 1 - 0 <= val を満たすよう sum(last_j) を使う
+        end_terms.append(engine.sum(list(last.values())))
+        const = -len(busy_pos)
+    slack = relax(n)
+    engine.add(engine.sum(end_terms) - engine.sum(start_terms) - engine.sum(work) + const <= val + slack)
+    rows += 1
+    return rows, aux
+
+
+# build_model の戻り値に含めるグルーピング（名前: VarRegistry の列）
+MODEL_GROUPINGS = {
+    'x_by_student_subject': ('sid', 'cid'),
+    'x_by_student_subject_teacher': ('sid', 'cid', 'tid'),
+    'x_by_student_slot': ('sid', 'slid'),
+    'x_by_teacher_slot': ('tid', 'slid'),
+    'x_by_slot': ('slid',),
+    'x_by_student_subject_date': ('sid', 'cid', 'date'),
+}
+
+
+def model_groupings(x):
+    """{name: Grouping} of MODEL_GROUPINGS for a registry (build_model, allocation.model_cache)."""
+    return {name: x.group(*columns) for name, columns in MODEL_GROUPINGS.items()}
+
+
+def build_model(data, constraint_flags, engine, c5_encoding='pairwise', presolve=True, record=None,
+                elastic=False, symmetry=False, soft_encoding='aggregate', candidates=None):
+    """
+    Build the allocation model on the given engine.
+
+    Args:
+        data: output of prep.prepare_data
+        constraint_flags: {code: {'activated', 'value'}} from the constraint sheet
+        engine: ScipEngine / CpSatEngine
+        c5_encoding: 'pairwise' (O(slots^2) rows per teacher-day) or 'span'
+            (first/last-lesson markers, linear per teacher-day) for constraint 5.
+            scripts/bench_c5.py compares the two; pairwise currently solves
+            faster on both engines and stays the default.
+        presolve: drop variables fixed to 0 by used-up limits and "sum <= k"
+            rows that can never bind (see allocation.presolve); the
+            objective value is unchanged.
+        record: optional monitor.RunRecord; one lap per step ('model_variables',
+            'model_indexes', 'model_basic', 'model_c1'..'model_c6' for the
+            active constraints, 'model_s1', 'model_s2', 'model_objective')
+            with the variables / rows it added.
+        elastic: infeasibility diagnosis (see allocation.elastic). Every hard
+            row (basic and constraints 1-6) gets a slack variable, the soft
+            constraints are left out and the objective minimizes the total
+            slack (basic rows weighted ELASTIC_BASIC_WEIGHT) instead of
+            maximizing the lessons.
+        symmetry: order interchangeable teachers / students by their new
+            lessons (see allocation.symmetry; 'model_symmetry' lap). Not
+            compatible with a hint that breaks the order, and ignored in
+            elastic mode.
+        soft_encoding: 'aggregate' (S1 folded into the x coefficients on days
+            with existing lessons and an excess variable only where two new
+            lessons fit; S2 only for pairs that can both be filled under
+            constraints 2/3) or 'pairwise' (one excess variable per
+            student-subject-day and one adjacency variable per slot pair).
+            Same objective value for every schedule; scripts/bench_soft.py
+            compares the two.
+        candidates: candidates.build_candidates output for this data, when
+            it is already built (it only depends on data, not on the flags;
+            allocation.scenarios shares one across scenarios). None builds it.
+
+    Returns:
+        dict with 'x' (registry.VarRegistry, a {(sid, cid, tid, slid): var}
+        mapping), the groupings (x_by_student_subject, x_by_teacher_slot,
+        ... - {key: [var, ...]} mappings in CSR form), 'soft_vars'
+        [(var, coeff), ...] (the soft part of the objective; x variables
+        too with soft_encoding='aggregate'), 'constraint_count' (basic),
+        'extra_count' (constraints 1-6) and 'slacks' [(var, row info dict),
+        ...] (elastic mode only, else empty).
+    """
+    requests = data['requests']
+    limit_constraints = data['limit_constraints']
+    student_subject_daily_limit = data['student_subject_daily_limit']
+    slot_to_date = data['slot_to_date']
+    slots_by_date = data['slots_by_date']
+    student_busy_slots = data['student_busy_slots']
+    teacher_busy_slots = data['teacher_busy_slots']
+    existing_slot_counts = data['existing_slot_counts']
+    existing_student_subject_date_counts = data['existing_student_subject_date_counts']
+    teacher_settings = data['teacher_settings']
+    student_settings = data['student_settings']
+    s_map, t_map = data['s_map'], data['t_map']
+    dfs = data['dfs']
+
+    def lap(phase):
+        if record is not None:
+            record.lap(f'model_{phase}', engine)
+
+    if record is not None:
+        record.mark(engine)
+
+    # --------------------------------------------------
+    # 4. 最適化モデル作成
+    # --------------------------------------------------
+    print(f"  残り {len(requests)} 件のリクエストについて変数を生成中...")
+
+    # 候補 (生徒, 科目, 講師, スロット) を一括計算（I06/I51/I52 の結合 − O01 の使用済みスロット）
+    if candidates is None:
+        df_candidates = build_candidates(
+            requests, dfs['teachable'], dfs['student_avail'], dfs['teacher_avail'],
+            data['df_existing'] if data['use_existing'] else None, limit_constraints
+        )
+    else:
+        df_candidates = candidates
+    removed_vars, skipped_rows = {}, collections.Counter()
+    pruned_days = set()  # 変数が削除された (生徒, 科目, 日付)
+    if presolve:
+        df_candidates, removed_vars, df_pruned = prune_candidates(data, constraint_flags, df_candidates)
+        pruned_days = set(zip(df_pruned['sid'], df_pruned['cid'], df_pruned['slid'].map(slot_to_date)))
+    variables = [engine.bool_var(f'x_{sid}_{cid}_{tid}_{slid}')
+                 for sid, cid, tid, slid in df_candidates.itertuples(index=False, name=None)]
+    x = VarRegistry(df_candidates, variables, slot_to_date)
+    del df_candidates
+
+    print(f"  -> 生成された変数数: {len(x)}")
+    lap('variables')
+
+    # --- インデックスの構築（制約生成の高速化）: 変数 id を (生徒, スロット) などで並べた CSR 配列 ---
+    groupings = model_groupings(x)
+    x_by_student_subject = groupings['x_by_student_subject']
+    x_by_student_subject_teacher = groupings['x_by_student_subject_teacher']
+    x_by_student_slot = groupings['x_by_student_slot']
+    x_by_teacher_slot = groupings['x_by_teacher_slot']
+    x_by_slot = groupings['x_by_slot']
+    x_by_student_subject_date = groupings['x_by_student_subject_date']
+    # 制約1〜3 用: (人, 日付) ごとの変数（変数のある組だけ。人数 × 日数の全組は走査しない）
+    x_by_teacher_date = x.group('tid', 'date')
+    x_by_student_date = x.group('sid', 'date')
+
+    print(f"  -> インデックス構築完了")
+    lap('indexes')
+
+    # ==============================================
+    # 制約条件
+    # ==============================================
+    constraint_count = 0
+    slacks = []  # elastic: [(スラック変数, 行の情報), ...]
+
+    def relax(ub, section, **key):
+        """Elastic mode: a slack variable (0..ub) for one hard row and its row info; otherwise 0."""
+        if not elastic or ub <= 0:
+            return 0
+        slack = engine.num_var(0, ub, f'slack_{len(slacks)}')
+        slacks.append((slack, dict(section=section, **key)))
+        return slack
+
+    def add_cap(vars_list, limit, section, **key):
+        """sum(vars_list) <= limit; returns the number of rows added (0 if it can never bind)."""
+        if presolve and len(vars_list) <= limit:
+            skipped_rows[section] += 1
+            return 0
+        slack = relax(len(vars_list) - limit, section, limit=limit, **key)
+        engine.add(engine.sum(vars_list) <= limit + slack)
+        return 1
+
+    # --- 基本制約: 残りコマ数上限（合計） ---
+    for req in requests:
+        sid, cid, sessions = req['sid'], req['cid'], req['sessions']
+        relevant_vars = x_by_student_subject.get((sid, cid), [])
+        if relevant_vars:
+            constraint_count += add_cap(relevant_vars, sessions, '基本 残りコマ数', student_id=sid, subject_id=cid)
+
+    # --- 基本制約: 講師ごとの残りコマ数上限 ---
+    for (sid, cid, tid), limit in limit_constraints.items():
+        relevant_vars = x_by_student_subject_teacher.get((sid, cid, tid), [])
+        if relevant_vars:
+            constraint_count += add_cap(relevant_vars, limit, '基本 講師別上限',
+                                        student_id=sid, subject_id=cid, teacher_id=tid)
+
+    # --- 基本制約: 同時受講禁止（生徒は同一スロットに1つまで） ---
+    for (sid, slid), vars_s in x_by_student_slot.items():
+        if vars_s:
+            constraint_count += add_cap(vars_s, 1, '基本 同時受講禁止', student_id=sid, slot_id=slid)
+
+    # --- 基本制約: 同時指導禁止（講師は同一スロットに1つまで） ---
+    for (tid, slid), vars_t in x_by_teacher_slot.items():
+        if vars_t:
+            constraint_count += add_cap(vars_t, 1, '基本 同時指導禁止', teacher_id=tid, slot_id=slid)
+
+    print(f"  基本制約: {constraint_count} 件")
+    lap('basic')
+
+    # ==============================================
+    # 追加制約（constraint シートで ON/OFF 制御）
+    # すべてハード制約。配置数は目的関数で最大化する。
+    # ==============================================
+    extra_count = 0
+
+    # --- 制約1: 講師の1日あたりの授業数上限（講師ごと） ---
+    c1 = constraint_flags.get('max_teacher_daily_slot', {})
+    if c1.get('activated'):
+        limits = person_limits(teacher_settings, 'max_daily_slot', t_map.keys())
+        existing_by_day = day_counts(teacher_busy_slots, slot_to_date)
+        for tid, date in _person_days(x_by_teacher_date, limits, t_map.keys(), slots_by_date):
+            remaining = max(0, limits[tid] - existing_by_day[(tid, date)])
+            extra_count += add_cap(x_by_teacher_date[(tid, date)], remaining, '制約1', teacher_id=tid, date=date)
+        print(f"  制約1 ON: 講師1日上限（個人別） (+{extra_count}件)")
+        lap('c1')
+
+    # --- 制約2: 生徒の連続コマ上限（生徒ごと） ---
+    c2 = constraint_flags.get('max_student_continuous_slot', {})
+    if c2.get('activated'):
+        before = extra_count
+        limits = person_limits(student_settings, 'max_continuous_slot', s_map.keys())
+        for sid, date in _person_days(x_by_student_date, limits, s_map.keys(), slots_by_date):
+            val = limits[sid]
+            window_size = val + 1
+            tr_slots = slots_by_date[date]
+            if len(tr_slots) < window_size:
+                continue
+            busy = student_busy_slots.get(sid, ())
+            for start in range(len(tr_slots) - window_size + 1):
+                window_slot_ids = [sl for _, sl in tr_slots[start:start + window_size]]
+                vars_w = [v for slid in window_slot_ids for v in x_by_student_slot.get((sid, slid), [])]
+                if vars_w:
+                    remaining = max(0, val - sum(1 for sl in window_slot_ids if sl in busy))
+                    extra_count += add_cap(vars_w, remaining, '制約2', student_id=sid, date=date,
+                                           slot_id=window_slot_ids[0], slot_id_to=window_slot_ids[-1])
+        print(f"  制約2 ON: 生徒連続上限（個人別） (+{extra_count - before}件)")
+        lap('c2')
+
+    # --- 制約3: 生徒の1日あたり上限コマ数（生徒ごと） ---
+    c3 = constraint_flags.get('max_student_daily_slot', {})
+    if c3.get('activated'):
+        before = extra_count
+        limits = person_limits(student_settings, 'max_daily_slot', s_map.keys())
+        existing_by_day = day_counts(student_busy_slots, slot_to_date)
+        for sid, date in _person_days(x_by_student_date, limits, s_map.keys(), slots_by_date):
+            remaining = max(0, limits[sid] - existing_by_day[(sid, date)])
+            extra_count += add_cap(x_by_student_date[(sid, date)], remaining, '制約3', student_id=sid, date=date)
+        print(f"  制約3 ON: 生徒1日上限（個人別） (+{extra_count - before}件)")
+        lap('c3')
+
+    # --- 制約4: 同一時限の上限コマ数（ブース上限） ---
+    c4 = constraint_flags.get('max_lesson_per_timeslot', {})
+    if c4.get('activated'):
+        val = c4['value']
+        before = extra_count
+        for slid in data['all_slots']:
+            existing_count = existing_slot_counts[slid]
+            remaining = int(max(0, val - existing_count))
+            vars_slot = x_by_slot.get(slid, [])
+            if vars_slot:
+                extra_count += add_cap(vars_slot, remaining, '制約4', slot_id=slid)
+        print(f"  制約4 ON: 同一時限上限 {val}コマ (+{extra_count - before}件)")
+        lap('c4')
+
+    # --- 制約5: 講師の空きコマ上限数（講師ごと） ---
+    c5 = constraint_flags.get('max_teacher_continuous_vacant_slot', {})
+    if c5.get('activated'):
+        before = extra_count
+        c5_aux = 0
+        c5_warnings = []
+        for tid in t_map.keys():
+            val = person_setting(teacher_settings, tid, 'max_continuous_vacant_slot')
+            if val is None:
+                continue
+            for date, tr_slots in slots_by_date.items():
+                slot_ids = [sl for _, sl in tr_slots]
+                busy = [sl in teacher_busy_slots[tid] for sl in slot_ids]
+                vars_k = [x_by_teacher_slot.get((tid, sl), []) for sl in slot_ids]
+
+                # 既存配置どうしの間で上限を超え、埋められる候補がない組は警告（制約はスキップ）
+                busy_pos = [k for k, b in enumerate(busy) if b]
+                skipped = False
+                for ai, a in enumerate(busy_pos):
+                    for b in busy_pos[ai + 1:]:
+                        gap = b - a - 1
+                        if gap - val - sum(busy[a + 1:b]) > 0 and not any(vars_k[a + 1:b]):
+                            skipped = True
+                            c5_warnings.append(
+                                f"{t_map.get(tid)} {date}: 既存配置間の空きコマ({gap}コマ)が上限({val})を超えていますが、埋められる候補がありません"
+                            )
+
+                if not any(vars_k):
+                    continue
+                relax_day = functools.partial(relax, section='制約5', teacher_id=tid, date=date, limit=val)
+                if skipped or c5_encoding == 'pairwise':
+                    # 警告のある日は従来どおり組ごとに判定する（スキップした組以外は制約する）
+                    extra_count += _add_vacant_pairwise(engine, tr_slots, val, busy, vars_k, relax_day)
+                else:
+                    rows, aux = _add_vacant_span(engine, val, busy, vars_k, f'{tid}_{date}', relax_day)
+                    extra_count += rows
+                    c5_aux += aux
+
+        aux_note = f", 補助変数{c5_aux}個" if c5_aux else ""
+        print(f"  制約5 ON: 講師空きコマ上限（個人別） (+{extra_count - before}件{aux_note})")
+        for w in c5_warnings:
+            print(f"    ⚠️ {w}")
+        lap('c5')
+
+    # --- 制約6: 生徒の科目ごとの1日受講コマ数上限（I07のmax_daily_subject_slot） ---
+    c6 = constraint_flags.get('max_student_subject_daily_slot', {})
+    if c6.get('activated'):
+        before = extra_count
+        for (sid, cid, date), vars_list in x_by_student_subject_date.items():
+            limit = student_subject_daily_limit.get((sid, cid))
+            if limit is None:
+                continue
+            existing_count = existing_student_subject_date_counts[(sid, cid, date)]
+            remaining = max(0, limit - existing_count)
+            if vars_list:
+                extra_count += add_cap(vars_list, remaining, '制約6', student_id=sid, subject_id=cid, date=date)
+        print(f"  制約6 ON: 生徒科目別1日上限（個人別） (+{extra_count - before}件)")
+        lap('c6')
+
+    print(f"  制約合計: {constraint_count + extra_count} 件")
+    if presolve:
+        print_presolve_report(removed_vars, dict(skipped_rows))
+
+    # --- 対称性の除去: 入れ替え可能な講師・生徒を新規コマ数の順に並べる ---
+    if symmetry and not elastic:
+        classes = find_symmetry_classes(data)
+        print_symmetry_report(classes, add_symmetry_breaking(engine, x, classes))
+        lap('symmetry')
+
+    # ==============================================
+    # ソフト制約（目的関数へのペナルティ/ボーナス）
+    # 重み < 1.0 なので配置数は絶対に減らない
+    # ==============================================
+    soft_vars = []  # [(var, coefficient), ...]
+    spread_coeff = None  # aggregate: ソフト制約1 で x の係数に加える値（変数 id 順）
+
+    # --- ソフト制約1: 科目分散（同じ科目は同じ日に固まらないほうがよい） ---
+    cs1 = constraint_flags.get('soft_spread_subject_across_days', {})
+    if cs1.get('activated') and cs1.get('value') is not None and not elastic and soft_encoding == 'aggregate':
+        w1 = cs1['value']
+        # 既存配置のある日は x の係数と定数にまとめ、ない日は2コマ以上入りうる日だけ超過変数を作る
+        sessions = {(req['sid'], req['cid']): req['sessions'] for req in requests}
+        day_left = {}
+        if c3.get('activated'):
+            limits = person_limits(student_settings, 'max_daily_slot', s_map.keys())
+            existing_by_day = day_counts(student_busy_slots, slot_to_date)
+            day_left = {(sid, date): max(0, limits[sid] - existing_by_day[(sid, date)])
+                        for sid, date in x_by_student_date if sid in limits}
+        day_caps = {}
+        for sid, cid, date in x_by_student_subject_date:
+            caps = [sessions.get((sid, cid)), day_left.get((sid, date)),
+                    student_subject_daily_limit.get((sid, cid)) if c6.get('activated') else None]
+            caps = [c for c in caps if c is not None]
+            if caps:
+                day_caps[(sid, cid, date)] = min(caps)
+        count, excess, fixed = _spread_excess(engine, x, x_by_student_subject_date,
+                                              existing_student_subject_date_counts, pruned_days, day_caps)
+        spread_coeff = -w1 * count
+        soft_vars.extend((var, -w1) for var in excess)
+        if fixed:
+            soft_vars.append((engine.num_var(fixed, fixed, 'spread_fixed'), -w1))
+        soft1_count = len(excess) + (1 if fixed else 0)
+        print(f"  ソフト制約1 ON: 科目分散 weight={w1} (+{soft1_count}個の補助変数, "
+              f"x {int((count > 0).sum())}個の係数に -{w1})")
+        lap('s1')
+    elif cs1.get('activated') and cs1.get('value') is not None and not elastic:
+        w1 = cs1['value']
+        soft1_count = 0
+        for (sid, cid, date), vars_list in x_by_student_subject_date.items():
+            if not vars_list:
+                continue
+            existing_count = existing_student_subject_date_counts[(sid, cid, date)]
+            total_in_day = len(vars_list) + existing_count
+            if total_in_day <= 1:
+                continue  # 最大でも1コマなのでペナルティ不要
+            excess = engine.num_var(0, total_in_day - 1, f'spread_{sid}_{cid}_{date}')
+            engine.add(excess >= engine.sum(vars_list) + existing_count - 1)
+            soft_vars.append((excess, -w1))
+            soft1_count += 1
+        # プリソルブで変数が全て削除された日も、既存配置による分のペナルティは目的関数に残す（値を固定）
+        for (sid, cid, date) in pruned_days:
+            existing_count = existing_student_subject_date_counts[(sid, cid, date)]
+            if (sid, cid, date) in x_by_student_subject_date or existing_count <= 1:
+                continue
+            excess = engine.num_var(existing_count - 1, existing_count - 1, f'spread_{sid}_{cid}_{date}')
+            soft_vars.append((excess, -w1))
+            soft1_count += 1
+        print(f"  ソフト制約1 ON: 科目分散 weight={w1} (+{soft1_count}個の補助変数)")
+        lap('s1')
+
+    # --- ソフト制約2: 連続配置ボーナス（生徒のコマはなるべく連続） ---
+    cs2 = constraint_flags.get('soft_student_consecutive_slots', {})
+    if cs2.get('activated') and cs2.get('value') is not None and not elastic and soft_encoding == 'aggregate':
+        w2 = cs2['value']
+        soft2_count = soft2_rows = 0
+        # 変数のある (生徒, 日付) だけを走査し、制約2・3 で両方に入りえないペアは作らない
+        cont_limits = person_limits(student_settings, 'max_continuous_slot', s_map.keys()) if c2.get('activated') else {}
+        day_limits = person_limits(student_settings, 'max_daily_slot', s_map.keys()) if c3.get('activated') else {}
+        for sid, date in _person_days(x_by_student_date, s_map, s_map.keys(), slots_by_date):
+            tr_slots = slots_by_date[date]
+            busy_slots = student_busy_slots.get(sid, ())
+            busy = [sl in busy_slots for _, sl in tr_slots]
+            vars_k = [x_by_student_slot.get((sid, sl), []) for _, sl in tr_slots]
+            cont = cont_limits.get(sid)
+            if cont is not None and len(tr_slots) < cont + 1:
+                cont = None  # 制約2 の窓がない日
+            adj_vars, rows = _add_adjacency(engine, f'{sid}_{date}', busy, vars_k, cont, day_limits.get(sid))
+            soft_vars.extend((adj, w2) for adj in adj_vars)
+            soft2_count += len(adj_vars)
+            soft2_rows += rows
+        print(f"  ソフト制約2 ON: 連続配置ボーナス weight={w2} (+{soft2_count}個の補助変数, {soft2_rows}行)")
+        lap('s2')
+    elif cs2.get('activated') and cs2.get('value') is not None and not elastic:
+        w2 = cs2['value']
+        soft2_count = 0
+        for sid in s_map.keys():
+            for date, tr_slots in slots_by_date.items():
+                for idx in range(len(tr_slots) - 1):
+                    slot_i = tr_slots[idx][1]
+                    slot_j = tr_slots[idx + 1][1]
+
+                    has_i_existing = slot_i in student_busy_slots[sid]
+                    has_j_existing = slot_j in student_busy_slots[sid]
+                    vars_i = x_by_student_slot.get((sid, slot_i), [])
+                    vars_j = x_by_student_slot.get((sid, slot_j), [])
+
+                    # 両方が既存配置の場合はスキップ（定数なので最適化に影響なし）
+                    if has_i_existing and has_j_existing:
+                        continue
+                    # どちらかにも変数がない＆既存もない場合はスキップ
+                    if not has_i_existing and not vars_i:
+                        continue
+                    if not has_j_existing and not vars_j:
+                        continue
+
+                    adj = engine.num_var(0, 1, f'adj_{sid}_{date}_{idx}')
+                    # adj <= z_i
+                    if has_i_existing:
+                        pass  # z_i = 1, adj <= 1 は変数定義で保証済み
+                    else:
+                        engine.add(adj <= engine.sum(vars_i))
+                    # adj <= z_j
+                    if has_j_existing:
+                        pass  # z_j = 1, adj <= 1 は変数定義で保証済み
+                    else:
+                        engine.add(adj <= engine.sum(vars_j))
+
+                    soft_vars.append((adj, w2))
+                    soft2_count += 1
+        print(f"  ソフト制約2 ON: 連続配置ボーナス weight={w2} (+{soft2_count}個の補助変数)")
+        lap('s2')
+
+    if soft_vars:
+        print(f"  ソフト制約 補助変数合計: {len(soft_vars)} 個")
+
+    if elastic:
+        # 診断モード: 制約違反（スラック）の合計を最小化
+        print(f"  スラック変数: {len(slacks)} 個")
+        engine.maximize([(slack, -ELASTIC_BASIC_WEIGHT if info['section'].startswith('基本') else -1)
+                         for slack, info in slacks])
+    else:
+        # 目的関数: 配置数を最大化 + ソフト制約
+        if spread_coeff is None:
+            engine.maximize([(v, 1) for v in x.values()] + soft_vars)
+        else:
+            # ソフト制約1（aggregate）の分は x の係数にまとめる（同じ変数を2回渡すと SCIP では上書きになる）
+            engine.maximize(list(zip(x.values(), (1 + spread_coeff).tolist())) + soft_vars)
+            soft_vars = soft_vars + [(x.values()[i], float(spread_coeff[i]))
+                                     for i in np.flatnonzero(spread_coeff).tolist()]
+    lap('objective')
+
+    return {
+        'engine': engine,
+        'x': x,
+        **groupings,
+        'soft_vars': soft_vars,
+        'constraint_count': constraint_count,
+        'extra_count': extra_count,
+        'slacks': slacks,
+    }
+
+
+def solution_keys(model, values=None):
+    """
+    (sid, cid, tid, slid) keys of the x variables set to 1, in x order.
+
+    values: x values of an incumbent (allocation.anytime) in x order; by
+    default the last solution of the engine.
+    """
+    x = model['x']
+    if not x:
+        return []
+    if values is None:
+        values = model['engine'].values(list(x.values()))
+    chosen = np.asarray(values) > 0.5
+    return [key for key, on in zip(x.keys(), chosen.tolist()) if on]
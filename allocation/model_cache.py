@@ -0,0 +1,222 @@
+"""
+Local two-tier cache of built models and solve results.
+
+Re-running cell 3 (or run_csv_dir) with unchanged inputs and settings used
+to build the model and solve it again. With a cache directory run_allocation
+looks up two tiers, both keyed by a canonical hash of the normalized input
+sheets, the fixed existing O01 rows and the constraint flags (input_key):
+
+  1. Model: the built model as the engine's proto file (MPModelProto for
+     SCIP, CpModelProto for CP-SAT) plus the x registry columns and the soft
+     terms, keyed by the inputs, the engine and the build options. A run
+     that only changes the time limit, the workers or the hint loads it
+     instead of building the model.
+  2. Solution: the new lessons and the solver statistics of a solved run,
+     keyed by the model key, the solve settings and the hint. An identical
+     rerun returns them without building or solving anything (single-model
+     solve without snapshot / gap limit / lexicographic only).
+
+Entries are files in one directory; the least recently used entries are
+removed once the directory grows beyond max_mb. Hits and misses go to the
+run record (RunRecord.cache).
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from allocation.candidates import CANDIDATE_COLUMNS
+from allocation.model import model_groupings
+from allocation.registry import VarRegistry
+
+CACHE_VERSION = 2  # build_model の組み立て方が変わったら上げる（古いモデル・解を使わない）
+
+DEFAULT_MAX_MB = 500
+
+TIER_LABELS = {'solution': '解', 'model': 'モデル'}
+
+_RESULT_LABELS = {'hit': 'ヒット', 'miss': 'ミス'}
+
+
+def _hash_frame(digest, name, df):
+    """Feed one DataFrame (columns, dtypes and values in row order) into digest."""
+    digest.update(name.encode('utf-8'))
+    if df is None:
+        digest.update(b'none')
+        return
+    digest.update(json.dumps([list(map(str, df.columns)), list(map(str, df.dtypes))]).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+
+
+def _json_key(*parts):
+    payload = json.dumps([CACHE_VERSION, *parts], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def input_key(dfs, df_fixed, constraint_flags):
+    """Canonical hash of the normalized input sheets, the fixed O01 rows and the constraint flags."""
+    digest = hashlib.sha1(_json_key(constraint_flags).encode('utf-8'))
+    for key in sorted(dfs):
+        _hash_frame(digest, key, dfs[key])
+    _hash_frame(digest, 'existing', df_fixed)
+    return digest.hexdigest()
+
+
+def cache_keys(dfs, df_fixed, df_hint, constraint_flags, engine_name, time_limit, num_workers,
+               gap_limit=None, **build_options):
+    """
+    {'model': key, 'solution': key} of one run.
+
+    build_options: build_model keyword arguments that change the model
+    (e.g. symmetry); time_limit, num_workers, gap_limit and the hint only
+    change the solution key.
+    """
+    model = _json_key(input_key(dfs, df_fixed, constraint_flags), engine_name.upper(), build_options)
+    hint = hashlib.sha1()
+    _hash_frame(hint, 'hint', df_hint)
+    solution = _json_key(model, float(time_limit), int(num_workers), gap_limit, hint.hexdigest())
+    return {'model': model, 'solution': solution}
+
+
+# ------------------------------------------------------------
+# Files and LRU eviction
+# ------------------------------------------------------------
+
+def _paths(cache_dir, tier, key):
+    stem = os.path.join(cache_dir, f'{tier}_{key}')
+    return [f'{stem}.pb', f'{stem}.npz'] if tier == 'model' else [f'{stem}.npz']
+
+
+def _touch(paths):
+    for path in paths:
+        os.utime(path)
+
+
+def _save_npz(path, **arrays):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+
+
+def _entries(cache_dir):
+    """{entry stem: (bytes, last used)} of the cache files (the .pb and .npz of a model are one entry)."""
+    entries = {}
+    for name in os.listdir(cache_dir):
+        stem, ext = os.path.splitext(name)
+        if ext not in ('.pb', '.npz') or not stem.startswith(tuple(f'{tier}_' for tier in TIER_LABELS)):
+            continue
+        stat = os.stat(os.path.join(cache_dir, name))
+        size, used = entries.get(stem, (0, 0.0))
+        entries[stem] = (size + stat.st_size, max(used, stat.st_mtime))
+    return entries
+
+
+def evict(cache_dir, max_mb=DEFAULT_MAX_MB):
+    """Remove the least recently used entries until the cache is at most max_mb; returns how many."""
+    entries = _entries(cache_dir)
+    total = sum(size for size, _ in entries.values())
+    removed = 0
+    for stem, (size, _) in sorted(entries.items(), key=lambda item: item[1][1]):
+        if total <= max_mb * 2**20:
+            break
+        for ext in ('.pb', '.npz'):
+            path = os.path.join(cache_dir, stem + ext)
+            if os.path.exists(path):
+                os.remove(path)
+        total -= size
+        removed += 1
+    return removed
+
+
+# ------------------------------------------------------------
+# Tier 1: built models
+# ------------------------------------------------------------
+
+def save_model(cache_dir, key, model, max_mb=DEFAULT_MAX_MB):
+    """Store a build_model result; returns the number of entries evicted to stay within max_mb."""
+    os.makedirs(cache_dir, exist_ok=True)
+    engine, x = model['engine'], model['x']
+    pb_path, npz_path = _paths(cache_dir, 'model', key)
+    engine.export_model(f'{pb_path}.tmp')
+    os.replace(f'{pb_path}.tmp', pb_path)
+    meta = {'engine': engine.name, 'constraint_count': model['constraint_count'],
+            'extra_count': model['extra_count']}
+    _save_npz(
+        npz_path, sid=x.sid, cid=x.cid, tid=x.tid, slid=x.slid,
+        x_index=np.array([engine.var_index(var) for var in x.values()], dtype=np.int64),
+        soft_index=np.array([engine.var_index(var) for var, _ in model['soft_vars']], dtype=np.int64),
+        soft_coeff=np.array([coeff for _, coeff in model['soft_vars']], dtype=float),
+        meta=np.array(json.dumps(meta)),
+    )
+    return evict(cache_dir, max_mb)
+
+
+def load_model(cache_dir, key, engine, slot_to_date):
+    """
+    A stored model loaded into engine (a new make_engine engine), in the
+    build_model result form; None when it is not in the cache.
+    """
+    paths = _paths(cache_dir, 'model', key)
+    if not all(os.path.exists(path) for path in paths):
+        return None
+    with np.load(paths[1]) as f:
+        arrays = {name: f[name] for name in f.files}
+    meta = json.loads(str(arrays['meta']))
+    if meta['engine'] != engine.name:
+        return None
+    variables = engine.load_model(paths[0])
+    df_candidates = pd.DataFrame({col: arrays[col] for col in CANDIDATE_COLUMNS})
+    x = VarRegistry(df_candidates, [variables[i] for i in arrays['x_index'].tolist()], slot_to_date)
+    _touch(paths)
+    return {
+        'engine': engine,
+        'x': x,
+        **model_groupings(x),
+        'soft_vars': [(variables[i], coeff)
+                      for i, coeff in zip(arrays['soft_index'].tolist(), arrays['soft_coeff'].tolist())],
+        'constraint_count': meta['constraint_count'],
+        'extra_count': meta['extra_count'],
+        'slacks': [],
+    }
+
+
+# ------------------------------------------------------------
+# Tier 2: solve results
+# ------------------------------------------------------------
+
+def save_solution(cache_dir, key, keys, solver, max_mb=DEFAULT_MAX_MB):
+    """
+    Store the new lessons ((sid, cid, tid, slid) keys, model.solution_keys)
+    and the solver statistics (RunRecord.solver) of a solved run; returns
+    the number of entries evicted.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    columns = [np.array(col, dtype=np.int64) for col in zip(*keys)] if keys else [np.zeros(0, np.int64)] * 4
+    _save_npz(_paths(cache_dir, 'solution', key)[0], **dict(zip(CANDIDATE_COLUMNS, columns)),
+              meta=np.array(json.dumps(solver, default=str)))
+    return evict(cache_dir, max_mb)
+
+
+def load_solution(cache_dir, key):
+    """{'keys': [(sid, cid, tid, slid), ...], 'solver': statistics} of a stored run, or None."""
+    path = _paths(cache_dir, 'solution', key)[0]
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as f:
+        keys = list(zip(*(f[col].tolist() for col in CANDIDATE_COLUMNS)))
+        solver = json.loads(str(f['meta']))
+    _touch([path])
+    return {'keys': keys, 'solver': solver}
+
+
+def print_model_cache_report(cache):
+    """Print the tiers looked up in this run (RunRecord.cache) and the evicted entries."""
+    if not cache:
+        return
+    tiers = ', '.join(f"{TIER_LABELS[tier]} {_RESULT_LABELS[cache[tier]]}" for tier in TIER_LABELS if tier in cache)
+    evicted = f"（古いエントリを {cache['evicted']} 件削除）" if cache.get('evicted') else ""
+    print(f"🗃 モデルキャッシュ: {tiers}{evicted}")
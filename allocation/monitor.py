@@ -0,0 +1,202 @@
+"""
+Resource measurement helpers.
+
+PeakMemory samples the resident set size (RSS) of the current process in a
+background thread, so the memory held by the solver's C++ side is included
+(tracemalloc only sees Python objects).
+
+RunRecord times the phases of one run (reading, preprocessing, each
+constraint family, solve, output), records the peak RSS and the variables /
+constraints added per phase plus the solver statistics, and saves them as a
+JSON / CSV run record. It only reads clocks, /proc and engine counters, so it
+is cheap enough to stay on; tracemalloc (peak of Python objects) is opt-in
+because it slows the model build down several times.
+"""
+
+import json
+import os
+import resource
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+from allocation.engines import mip_gap
+
+STATM_PATH = '/proc/self/statm'
+
+
+def current_rss_mb():
+    """Current RSS in MB (Linux /proc); falls back to the lifetime peak elsewhere."""
+    try:
+        with open(STATM_PATH) as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class PeakMemory:
+    """
+    Context manager recording the peak RSS while the block runs.
+
+    Usage:
+        with PeakMemory() as mem:
+            ...
+        print(mem.peak_mb, mem.start_mb)
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.start_mb = 0.0
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+    def __enter__(self):
+        self.start_mb = self.peak_mb = current_rss_mb()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, current_rss_mb())
+        return False
+
+
+class RunRecord:
+    """
+    Phase timings, memory and model size of one optimization run.
+
+    Usage:
+        record = RunRecord().start()
+        ...                                 # read inputs
+        record.lap('prepare')
+        record.mark(engine)                 # count model size from here
+        build_model(data, flags, engine, record=record)   # laps per family
+        status = engine.solve()
+        record.lap('solve', engine)
+        record.solver_stats(engine, status)
+        record.save('/content/run_record')  # run_record.json / run_record.csv
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.phases = []
+        self.solver = {}
+        self.meta = {}
+        self.cache = {}  # モデルキャッシュ: {'solution' / 'model': 'hit' | 'miss', 'evicted': 件数}
+        self._memory = PeakMemory()
+        self._tracing = False
+        self._t0 = self._last = time.perf_counter()  # start() で計測開始時刻を取り直す
+        self._sizes = (0, 0)
+
+    def start(self):
+        self._memory.__enter__()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        self._t0 = self._last = time.perf_counter()
+        return self
+
+    def stop(self):
+        self._memory.__exit__()
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    @staticmethod
+    def _engine_size(engine):
+        return (engine.num_variables(), engine.num_constraints()) if engine is not None else (0, 0)
+
+    def mark(self, engine=None):
+        """Restart the phase clock and count model size from the engine's current size."""
+        self._last = time.perf_counter()
+        self._sizes = self._engine_size(engine)
+
+    def lap(self, phase, engine=None):
+        """Close the phase running since the last lap / mark."""
+        now = time.perf_counter()
+        row = {
+            'phase': phase,
+            'seconds': round(now - self._last, 4),
+            'peak_rss_mb': round(self._memory.peak_mb, 1),
+        }
+        self._memory.peak_mb = current_rss_mb()
+        if tracemalloc.is_tracing():
+            row['peak_traced_mb'] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+            tracemalloc.reset_peak()
+        if engine is not None:
+            sizes = self._engine_size(engine)
+            row['variables_added'] = sizes[0] - self._sizes[0]
+            row['constraints_added'] = sizes[1] - self._sizes[1]
+            self._sizes = sizes
+        self.phases.append(row)
+        self._last = time.perf_counter()
+
+    def solver_stats(self, engine, status):
+        """Record status, objective, bound, gap, wall time and the engine's search statistics."""
+        gap = mip_gap(engine, status)
+        self.solver = dict({
+            'engine': type(engine).__name__,
+            'status': status,
+            'wall_time': round(engine.wall_time, 3),
+            'objective': round(engine.objective_value(), 6) if gap is not None else None,
+            'bound': round(engine.best_bound(), 6) if gap is not None else None,
+            'gap': round(gap, 6) if gap is not None else None,
+            'variables': engine.num_variables(),
+            'constraints': engine.num_constraints(),
+        }, **engine.stats())
+
+    def to_dict(self):
+        return {
+            'meta': self.meta,
+            'total_seconds': round(time.perf_counter() - self._t0, 3),
+            'peak_rss_mb': round(max([p['peak_rss_mb'] for p in self.phases] or [0.0]), 1),
+            'phases': self.phases,
+            'solver': self.solver,
+            'cache': self.cache,
+        }
+
+    def to_frame(self):
+        """One row per phase; the solver statistics and model cache results are columns of the 'solve' row."""
+        df = pd.DataFrame(self.phases)
+        for col in ['variables_added', 'constraints_added']:
+            if col in df.columns:
+                df[col] = df[col].astype('Int64')
+        for key, val in self.solver.items():
+            df[f'solver_{key}'] = df['phase'].map({'solve': val}) if not df.empty else None
+        for key, val in self.cache.items():
+            df[f'cache_{key}'] = df['phase'].map({'solve': val}) if not df.empty else None
+        return df
+
+    def save(self, prefix):
+        """Write prefix.json (everything) and prefix.csv (phase table); return the two paths."""
+        json_path, csv_path = f'{prefix}.json', f'{prefix}.csv'
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2, default=str)
+        self.to_frame().to_csv(csv_path, index=False, encoding='utf-8')
+        return json_path, csv_path
+
+    def print_summary(self, top=5):
+        """Print the slowest phases and the solver statistics."""
+        info = self.to_dict()
+        print(f"⏱ 実行記録: 合計 {info['total_seconds']:.1f}秒, ピークメモリ {info['peak_rss_mb']:.0f}MB")
+        for p in sorted(self.phases, key=lambda p: -p['seconds'])[:top]:
+            added = f", +{p['constraints_added']}制約" if p.get('constraints_added') else ""
+            print(f"    {p['phase']}: {p['seconds']:.2f}秒{added}")
+        if self.solver:
+            stats = ', '.join(f"{k}={v}" for k, v in self.solver.items() if k not in ('engine', 'status'))
+            print(f"    ソルバー: {stats}")
+        if self.cache:
+            hits = sum(1 for v in self.cache.values() if v == 'hit')
+            misses = sum(1 for v in self.cache.values() if v == 'miss')
+            print(f"    モデルキャッシュ: ヒット {hits} / ミス {misses}")
@@ -0,0 +1,240 @@
+"""
+Preprocessing for the allocation model.
+
+Builds the lookup structures (availability sets, slot helpers, resources
+consumed by fixed existing allocations) and the list of remaining requests
+from the normalized input DataFrames.
+"""
+
+import collections
+
+import numpy as np
+import pandas as pd
+
+
+def group_sets(df, key, value):
+    """defaultdict(set) {key: {value, ...}} built from sorted arrays instead of row iteration."""
+    out = collections.defaultdict(set)
+    if df.empty:
+        return out
+    keys = df[key].to_numpy()
+    values = df[value].to_numpy()
+    order = np.argsort(keys, kind='stable')
+    keys, values = keys[order], values[order]
+    bounds = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+    for k, chunk in zip(keys[np.r_[0, bounds]].tolist(), np.split(values, bounds)):
+        out[k] = set(chunk.tolist())
+    return out
+
+
+def group_counts(df, keys):
+    """{key tuple (or key): row count} via groupby().size()."""
+    if df.empty:
+        return {}
+    return df.groupby(keys, sort=False).size().to_dict()
+
+
+def int_column(df, col):
+    """Integer array of a column; blank / non-numeric / missing column -> 0."""
+    if col not in df.columns:
+        return np.zeros(len(df), dtype='int64')
+    return pd.to_numeric(df[col], errors='coerce').fillna(0).to_numpy().astype('int64')
+
+
+def person_setting(settings, pid, column):
+    """Integer per-person setting (teacher / student sheet column), or None when blank."""
+    val_raw = settings.get(pid, {}).get(column, '')
+    if val_raw == '' or pd.isna(val_raw):
+        return None
+    return int(val_raw)
+
+
+def person_limits(settings, column, people):
+    """{pid: int setting} of the people whose setting is not blank."""
+    out = {}
+    for pid in people:
+        val = person_setting(settings, pid, column)
+        if val is not None:
+            out[pid] = val
+    return out
+
+
+def day_counts(busy_slots, slot_to_date):
+    """Counter {(pid, date): fixed lessons}."""
+    return collections.Counter((pid, slot_to_date[sl]) for pid, slots in busy_slots.items() for sl in slots)
+
+
+def prepare_data(dfs, df_existing=None):
+    """
+    Build the preprocessed data used by the model builder and the reports.
+
+    Args:
+        dfs: normalized input DataFrames keyed like inputs.SHEET_NAMES
+        df_existing: O01 rows to keep fixed (追記配置), or None / empty
+
+    Returns:
+        dict with the name maps (s_map, t_map, c_map, tr_map, slot_map), the
+        availability and slot helpers, the busy slots and existing counters,
+        requests, limit_constraints, student_subject_daily_limit and the
+        per-person settings.
+    """
+    df_subjects = dfs['subjects']
+    df_time_ranges = dfs['time_ranges']
+    df_students = dfs['students']
+    df_teachers = dfs['teachers']
+    df_slots = dfs['slots']
+    df_teachable = dfs['teachable']
+    df_reqs = dfs['student_reqs']
+    df_s_avail = dfs['student_avail']
+    df_t_avail = dfs['teacher_avail']
+
+    use_existing = df_existing is not None and not df_existing.empty
+    if not use_existing:
+        df_existing = pd.DataFrame()
+
+    # マッピング作成
+    s_map = dict(zip(df_students['id'], df_students['student_name']))
+    t_map = dict(zip(df_teachers['id'], df_teachers['teacher_name']))
+    c_map = dict(zip(df_subjects['id'], df_subjects['subject_name']))
+    tr_map = dict(zip(df_time_ranges['id'], df_time_ranges['description']))
+
+    # --------------------------------------------------
+    # 1. 前処理
+    # --------------------------------------------------
+    tr_labels = df_slots['time_range_id'].map(lambda tr: tr_map.get(tr, tr)).astype(str)
+    slot_map = dict(zip(df_slots['id'].tolist(), (df_slots['date'].astype(str) + ' (' + tr_labels + ')').tolist()))
+
+    # 指導可能辞書
+    teachable_dict = group_sets(df_teachable, 'teacher_id', 'subject_id')
+
+    # 空き状況セット (Base Availability)
+    student_avail_set = group_sets(df_s_avail, 'student_id', 'slot_id')
+    teacher_avail_set = group_sets(df_t_avail, 'teacher_id', 'slot_id')
+
+    # スロットのヘルパー構造
+    slot_to_date = dict(zip(df_slots['id'], df_slots['date']))
+    slot_to_tr = dict(zip(df_slots['id'], df_slots['time_range_id']))
+
+    # 日付ごとのスロット一覧 (time_range_id昇順)
+    slots_by_date = collections.defaultdict(list)
+    for date, tr, slid in zip(df_slots['date'].tolist(), df_slots['time_range_id'].tolist(), df_slots['id'].tolist()):
+        slots_by_date[date].append((tr, slid))
+    for date in slots_by_date:
+        slots_by_date[date].sort()
+
+    # --------------------------------------------------
+    # 2. 既存配置によるリソース消費の反映
+    # --------------------------------------------------
+    student_busy_slots = collections.defaultdict(set)
+    teacher_busy_slots = collections.defaultdict(set)
+
+    existing_counts = collections.defaultdict(int)
+    existing_teacher_counts = collections.defaultdict(int)
+    existing_slot_counts = collections.defaultdict(int)
+    existing_student_subject_date_counts = collections.defaultdict(int)
+
+    if use_existing:
+        df_ex = pd.DataFrame({
+            'sid': df_existing['student_id'].to_numpy(),
+            'tid': df_existing['teacher_id'].to_numpy(),
+            'cid': df_existing['subject_id'].to_numpy(),
+            'slid': df_existing['slot_id'].to_numpy(),
+        })
+        df_ex['date'] = [slot_to_date[slid] for slid in df_ex['slid'].tolist()]
+
+        student_busy_slots.update(group_sets(df_ex, 'sid', 'slid'))
+        teacher_busy_slots.update(group_sets(df_ex, 'tid', 'slid'))
+
+        existing_counts.update(group_counts(df_ex, ['sid', 'cid']))
+        existing_teacher_counts.update(group_counts(df_ex, ['sid', 'cid', 'tid']))
+        existing_slot_counts.update(group_counts(df_ex, 'slid'))
+        existing_student_subject_date_counts.update(group_counts(df_ex, ['sid', 'cid', 'date']))
+
+    # --------------------------------------------------
+    # 3. リクエスト情報の構築 (残りコマ数の計算)
+    # --------------------------------------------------
+    all_slots = df_slots['id'].tolist()
+    all_teachers = df_teachers['id'].tolist()
+
+    requests = []
+    limit_constraints = {}
+    student_subject_daily_limit = {}
+
+    # 講師指定なしの場合の候補講師（all_teachers の順）
+    teachers_by_subject = collections.defaultdict(list)
+    for tid in all_teachers:
+        for cid in teachable_dict.get(tid, ()):
+            teachers_by_subject[cid].append(tid)
+
+    if not df_reqs.empty:
+        sids = int_column(df_reqs, 'student_id')
+        cids = int_column(df_reqs, 'subject_id')
+        remaining = int_column(df_reqs, 'sessions') - np.array(
+            [existing_counts.get(key, 0) for key in zip(sids.tolist(), cids.tolist())], dtype='int64')
+        mdss = int_column(df_reqs, 'max_daily_subject_slot')
+        desired = [(int_column(df_reqs, f'desired_teacher_{i}'), int_column(df_reqs, f'max_slot_{i}'))
+                   for i in range(1, 4)]
+
+        for k in np.flatnonzero(remaining > 0).tolist():
+            sid, cid, remaining_sessions = int(sids[k]), int(cids[k]), int(remaining[k])
+
+            # 科目ごとの1日受講コマ数上限
+            if mdss[k] > 0:
+                student_subject_daily_limit[(sid, cid)] = int(mdss[k])
+
+            desired_teachers = []
+            for t_col, limit_col in desired:
+                if t_col[k] == 0:
+                    continue
+                tid = int(t_col[k])
+                desired_teachers.append(tid)
+
+                if limit_col[k] != 0:
+                    already_by_teacher = existing_teacher_counts[(sid, cid, tid)]
+                    limit_constraints[(sid, cid, tid)] = max(0, int(limit_col[k]) - already_by_teacher)
+                else:
+                    limit_constraints[(sid, cid, tid)] = remaining_sessions
+
+            if not desired_teachers:
+                desired_teachers = list(teachers_by_subject.get(cid, []))
+
+            requests.append({
+                'sid': sid,
+                'cid': cid,
+                'sessions': remaining_sessions,
+                'allowed_teachers': desired_teachers
+            })
+
+    # 個人別設定のマッピング作成
+    teacher_settings = dict(zip(df_teachers['id'].tolist(), df_teachers.to_dict('records')))
+    student_settings = dict(zip(df_students['id'].tolist(), df_students.to_dict('records')))
+
+    return {
+        'dfs': dfs,
+        'df_existing': df_existing,
+        'use_existing': use_existing,
+        's_map': s_map,
+        't_map': t_map,
+        'c_map': c_map,
+        'tr_map': tr_map,
+        'slot_map': slot_map,
+        'teachable_dict': teachable_dict,
+        'student_avail_set': student_avail_set,
+        'teacher_avail_set': teacher_avail_set,
+        'slot_to_date': slot_to_date,
+        'slot_to_tr': slot_to_tr,
+        'slots_by_date': slots_by_date,
+        'student_busy_slots': student_busy_slots,
+        'teacher_busy_slots': teacher_busy_slots,
+        'existing_counts': existing_counts,
+        'existing_teacher_counts': existing_teacher_counts,
+        'existing_slot_counts': existing_slot_counts,
+        'existing_student_subject_date_counts': existing_student_subject_date_counts,
+        'all_slots': all_slots,
+        'all_teachers': all_teachers,
+        'requests': requests,
+        'limit_constraints': limit_constraints,
+        'student_subject_daily_limit': student_subject_daily_limit,
+        'teacher_settings': teacher_settings,
+        'student_settings': student_settings,
+    }
@@ -0,0 +1,166 @@
+"""
+Presolve for the allocation model.
+
+Runs between candidate generation and model build:
+
+  * prune_candidates() removes x variables that every feasible solution
+    sets to 0 because a limit is already used up by fixed existing
+    allocations (O01) or set to 0: booths of a slot (constraint 4), a
+    teacher's or student's lessons for the day (constraints 1 / 3), a
+    student's continuous-slot window (constraint 2) or a student's lessons
+    of one subject for the day (constraint 6).
+  * build_model skips "sum(x) <= k" rows with at most k variables, which
+    can never bind (binary x), and counts them in the same report.
+
+The removed variables are 0 in every feasible solution, so the feasible
+schedules and the objective value are unchanged (a student-subject-day
+whose variables are all removed keeps its constant S1 penalty from existing
+lessons as a fixed variable). The one exception would be constraint 5: a
+gap between two fixed lessons of a teacher that is longer than the limit
+can only be met by lessons in between, and build_model skips it with a
+warning when there is no candidate there. Removing those candidates would
+turn an infeasible instance into a "feasible" one, so the candidates inside
+such gaps are kept (their caps still force them to 0 and the instance stays
+infeasible, as without presolve).
+"""
+
+import collections
+
+import pandas as pd
+
+from allocation.prep import person_setting
+
+
+def _dead_person_days(busy_slots, settings, column, slot_to_date, people):
+    """(pid, date) pairs whose daily limit is used up, and people whose limit is 0."""
+    dead_days, dead_all = set(), set()
+    for pid in people:
+        val = person_setting(settings, pid, column)
+        if val is None:
+            continue
+        if val <= 0:
+            dead_all.add(pid)
+            continue
+        per_date = collections.Counter(slot_to_date[sl] for sl in busy_slots.get(pid, ()))
+        dead_days.update((pid, date) for date, n in per_date.items() if n >= val)
+    return dead_days, dead_all
+
+
+def _dead_window_slots(data):
+    """(sid, slid) pairs inside a constraint 2 window that fixed lessons already fill."""
+    dead = set()
+    slots_by_date = data['slots_by_date']
+    slot_to_date = data['slot_to_date']
+    for sid in data['s_map'].keys():
+        val = person_setting(data['student_settings'], sid, 'max_continuous_slot')
+        if val is None or val < 0:
+            continue
+        busy = data['student_busy_slots'].get(sid, set())
+        # 既存配置のない日は残り枠 = val (> 0) なので、val = 0 以外は既存配置のある日だけ見ればよい
+        dates = slots_by_date.keys() if val == 0 else {slot_to_date[sl] for sl in busy}
+        window_size = val + 1
+        for date in dates:
+            slot_ids = [sl for _, sl in slots_by_date[date]]
+            for start in range(len(slot_ids) - window_size + 1):
+                window = slot_ids[start:start + window_size]
+                if val - sum(1 for sl in window if sl in busy) <= 0:
+                    dead.update((sid, sl) for sl in window)
+    return dead
+
+
+def _vacant_gap_slots(data, constraint_flags):
+    """(tid, slid) pairs inside a gap between fixed lessons that constraint 5 requires to fill."""
+    keep = set()
+    if not constraint_flags.get('max_teacher_continuous_vacant_slot', {}).get('activated'):
+        return keep
+    for tid, busy_slots in data['teacher_busy_slots'].items():
+        val = person_setting(data['teacher_settings'], tid, 'max_continuous_vacant_slot')
+        if val is None or not busy_slots:
+            continue
+        for date in {data['slot_to_date'][sl] for sl in busy_slots}:
+            slot_ids = [sl for _, sl in data['slots_by_date'][date]]
+            busy_pos = [k for k, sl in enumerate(slot_ids) if sl in busy_slots]
+            # build_model の制約5 と同じ判定: 既存配置 a, b の間の空きが上限を超える組
+            for ai, a in enumerate(busy_pos):
+                for bi in range(ai + 1, len(busy_pos)):
+                    b = busy_pos[bi]
+                    if (b - a - 1) - val - (bi - ai - 1) > 0:
+                        keep.update((tid, sl) for sl in slot_ids[a + 1:b])
+    return keep
+
+
+def prune_candidates(data, constraint_flags, df_candidates):
+    """
+    Remove candidate variables that are fixed to 0 by used-up limits.
+
+    Args:
+        data: output of prep.prepare_data
+        constraint_flags: {code: {'activated', 'value'}}
+        df_candidates: output of candidates.build_candidates
+
+    Returns:
+        (pruned df_candidates, {reason: variables removed}, removed rows of
+        df_candidates)
+    """
+    cand = df_candidates
+    date = cand['slid'].map(data['slot_to_date'])
+    dead = pd.Series(False, index=cand.index)
+    removed = {}
+
+    def pair_in(col, values, pairs):
+        if not pairs:
+            return pd.Series(False, index=cand.index)
+        return pd.Series(pd.MultiIndex.from_arrays([cand[col], values]).isin(list(pairs)), index=cand.index)
+
+    # 制約5 で埋める必要のある既存配置間の候補は残す（削除すると実行不能が見えなくなる）
+    kept = pair_in('tid', cand['slid'], _vacant_gap_slots(data, constraint_flags))
+
+    def mark(reason, mask):
+        nonlocal dead
+        mask = mask & ~kept
+        removed[reason] = int((mask & ~dead).sum())
+        dead = dead | mask
+
+    c4 = constraint_flags.get('max_lesson_per_timeslot', {})
+    if c4.get('activated'):
+        val = c4['value']
+        full = {slid for slid in data['all_slots'] if int(max(0, val - data['existing_slot_counts'][slid])) == 0}
+        mark('制約4 ブース満席', cand['slid'].isin(full))
+
+    if constraint_flags.get('max_teacher_daily_slot', {}).get('activated'):
+        days, people = _dead_person_days(data['teacher_busy_slots'], data['teacher_settings'],
+                                         'max_daily_slot', data['slot_to_date'], data['t_map'].keys())
+        mark('制約1 講師1日上限', cand['tid'].isin(people) | pair_in('tid', date, days))
+
+    if constraint_flags.get('max_student_continuous_slot', {}).get('activated'):
+        mark('制約2 生徒連続上限', pair_in('sid', cand['slid'], _dead_window_slots(data)))
+
+    if constraint_flags.get('max_student_daily_slot', {}).get('activated'):
+        days, people = _dead_person_days(data['student_busy_slots'], data['student_settings'],
+                                         'max_daily_slot', data['slot_to_date'], data['s_map'].keys())
+        mark('制約3 生徒1日上限', cand['sid'].isin(people) | pair_in('sid', date, days))
+
+    if constraint_flags.get('max_student_subject_daily_slot', {}).get('activated'):
+        limits = data['student_subject_daily_limit']
+        counts = data['existing_student_subject_date_counts']
+        keys = pd.MultiIndex.from_arrays([cand['sid'], cand['cid'], date])
+        full = {(sid, cid, d) for (sid, cid, d), n in counts.items()
+                if (sid, cid) in limits and n >= limits[(sid, cid)]}
+        mark('制約6 科目1日上限', pd.Series(keys.isin(list(full)) if full else False, index=cand.index))
+
+    dead = dead.to_numpy()
+    return (cand[~dead].reset_index(drop=True), {k: v for k, v in removed.items() if v},
+            cand[dead].reset_index(drop=True))
+
+
+def print_presolve_report(removed_vars, skipped_rows):
+    """Print the variables and rows removed by the presolve."""
+    n_vars, n_rows = sum(removed_vars.values()), sum(skipped_rows.values())
+    if not n_vars and not n_rows:
+        print("  🧹 プリソルブ: 削減なし")
+        return
+    print(f"  🧹 プリソルブ: 変数 -{n_vars} 個, 制約 -{n_rows} 件")
+    for reason, n in removed_vars.items():
+        print(f"    変数 -{n}: {reason}")
+    for section, n in skipped_rows.items():
+        print(f"    制約 -{n}: {section}（変数の数が上限以下で常に満たされる）")
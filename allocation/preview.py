@@ -0,0 +1,482 @@
+"""
+Preview: max-flow upper bound and greedy schedule without a MIP.
+
+After editing availability the administrators mostly want to know roughly
+how many lessons fit, and a full solve takes minutes on a large campus.
+preview_schedule() answers from the same candidates as the model
+(build_candidates + prune_candidates) in well under a second:
+
+  * flow_upper_bound(): maximum flow through the network
+
+        source -> request (remaining sessions, desired-teacher limits)
+               -> (student, subject, day)   constraint 6
+               -> (student, day)            constraint 3
+               -> (student, slot)           1 lesson per student and slot
+               -> (teacher, slot)           1 lesson per teacher and slot
+               -> (teacher, day)            constraint 1
+               -> sink
+
+    Every feasible schedule is such a flow, so no schedule has more lessons.
+    The bound leaves out constraints 2 / 4 / 5, the desired-teacher limits
+    per teacher (only their total caps a request) and that a flow may switch
+    subjects at the (student, slot) node, so it can be above the optimum.
+  * greedy_schedule(): a complete schedule honoring the basic constraints
+    and constraints 1-6 for the lessons it adds, built request by request
+    (most constrained first, one lesson per request per round) from the
+    least contested (teacher, slot) candidates. When the fixed existing
+    lessons of a teacher-day already exceed the constraint 5 limit, the
+    model requires that gap to be filled; the greedy may fill it but does
+    not have to, so vacant_violations() checks the result. Without
+    violations the schedule is feasible for the model, so its lessons are
+    a lower bound and its O01 can be used as HINT_FILE for the full solve.
+
+Without violations the optimum lies between the two numbers.
+"""
+
+import collections
+import time
+
+import numpy as np
+import pandas as pd
+from ortools.graph.python import max_flow
+
+from allocation.candidates import build_candidates
+from allocation.prep import day_counts, person_limits
+from allocation.presolve import prune_candidates
+
+SOURCE, SINK = 0, 1
+
+
+def _active(constraint_flags, code):
+    return bool(constraint_flags.get(code, {}).get('activated'))
+
+
+def _capacities(data, constraint_flags):
+    """Daily limits of constraints 1 / 3 / 6 (people without a setting are unlimited) and the fixed lessons per day."""
+    slot_to_date = data['slot_to_date']
+    t_day = day_counts(data['teacher_busy_slots'], slot_to_date)
+    s_day = day_counts(data['student_busy_slots'], slot_to_date)
+    caps = {'teacher_day': {}, 'student_day': {}, 'subject_day': {}}
+    if _active(constraint_flags, 'max_teacher_daily_slot'):
+        caps['teacher_day'] = person_limits(data['teacher_settings'], 'max_daily_slot', data['t_map'].keys())
+    if _active(constraint_flags, 'max_student_daily_slot'):
+        caps['student_day'] = person_limits(data['student_settings'], 'max_daily_slot', data['s_map'].keys())
+    if _active(constraint_flags, 'max_student_subject_daily_slot'):
+        caps['subject_day'] = data['student_subject_daily_limit']
+    return caps, t_day, s_day
+
+
+def _remaining(limit, used):
+    return max(0, limit - used)
+
+
+def _encode(*columns):
+    """Dense codes of the row tuples of int arrays and the first row of every code."""
+    key = np.zeros(len(columns[0]), dtype='int64')
+    for col in columns:
+        key = key * (int(col.max()) + 1) + col
+    codes, uniques = pd.factorize(key)
+    first = np.empty(len(uniques), dtype='int64')
+    first[codes[::-1]] = np.arange(len(codes) - 1, -1, -1)
+    return codes, first
+
+
+def _request_sessions(requests):
+    """
+    {(sid, cid): remaining sessions} in request order. I07 may list a
+    (student, subject) twice; the model caps the lessons with every row, so
+    the smallest remaining count holds.
+    """
+    sessions = {}
+    for req in requests:
+        key = (req['sid'], req['cid'])
+        sessions[key] = min(sessions.get(key, req['sessions']), req['sessions'])
+    return sessions
+
+
+def _request_caps(data, sids, cids, tids):
+    """Lessons each request can take at most: sessions, and the sum of its desired-teacher limits."""
+    limits = data['limit_constraints']
+    _, rows = _encode(sids, cids, tids)
+    per_request = collections.defaultdict(int)
+    unlimited = set()
+    for sid, cid, tid in zip(sids[rows].tolist(), cids[rows].tolist(), tids[rows].tolist()):
+        limit = limits.get((sid, cid, tid))
+        if limit is None:
+            unlimited.add((sid, cid))
+        else:
+            per_request[(sid, cid)] += limit
+    return {
+        key: sessions if key in unlimited else min(sessions, per_request.get(key, 0))
+        for key, sessions in _request_sessions(data['requests']).items()
+    }
+
+
+def flow_upper_bound(data, constraint_flags, df_candidates):
+    """
+    Maximum flow over the candidates (see the module docstring).
+
+    With constraints 1 and 4 both ON the flow is solved twice, ending in
+    (teacher, day) and in the slot (booths), and the smaller value is
+    returned - both are upper bounds.
+
+    Args:
+        data: output of prep.prepare_data
+        constraint_flags: {code: {'activated', 'value'}}
+        df_candidates: (pruned) output of candidates.build_candidates
+
+    Returns:
+        upper bound on the new lessons (int)
+    """
+    if df_candidates.empty:
+        return 0
+    sids, cids, tids, slids = (df_candidates[col].to_numpy() for col in ['sid', 'cid', 'tid', 'slid'])
+    slot_codes, slot_rows = _encode(slids)
+    slot_ids = slids[slot_rows]
+    date_codes, date_values = pd.factorize(pd.Series([data['slot_to_date'][sl] for sl in slot_ids.tolist()]))
+    dates = date_codes[slot_codes]
+    date_values = list(date_values)
+
+    caps, t_day, s_day = _capacities(data, constraint_flags)
+    request_caps = _request_caps(data, sids, cids, tids)
+    unlimited = int(sum(request_caps.values()))
+
+    # 層ごとのノード（候補の行 → ノード番号）と各ノードの代表行
+    layers = {
+        'request': _encode(sids, cids),
+        'subject_day': _encode(sids, cids, dates),
+        'student_day': _encode(sids, dates),
+        'student_slot': _encode(sids, slids),
+        'teacher_slot': _encode(tids, slids),
+        'teacher_day': _encode(tids, dates),
+    }
+    nodes, rows = {}, {}
+    offset = 2
+    for name in ['request', 'subject_day', 'student_day', 'student_day_out', 'student_slot',
+                 'teacher_slot', 'teacher_day', 'slot']:
+        codes, first = layers.get(name.replace('_out', ''), (slot_codes, slot_rows))
+        nodes[name], rows[name] = codes + offset, first
+        offset += len(first)
+
+    tails, heads, capacities = [], [], []
+
+    def arcs(tail_layer, head_layer, capacity, layer=None):
+        """One arc per node of layer (default: head_layer) from its tail to its head node."""
+        r = rows[layer or head_layer]
+        tails.append(np.full(len(r), SOURCE) if tail_layer is None else nodes[tail_layer][r])
+        heads.append(np.full(len(r), SINK) if head_layer is None else nodes[head_layer][r])
+        capacities.append(np.broadcast_to(np.asarray(capacity, dtype='int64'), len(r)))
+
+    def per_node(layer, cap):
+        r = rows[layer].tolist()
+        return [cap(sid, cid, tid, date_values[d]) for sid, cid, tid, d in
+                zip(sids[r].tolist(), cids[r].tolist(), tids[r].tolist(), dates[r].tolist())]
+
+    # source -> リクエスト: 残りコマ数（希望講師の上限の合計まで）
+    arcs(None, 'request', per_node('request', lambda sid, cid, tid, date: request_caps.get((sid, cid), 0)))
+
+    # リクエスト -> (生徒, 科目, 日): 制約6
+    subject_day = caps['subject_day']
+    existing = data['existing_student_subject_date_counts']
+    arcs('request', 'subject_day', per_node('subject_day', lambda sid, cid, tid, date: (
+        unlimited if (sid, cid) not in subject_day
+        else _remaining(subject_day[(sid, cid)], existing.get((sid, cid, date), 0)))))
+
+    # (生徒, 科目, 日) -> (生徒, 日) 入口 -> 出口: 制約3
+    student_day = caps['student_day']
+    arcs('subject_day', 'student_day', unlimited, layer='subject_day')
+    arcs('student_day', 'student_day_out', per_node('student_day', lambda sid, cid, tid, date: (
+        unlimited if sid not in student_day else _remaining(student_day[sid], s_day.get((sid, date), 0)))),
+        layer='student_day')
+
+    # (生徒, 日) -> (生徒, スロット) -> (講師, スロット): 同時受講・同時指導禁止
+    arcs('student_day_out', 'student_slot', 1)
+    _, rows['pair'] = _encode(sids, tids, slids)
+    arcs('student_slot', 'teacher_slot', 1, layer='pair')
+
+    # (講師, スロット) -> (講師, 日) -> sink: 制約1 / (講師, スロット) -> スロット -> sink: 制約4
+    teacher_day = caps['teacher_day']
+    booths = None
+    if _active(constraint_flags, 'max_lesson_per_timeslot'):
+        booths = constraint_flags['max_lesson_per_timeslot']['value']
+    endings = []
+    if teacher_day or booths is None:
+        endings.append([('teacher_slot', 'teacher_day', 1, 'teacher_slot'),
+                        ('teacher_day', None, per_node('teacher_day', lambda sid, cid, tid, date: (
+                            unlimited if tid not in teacher_day
+                            else _remaining(teacher_day[tid], t_day.get((tid, date), 0)))), 'teacher_day')])
+    if booths is not None:
+        slot_counts = data['existing_slot_counts']
+        endings.append([('teacher_slot', 'slot', 1, 'teacher_slot'),
+                        ('slot', None, [_remaining(int(booths), slot_counts.get(sl, 0))
+                                        for sl in slot_ids.tolist()], 'slot')])
+
+    shared = len(tails)
+    bounds = []
+    for ending in endings:
+        del tails[shared:], heads[shared:], capacities[shared:]
+        for tail_layer, head_layer, capacity, layer in ending:
+            arcs(tail_layer, head_layer, capacity, layer=layer)
+        flow = max_flow.SimpleMaxFlow()
+        flow.add_arcs_with_capacity(np.concatenate(tails), np.concatenate(heads), np.concatenate(capacities))
+        if flow.solve(SOURCE, SINK) != flow.OPTIMAL:
+            raise RuntimeError('max flow failed')
+        bounds.append(int(flow.optimal_flow()))
+    return min(bounds)
+
+
+def greedy_schedule(data, constraint_flags, df_candidates):
+    """
+    Feasible schedule built greedily (see the module docstring).
+
+    Args:
+        data: output of prep.prepare_data
+        constraint_flags: {code: {'activated', 'value'}}
+        df_candidates: (pruned) output of candidates.build_candidates
+
+    Returns:
+        list of (sid, cid, tid, slid) of the new lessons
+    """
+    sessions = _request_sessions(data['requests'])
+    requests = list(sessions)
+    slot_to_date = data['slot_to_date']
+    if df_candidates.empty:
+        return []
+
+    # 候補の並び: リクエストごとに、同じ (講師, スロット) を使う候補が少ない順（競合の少ない枠から埋める）
+    cand = df_candidates
+    request_keys = pd.MultiIndex.from_tuples(requests)
+    req_idx = request_keys.get_indexer(pd.MultiIndex.from_arrays([cand['sid'], cand['cid']]))
+    demand = cand.groupby(['tid', 'slid'])['sid'].transform('size').to_numpy()
+    order = np.lexsort((cand['slid'].to_numpy(), demand, req_idx))
+    req_sorted = req_idx[order]
+    tids = cand['tid'].to_numpy()[order].tolist()
+    slids = cand['slid'].to_numpy()[order].tolist()
+    bounds = np.searchsorted(req_sorted, np.arange(len(requests) + 1)).tolist()
+
+    # 状態: 既存配置（固定）で使用済みの分から始める
+    caps, t_day, s_day = _capacities(data, constraint_flags)
+    teacher_day, student_day, subject_day = caps['teacher_day'], caps['student_day'], caps['subject_day']
+    subject_day_used = collections.Counter(data['existing_student_subject_date_counts'])
+    s_used = collections.defaultdict(set, {sid: set(slots) for sid, slots in data['student_busy_slots'].items()})
+    t_used = collections.defaultdict(set, {tid: set(slots) for tid, slots in data['teacher_busy_slots'].items()})
+    pair_left = dict(data['limit_constraints'])
+
+    booths = None
+    slot_used = collections.Counter(data['existing_slot_counts'])
+    booths_left = None  # 制約4: 全スロットの残りブース数（0 になったらそれ以上配置できない）
+    if _active(constraint_flags, 'max_lesson_per_timeslot'):
+        booths = constraint_flags['max_lesson_per_timeslot']['value']
+        booths_left = sum(max(0, int(booths) - slot_used[sl]) for sl in set(slids))
+
+    continuous = {}
+    if _active(constraint_flags, 'max_student_continuous_slot'):
+        continuous = {sid: val for sid, val in person_limits(data['student_settings'], 'max_continuous_slot',
+                                                       data['s_map'].keys()).items() if val >= 0}
+    vacant = {}
+    if _active(constraint_flags, 'max_teacher_continuous_vacant_slot'):
+        vacant = person_limits(data['teacher_settings'], 'max_continuous_vacant_slot', data['t_map'].keys())
+
+    # 日内の位置（time_range 順）と日のスロット列
+    day_slots = {date: [sl for _, sl in tr_slots] for date, tr_slots in data['slots_by_date'].items()}
+    position = {sl: k for slots in day_slots.values() for k, sl in enumerate(slots)}
+
+    # 制約5: 講師・日ごとの (最初の位置, 最後の位置, コマ数)
+    span = {}
+    for tid, slots in t_used.items():
+        if tid not in vacant:
+            continue
+        for sl in slots:
+            key = (tid, slot_to_date[sl])
+            lo, hi, n = span.get(key, (position[sl], position[sl], 0))
+            span[key] = (min(lo, position[sl]), max(hi, position[sl]), n + 1)
+
+    def run_length(used, slots, k):
+        """Consecutive lessons around position k if k is added."""
+        left = k - 1
+        while left >= 0 and slots[left] in used:
+            left -= 1
+        right = k + 1
+        while right < len(slots) and slots[right] in used:
+            right += 1
+        return right - left - 1
+
+    def feasible(sid, cid, tid, slid, date):
+        if slid in s_used[sid] or slid in t_used[tid]:
+            return False
+        if pair_left.get((sid, cid, tid), 1) <= 0:
+            return False
+        if booths is not None and slot_used[slid] >= booths:
+            return False
+        if tid in teacher_day and t_day[(tid, date)] >= teacher_day[tid]:
+            return False
+        if sid in student_day and s_day[(sid, date)] >= student_day[sid]:
+            return False
+        if (sid, cid) in subject_day and subject_day_used[(sid, cid, date)] >= subject_day[(sid, cid)]:
+            return False
+        if sid in continuous and run_length(s_used[sid], day_slots[date], position[slid]) > continuous[sid]:
+            return False
+        if tid in vacant:
+            k = position[slid]
+            lo, hi, n = span.get((tid, date), (k, k, 0))
+            vacant_now = (hi - lo + 1) - n if n else 0
+            lo, hi = min(lo, k), max(hi, k)
+            vacant_new = (hi - lo + 1) - (n + 1)
+            # 範囲内の空きが上限以下になる場合のみ。既存配置だけで上限を超えている日は、
+            # 範囲内の空きを埋める（空きが減る）配置も許す（モデルはその空きを埋めることを求める）
+            if vacant_new > vacant[tid] and vacant_new >= vacant_now:
+                return False
+        return True
+
+    def assign(sid, cid, tid, slid, date):
+        s_used[sid].add(slid)
+        t_used[tid].add(slid)
+        if (sid, cid, tid) in pair_left:
+            pair_left[(sid, cid, tid)] -= 1
+        slot_used[slid] += 1
+        t_day[(tid, date)] += 1
+        s_day[(sid, date)] += 1
+        subject_day_used[(sid, cid, date)] += 1
+        if tid in vacant:
+            k = position[slid]
+            lo, hi, n = span.get((tid, date), (k, k, 0))
+            span[(tid, date)] = (min(lo, k), max(hi, k), n + 1)
+
+    # 候補数 / 残りコマ数 の小さい（配置の難しい）リクエストから、1周につき1コマずつ
+    left = list(sessions.values())
+    pointer = bounds[:-1]
+    queue = sorted(range(len(requests)), key=lambda k: ((bounds[k + 1] - bounds[k]) / max(left[k], 1), k))
+    chosen = []
+    while queue and booths_left != 0:
+        next_queue = []
+        for k in queue:
+            if booths_left == 0:
+                break
+            sid, cid = requests[k]
+            end = bounds[k + 1]
+            i = pointer[k]
+            while i < end:
+                tid, slid = tids[i], slids[i]
+                date = slot_to_date[slid]
+                i += 1
+                if feasible(sid, cid, tid, slid, date):
+                    assign(sid, cid, tid, slid, date)
+                    if booths_left is not None:
+                        booths_left -= 1
+                    chosen.append((sid, cid, tid, slid))
+                    left[k] -= 1
+                    break
+            pointer[k] = i
+            if left[k] > 0 and i < end:
+                next_queue.append(k)
+        queue = next_queue
+    return chosen
+
+
+def vacant_violations(data, constraint_flags, keys):
+    """
+    Teacher-days whose vacant slots between the first and the last lesson
+    (fixed and new lessons in keys) exceed the constraint 5 limit, as
+    [(tid, date, vacant, limit), ...]. Empty when the schedule meets
+    constraint 5; otherwise the model rejects it.
+    """
+    if not _active(constraint_flags, 'max_teacher_continuous_vacant_slot'):
+        return []
+    vacant = person_limits(data['teacher_settings'], 'max_continuous_vacant_slot', data['t_map'].keys())
+    slot_to_date = data['slot_to_date']
+    position = {sl: k for tr_slots in data['slots_by_date'].values() for k, (_, sl) in enumerate(tr_slots)}
+    worked = collections.defaultdict(set)
+    for tid, slots in data['teacher_busy_slots'].items():
+        for sl in slots:
+            worked[(tid, slot_to_date[sl])].add(position[sl])
+    for _, _, tid, slid in keys:
+        worked[(tid, slot_to_date[slid])].add(position[slid])
+    out = []
+    for (tid, date), ks in worked.items():
+        if tid in vacant and (max(ks) - min(ks) + 1) - len(ks) > vacant[tid]:
+            out.append((tid, date, (max(ks) - min(ks) + 1) - len(ks), vacant[tid]))
+    return sorted(out, key=str)
+
+
+def preview_schedule(data, constraint_flags):
+    """
+    Upper bound and greedy schedule for the remaining requests.
+
+    Args:
+        data: output of prep.prepare_data
+        constraint_flags: {code: {'activated', 'value'}}
+
+    Returns:
+        dict with 'requested' (remaining sessions), 'candidates', 'bound'
+        (flow_upper_bound), 'keys' (greedy_schedule), 'lessons' (len of
+        keys), 'violations' (vacant_violations of the greedy schedule),
+        'feasible' (no violations) and 'seconds' ({'candidates', 'bound',
+        'greedy'})
+    """
+    dfs = data['dfs']
+    seconds = {}
+    t0 = time.perf_counter()
+    df_candidates = build_candidates(
+        data['requests'], dfs['teachable'], dfs['student_avail'], dfs['teacher_avail'],
+        data['df_existing'] if data['use_existing'] else None, data['limit_constraints']
+    )
+    df_candidates, _, _ = prune_candidates(data, constraint_flags, df_candidates)
+    seconds['candidates'] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    bound = flow_upper_bound(data, constraint_flags, df_candidates)
+    seconds['bound'] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    keys = greedy_schedule(data, constraint_flags, df_candidates)
+    violations = vacant_violations(data, constraint_flags, keys)
+    seconds['greedy'] = time.perf_counter() - t0
+
+    return {
+        'requested': sum(_request_sessions(data['requests']).values()),
+        'candidates': len(df_candidates),
+        'bound': bound,
+        'keys': keys,
+        'lessons': len(keys),
+        'violations': violations,
+        'feasible': not violations,
+        'seconds': seconds,
+    }
+
+
+def print_preview(preview):
+    """Requested lessons, upper bound and greedy lessons with their times."""
+    requested, bound, lessons = preview['requested'], preview['bound'], preview['lessons']
+    seconds = preview['seconds']
+    print(f"  🔎 プレビュー（候補 {preview['candidates']} 個, {seconds['candidates']:.2f}秒）")
+    print(f"    希望の残り: {requested}コマ")
+    print(f"    上限（最大フロー）: {bound}コマ ({seconds['bound']:.2f}秒)")
+    print(f"    貪欲法の配置: {lessons}コマ ({seconds['greedy']:.2f}秒)")
+    if not preview['feasible']:
+        # 既存配置だけで制約5 を超える講師・日の空きを埋めきれなかった: モデルでは実行不能な配置
+        print(f"    ⚠️ 既存配置の空きコマが制約5 の上限を超える講師・日を埋めきれませんでした"
+              f"（{len(preview['violations'])} 件）。この配置は最適化モデルでは実行不能で、下限にはなりません")
+        for tid, date, n_vacant, limit in preview['violations'][:10]:
+            print(f"      ・講師 {tid} {date}: 空き {n_vacant}コマ（上限 {limit}）")
+        print(f"    → 配置できるのは最大 {bound}コマ（HINT_FILE に使う場合はソルバーが修復します）")
+        return
+    if lessons == bound:
+        print(f"    → 上限と一致: 配置できるのは {bound}コマです（最適化しても配置数は増えず、ソフト制約の分だけ改善します）")
+    else:
+        print(f"    → 最適解は {lessons}〜{bound}コマ（貪欲法は上限の {lessons / bound:.1%}）")
+
+
+def preview_stats(preview):
+    """Run-record summary of a preview (monitor.RunRecord.solver; no MIP was solved)."""
+    seconds = preview['seconds']
+    bound, lessons = preview['bound'], preview['lessons']
+    return {
+        'engine': 'preview',
+        'status': 'FEASIBLE' if preview['feasible'] else 'INFEASIBLE',
+        'wall_time': round(seconds['bound'] + seconds['greedy'], 3),
+        'objective': lessons,
+        'bound': bound,
+        'gap': round((bound - lessons) / max(lessons, 1e-9), 6),
+        'requested': preview['requested'],
+        'candidates': preview['candidates'],
+    }
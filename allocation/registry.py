@@ -0,0 +1,213 @@
+"""
+Array-backed variable registry for the model builder.
+
+The x variables used to live in a dict {(sid, cid, tid, slid): var} plus six
+defaultdict(list) indexes that each held another reference to every
+variable - a key tuple, a dict entry and six list slots per candidate.
+VarRegistry keeps the candidates as integer columns whose row number is the
+variable id, next to one list of solver variables. Each grouping (student x
+slot, teacher x slot, ...) is stored CSR style: the variable ids sorted by
+group and an offsets array. A group key is looked up through small
+per-column value -> code dicts and a dense table of group numbers over the
+codes (a dict only when the key space is too sparse for a table), so there
+is no Python object per candidate or per group.
+
+Both classes keep the Mapping interface of the old dicts, so constraint code
+still reads x_by_teacher_slot.get((tid, slid), []) - now a slice of the
+sorted ids - and the reports, hints and decomposition are unchanged. Groups
+iterate in the order of their first variable, like the dicts they replace,
+so the constraint rows are generated in the same order as before.
+"""
+
+import collections.abc
+
+import numpy as np
+import pandas as pd
+
+from allocation.candidates import CANDIDATE_COLUMNS
+
+
+def _id_dtype(n):
+    return np.int32 if n < 2**31 else np.int64
+
+
+def _small_int(values):
+    """values in the narrowest integer dtype that holds them (ids are usually < 32768)."""
+    if len(values) == 0:
+        return values.astype(np.int32)
+    return values.astype(np.promote_types(np.min_scalar_type(values.min()), np.min_scalar_type(values.max())))
+
+
+class Grouping(collections.abc.Mapping):
+    """{key: [var, ...]} over registry columns, in CSR form (see module docstring)."""
+
+    # 密な「キー → グループ番号」表を使う上限（要素数）。超える場合は dict で引く
+    DENSE_LIMIT = 1 << 22
+
+    def __init__(self, variables, columns, labels=None):
+        """
+        Args:
+            variables: list of solver variables (index = variable id)
+            columns: one integer array per key part, one value per variable
+            labels: per column, None to use the values as keys or an array
+                mapping the codes to key values (e.g. dates)
+        """
+        n = len(variables)
+        self._variables = variables
+        self._single = len(columns) == 1
+        self._labels = labels or [None] * len(columns)
+        # lexsort は安定ソートなので、グループ内は変数 id 順（旧来の append 順）のまま
+        order = np.lexsort(columns[::-1]).astype(_id_dtype(n)) if n else np.zeros(0, dtype=np.int32)
+        change = np.zeros(n, dtype=bool)  # ソート後に key が変わる位置 = グループの先頭
+        if n:
+            change[0] = True
+            for col in columns:
+                sorted_col = col[order]
+                change[1:] |= sorted_col[1:] != sorted_col[:-1]
+        starts = np.flatnonzero(change)
+        self._offsets = np.append(starts, n).astype(np.int64)
+        firsts = order[starts]
+        # 変数がすでにグループ順に並んでいる場合（リクエスト順の生徒×科目など）は並び替え配列を持たない
+        self._order = None if bool(np.all(order[1:] > order[:-1])) else order
+
+        # グループは最初の変数が現れた順に反復する（dict に append していた頃と同じ順序）
+        self._sequence = np.argsort(firsts, kind='stable').astype(_id_dtype(len(starts)))
+        self._key_parts = [col[firsts] for col in columns]
+
+        # キー → グループ番号: 列ごとの値 → 番号の小さな dict と、番号の組で引く密な表
+        self._codes, self._dims, self._table, self._index = [], [], None, None
+        uniques = [np.unique(part) for part in self._key_parts]
+        size = int(np.prod([len(u) for u in uniques], dtype=np.float64)) if uniques else 0
+        if size <= max(self.DENSE_LIMIT, 4 * len(starts)):
+            flat = np.zeros(len(starts), dtype=np.int64)
+            for part, uniq, label in zip(self._key_parts, uniques, self._labels):
+                values = (label[uniq] if label is not None else uniq).tolist()
+                self._codes.append({value: code for code, value in enumerate(values)})
+                self._dims.append(len(uniq))
+                flat = flat * len(uniq) + np.searchsorted(uniq, part)
+            self._table = np.full(size, -1, dtype=_id_dtype(len(starts)))
+            self._table[flat] = np.arange(len(starts))
+        else:
+            self._index = {key: g for g, key in zip(range(len(starts)), self._keys(np.arange(len(starts))))}
+
+    def _keys(self, groups):
+        """Keys of the given group numbers, as a list."""
+        parts = []
+        for part, label in zip(self._key_parts, self._labels):
+            values = part[groups]
+            parts.append((label[values] if label is not None else values).tolist())
+        return parts[0] if self._single else list(zip(*parts))
+
+    def _group(self, key):
+        """Group number of key, or None."""
+        if self._index is not None:
+            return self._index.get(key)
+        flat = 0
+        for value, codes, dim in zip((key,) if self._single else key, self._codes, self._dims):
+            code = codes.get(value)
+            if code is None:
+                return None
+            flat = flat * dim + code
+        g = self._table[flat]
+        return None if g < 0 else int(g)
+
+    def ids(self, key):
+        """Variable ids of one group as an array (empty when the key has no variables)."""
+        g = self._group(key)
+        if g is None:
+            return np.zeros(0, dtype=np.int64)
+        start, end = int(self._offsets[g]), int(self._offsets[g + 1])
+        return np.arange(start, end) if self._order is None else self._order[start:end]
+
+    def get(self, key, default=None):
+        g = self._group(key)
+        if g is None:
+            return default
+        start, end = int(self._offsets[g]), int(self._offsets[g + 1])
+        if self._order is None:
+            return self._variables[start:end]
+        variables = self._variables
+        return [variables[i] for i in self._order[start:end].tolist()]
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self._group(key) is not None
+
+    def __iter__(self):
+        return iter(self._keys(self._sequence))
+
+    def __len__(self):
+        return len(self._sequence)
+
+    def nbytes(self):
+        """Bytes held by the arrays of the grouping (the small per-column code dicts not included)."""
+        arrays = [self._offsets, self._sequence] + self._key_parts
+        arrays += [a for a in (self._order, self._table) if a is not None]
+        return sum(a.nbytes for a in arrays)
+
+
+class VarRegistry(collections.abc.Mapping):
+    """
+    x: {(sid, cid, tid, slid): var} stored as columns.
+
+    Iteration yields the keys in variable id order; values() is the variable
+    list itself. Looking up a single key builds a key -> id dict on first use
+    (only the hint and decomposition code do that).
+    """
+
+    def __init__(self, df_candidates, variables, slot_to_date=None):
+        """
+        Args:
+            df_candidates: candidates.build_candidates output (one row per variable)
+            variables: solver variables in the same row order
+            slot_to_date: slot id -> date, for groupings by 'date'
+        """
+        self.sid, self.cid, self.tid, self.slid = (_small_int(df_candidates[c].to_numpy()) for c in CANDIDATE_COLUMNS)
+        self.variables = variables
+        self.date_code, self.dates = None, None
+        if slot_to_date is not None:
+            # 日付はスロットごとに1回だけ引いて、変数には日付の番号だけを持たせる
+            slot_ids = np.unique(self.slid)
+            codes, dates = pd.factorize(pd.Series(slot_ids).map(slot_to_date), sort=False)
+            self.date_code = _small_int(codes[np.searchsorted(slot_ids, self.slid)])
+            self.dates = np.asarray(dates, dtype=object)
+        self._ids = None
+
+    def group(self, *names):
+        """Grouping of the variables by registry columns ('sid', 'cid', 'tid', 'slid', 'date')."""
+        columns, labels = [], []
+        for name in names:
+            if name == 'date':
+                columns.append(self.date_code)
+                labels.append(self.dates)
+            else:
+                columns.append(getattr(self, name))
+                labels.append(None)
+        return Grouping(self.variables, columns, labels)
+
+    def __len__(self):
+        return len(self.variables)
+
+    def __iter__(self):
+        return zip(self.sid.tolist(), self.cid.tolist(), self.tid.tolist(), self.slid.tolist())
+
+    def __getitem__(self, key):
+        if self._ids is None:
+            self._ids = {k: i for i, k in enumerate(self)}
+        return self.variables[self._ids[key]]
+
+    def values(self):
+        return self.variables
+
+    def items(self):
+        return zip(iter(self), self.variables)
+
+    def nbytes(self):
+        """Bytes held by the key columns (solver variables and the variable list not included)."""
+        arrays = [self.sid, self.cid, self.tid, self.slid] + ([self.date_code] if self.date_code is not None else [])
+        return sum(a.nbytes for a in arrays)
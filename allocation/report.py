@@ -0,0 +1,319 @@
+"""
+Reporting.
+
+Prints the input diagnostic report (Colab cell 02), turns a solved model
+into the output sheets (O01 allocated lessons, O02 unallocated lessons, O03
+fulfillment, O05/O06 teacher and daily utilization) and prints the
+INFEASIBLE diagnostic report.
+"""
+
+import collections
+
+import numpy as np
+import pandas as pd
+
+from allocation.model import solution_keys
+
+ALLOCATED_COLUMNS = ['slot_id', 'student_id', 'teacher_id', 'subject_id', '日時', '生徒名', '講師名', '科目名']
+UNALLOCATED_COLUMNS = ['student_id', 'subject_id', '不足数', '生徒名', '科目名', '理由']
+FULFILLMENT_COLUMNS = [
+    'student_id', '生徒名', 'subject_id', '科目名',
+    '希望コマ数', '配置コマ数', '充足率(%)'
+]
+TEACHER_UTILIZATION_COLUMNS = ['teacher_id', '講師名', '配置コマ数', '空きコマ数', '稼働率(%)', '出勤日数']
+DAILY_UTILIZATION_COLUMNS = ['日付', '配置コマ数', '講師空きコマ数', '稼働率(%)', '講師数', '生徒数']
+
+PER_PERSON_CONSTRAINTS = {'max_teacher_daily_slot', 'max_student_continuous_slot',
+                          'max_student_daily_slot', 'max_teacher_continuous_vacant_slot',
+                          'max_student_subject_daily_slot'}
+SOFT_CONSTRAINTS = {'soft_spread_subject_across_days', 'soft_student_consecutive_slots'}
+
+
+def print_input_report(dfs, constraint_flags):
+    """Print the data diagnostic report: requests, availability and the constraint sheet."""
+    df_reqs = dfs['student_reqs']
+    df_s_avail = dfs['student_avail']
+    df_t_avail = dfs['teacher_avail']
+    df_constraints = dfs['constraints']
+    s_map = dict(zip(dfs['students']['id'], dfs['students']['student_name'])) if not dfs['students'].empty else {}
+
+    print("\n" + "="*40)
+    print("📊 データ診断レポート")
+    print("="*40)
+
+    # --- 1. 生徒の授業希望チェック ---
+    print(f"\n📌 【授業リクエスト】(全 {len(df_reqs)} 件)")
+    if not df_reqs.empty:
+        req_summary = df_reqs.groupby('student_id')['sessions'].sum()
+        total_sessions = req_summary.sum()
+        pref_cols = [f'desired_teacher_{i}' for i in range(1, 4) if f'desired_teacher_{i}' in df_reqs.columns]
+        prefs = df_reqs[pref_cols]
+        pref_count = int((prefs.notna() & (prefs != '')).any(axis=1).sum())
+        print(f"  生徒数: {len(req_summary)}名 / 合計希望コマ数: {total_sessions} / 講師指定あり: {pref_count}件")
+    else:
+        print("  ⚠️ リクエストデータがありません。")
+
+    # --- 2. 生徒の空き状況チェック ---
+    print(f"\n📌 【生徒の空き状況】(student_availability)")
+    if not df_s_avail.empty:
+        s_avail_count = df_s_avail.groupby('student_id').size()
+        print(f"  登録生徒数: {len(s_avail_count)}名 / 平均空きスロット: {s_avail_count.mean():.0f}箇所")
+
+        # 警告: 希望数に対して空きが少なすぎる生徒のみ表示
+        if not df_reqs.empty:
+            warnings = []
+            for sid in req_summary.index:
+                req = req_summary.get(sid, 0)
+                avail = s_avail_count.get(sid, 0)
+                if avail < req:
+                    warnings.append(f"  ⚠️ {s_map.get(sid)}: 希望{req}コマ に対し空き{avail}箇所（不足）")
+                elif avail == 0:
+                    warnings.append(f"  ⚠️ {s_map.get(sid)}: 空き情報が未登録")
+            if warnings:
+                print("  --- 警告 ---")
+                for w in warnings:
+                    print(w)
+    else:
+        print("  ⚠️ 生徒の空きデータが空です！GASで出力しましたか？")
+
+    # --- 3. 講師の空き状況チェック ---
+    print(f"\n📌 【講師の空き状況】")
+    if not df_t_avail.empty:
+        t_avail_count = df_t_avail.groupby('teacher_id').size()
+        print(f"  登録講師数: {len(t_avail_count)}名 / 平均空きスロット: {t_avail_count.mean():.0f}箇所")
+    else:
+        print("  ⚠️ 講師の空きデータがありません。")
+
+    # --- 4. 制約条件チェック ---
+    print(f"\n📌 【制約条件】(全 {len(df_constraints)} 件)")
+    if not df_constraints.empty:
+        rows = df_constraints.to_dict('records')
+        active_list = [row for row in rows if constraint_flags.get(row['code'], {}).get('activated')]
+        inactive_list = [row for row in rows if not constraint_flags.get(row['code'], {}).get('activated')]
+        print(f"  有効: {len(active_list)}件 / 無効: {len(inactive_list)}件")
+        for row in active_list:
+            if row['code'] in SOFT_CONSTRAINTS:
+                src = f"ソフト制約: weight={row['value']}"
+            elif row['code'] in PER_PERSON_CONSTRAINTS:
+                src = "個人別"
+            else:
+                src = f"全体: {row['value']}"
+            print(f"  ✅ {row['code']} ({src})")
+        for row in inactive_list:
+            print(f"  ⬜ {row['code']}")
+    else:
+        print("  ⚠️ 制約条件データがありません。デフォルト制約のみ適用します。")
+
+
+def build_outputs(data, model, values=None):
+    """
+    Build the O01/O02/O03 DataFrames from the solved model.
+
+    values: x values of an incumbent (see model.solution_keys); by default
+    the engine's last solution.
+
+    Returns:
+        (df_final, df_new, df_un, df_fulfill): all allocations (existing +
+        new), the new allocations only, unallocated lessons and the
+        fulfillment table.
+    """
+    # 解の値は一括で取り出し、1 の変数だけを行にする
+    return outputs_from_keys(data, solution_keys(model, values))
+
+
+def outputs_from_keys(data, keys):
+    """build_outputs for new lessons given as (sid, cid, tid, slid) keys (e.g. preview.greedy_schedule)."""
+    s_map, t_map, c_map = data['s_map'], data['t_map'], data['c_map']
+    slot_map = data['slot_map']
+    df_reqs = data['dfs']['student_reqs']
+    requests = data['requests']
+
+    sids, cids, tids, slids = (list(col) for col in zip(*keys)) if keys else ([], [], [], [])
+    new_allocated = {
+        'slot_id': slids, 'student_id': sids, 'teacher_id': tids, 'subject_id': cids,
+        '日時': [slot_map.get(slid, str(slid)) for slid in slids],
+        '生徒名': [s_map.get(sid) for sid in sids],
+        '講師名': [t_map.get(tid) for tid in tids],
+        '科目名': [c_map.get(cid) for cid in cids],
+    }
+
+    df_new = pd.DataFrame(new_allocated, columns=ALLOCATED_COLUMNS)
+    df_final = pd.concat([data['df_existing'], df_new], ignore_index=True)
+    df_final = df_final.sort_values(['slot_id', 'student_id'])
+
+    df_un, df_fulfill = request_report(df_final, df_reqs, requests, s_map, c_map)
+    return df_final, df_new, df_un, df_fulfill
+
+
+def request_report(df_final, df_reqs, requests, s_map, c_map):
+    """
+    O02 (unallocated) and O03 (fulfillment) from the allocations per request.
+
+    Args:
+        df_final: all allocations (O01 layout)
+        df_reqs: normalized I07 rows
+        requests: data['requests'] (requests with remaining sessions)
+        s_map, c_map: id -> name
+
+    Returns:
+        (df_un, df_fulfill)
+    """
+    # 未配置検証（生徒×科目ごとの配置数を集計してリクエストに突き合わせる）
+    sids = df_reqs['student_id'].to_numpy()
+    cids = df_reqs['subject_id'].to_numpy()
+    requested = df_reqs['sessions'].to_numpy()
+    if df_final.empty:
+        allocated = np.zeros(len(df_reqs), dtype='int64')
+    else:
+        total_counts = df_final.groupby(['student_id', 'subject_id']).size()
+        allocated = total_counts.reindex(pd.MultiIndex.from_arrays([sids, cids]), fill_value=0).to_numpy()
+    diff = requested - allocated
+    student_names = [s_map.get(sid) for sid in sids.tolist()]
+    subject_names = [c_map.get(cid) for cid in cids.tolist()]
+
+    short = np.flatnonzero(diff > 0)
+    request_keys = {(req['sid'], req['cid']) for req in requests}
+    df_un = pd.DataFrame({
+        'student_id': sids[short],
+        'subject_id': cids[short],
+        '不足数': diff[short],
+        '生徒名': [student_names[k] for k in short.tolist()],
+        '科目名': [subject_names[k] for k in short.tolist()],
+        '理由': ["枠確保できず（制約による上限）" if (sids[k], cids[k]) in request_keys else "要確認（データ不整合?）"
+               for k in short.tolist()],
+    }, columns=UNALLOCATED_COLUMNS)
+
+    # 充足率レポート作成
+    df_fulfill = pd.DataFrame({
+        'student_id': sids,
+        '生徒名': student_names,
+        'subject_id': cids,
+        '科目名': subject_names,
+        '希望コマ数': requested,
+        '配置コマ数': allocated,
+        '充足率(%)': _percent(allocated, requested),
+    }, columns=FULFILLMENT_COLUMNS)
+    df_fulfill = df_fulfill.sort_values(['student_id', 'subject_id'])
+
+    return df_un, df_fulfill
+
+
+def _percent(numerator, denominator):
+    rates = np.divide(numerator, denominator, out=np.zeros(len(numerator)), where=denominator > 0)
+    return [round(rate * 100, 1) for rate in rates.tolist()]
+
+
+def utilization_report(dfs, df_final, t_map):
+    """
+    Teacher and daily utilization of the schedule (O05 / O06).
+
+    Args:
+        dfs: normalized input DataFrames (teachers, slots, teacher_avail)
+        df_final: all allocations (O01 layout)
+        t_map: teacher id -> name
+
+    Returns:
+        (df_teacher, df_daily): per teacher the allocated lessons against the
+        available slots and the number of working days; per date the
+        allocated lessons against the teachers' available slots, with the
+        number of teachers and students who have lessons.
+    """
+    slot_to_date = pd.Series(dfs['slots']['date'].to_numpy(), index=dfs['slots']['id'].to_numpy())
+    lessons = df_final[['slot_id', 'student_id', 'teacher_id']].copy() if not df_final.empty \
+        else pd.DataFrame(columns=['slot_id', 'student_id', 'teacher_id'])
+    lessons['date'] = lessons['slot_id'].map(slot_to_date)
+    avail = dfs['teacher_avail']
+    avail_date = avail['slot_id'].map(slot_to_date)
+
+    # 講師別: 配置コマ数 / 空きコマ数、出勤日数（配置のある日付数）
+    teacher_ids = dfs['teachers']['id'].to_numpy()
+    by_teacher = lessons.groupby('teacher_id').agg(lessons=('slot_id', 'size'), days=('date', 'nunique'))
+    by_teacher = by_teacher.reindex(teacher_ids, fill_value=0)
+    free = avail.groupby('teacher_id').size().reindex(teacher_ids, fill_value=0).to_numpy()
+    allocated = by_teacher['lessons'].to_numpy()
+    df_teacher = pd.DataFrame({
+        'teacher_id': teacher_ids,
+        '講師名': [t_map.get(tid) for tid in teacher_ids.tolist()],
+        '配置コマ数': allocated,
+        '空きコマ数': free,
+        '稼働率(%)': _percent(allocated, free),
+        '出勤日数': by_teacher['days'].to_numpy(),
+    }, columns=TEACHER_UTILIZATION_COLUMNS)
+
+    # 日付別: 配置コマ数 / その日の講師の空きコマ数、授業のある講師数・生徒数
+    dates = sorted(set(slot_to_date.tolist()))
+    by_date = lessons.groupby('date').agg(lessons=('slot_id', 'size'), teachers=('teacher_id', 'nunique'),
+                                          students=('student_id', 'nunique'))
+    by_date = by_date.reindex(dates, fill_value=0)
+    free = avail.groupby(avail_date).size().reindex(dates, fill_value=0).to_numpy()
+    allocated = by_date['lessons'].to_numpy()
+    df_daily = pd.DataFrame({
+        '日付': dates,
+        '配置コマ数': allocated,
+        '講師空きコマ数': free,
+        '稼働率(%)': _percent(allocated, free),
+        '講師数': by_date['teachers'].to_numpy(),
+        '生徒数': by_date['students'].to_numpy(),
+    }, columns=DAILY_UTILIZATION_COLUMNS)
+    return df_teacher, df_daily
+
+
+def fulfillment_summary(df_fulfill):
+    """Return (total_allocated, total_requested, overall_rate %) of the O03 table."""
+    total_requested = df_fulfill['希望コマ数'].sum()
+    total_allocated = df_fulfill['配置コマ数'].sum()
+    overall_rate = round(total_allocated / total_requested * 100, 1) if total_requested > 0 else 0.0
+    return total_allocated, total_requested, overall_rate
+
+
+def print_infeasible_report(data, model, constraint_flags):
+    """Print per-request candidates, teacher resources and active constraints."""
+    s_map, t_map, c_map = data['s_map'], data['t_map'], data['c_map']
+    x = model['x']
+    x_by_teacher_slot = model['x_by_teacher_slot']
+    teacher_busy_slots = data['teacher_busy_slots']
+
+    print(f"\n{'='*50}")
+    print("🔍 INFEASIBLE 診断レポート")
+    print(f"{'='*50}")
+
+    # 候補変数のキーを1回だけ走査して、リクエスト別・講師別の集計を作る
+    req_slots, req_teachers = collections.defaultdict(set), collections.defaultdict(set)
+    for sid, cid, tid, slid in x.keys():
+        req_slots[(sid, cid)].add(slid)
+        req_teachers[(sid, cid)].add(tid)
+    teacher_slots, teacher_vars = collections.defaultdict(int), collections.defaultdict(int)
+    for (tid, slid), vars_t in x_by_teacher_slot.items():
+        teacher_slots[tid] += 1
+        teacher_vars[tid] += len(vars_t)
+
+    # リクエストごとの配置可能性チェック
+    print(f"\n📌 リクエスト別 配置可能性:")
+    for req in data['requests']:
+        sid, cid, sessions = req['sid'], req['cid'], req['sessions']
+        n_slots, n_teachers = len(req_slots.get((sid, cid), ())), len(req_teachers.get((sid, cid), ()))
+        status_icon = "✅" if n_slots >= sessions else "⚠️"
+        print(f"  {status_icon} {s_map.get(sid)} x {c_map.get(cid)}: "
+              f"希望{sessions}コマ / 候補スロット{n_slots}個 / 候補講師{n_teachers}名")
+
+    # リソース利用状況
+    print(f"\n📌 リソース利用状況:")
+    for tid in t_map.keys():
+        existing = len(teacher_busy_slots.get(tid, set()))
+        print(f"  講師 {t_map.get(tid)}: 候補変数{teacher_vars.get(tid, 0)}個 / "
+              f"候補スロット{teacher_slots.get(tid, 0)}個 / 既存{existing}コマ")
+
+    # 制約影響分析
+    print(f"\n📌 有効な追加制約:")
+    for code, flags in constraint_flags.items():
+        if flags.get('activated'):
+            print(f"  ✅ {code}")
+        else:
+            print(f"  ⬜ {code} (無効)")
+
+    print(f"\n💡 対処法:")
+    print(f"  1. 制約条件を一部OFFにして再実行してみてください")
+    print(f"  2. 生徒・講師の空き枠を増やしてください")
+    print(f"  3. 講師の指導可能科目を確認してください")
+    print(f"  4. 制約5(空きコマ上限)が有効な場合、値を緩めてみてください")
+    print(f"{'='*50}")
@@ -0,0 +1,185 @@
+"""
+Rolling-horizon solve for long scheduling periods.
+
+Instead of one model over every slot in I05, the period is solved week by
+week: each step builds the model for the current week plus a look-ahead
+window, keeps only the current week's lessons and feeds them back to
+prepare_data as fixed allocations (the same path as 追記配置 with O01), so
+busy slots, remaining sessions and max_slot limits carry over to the next
+step. All hard constraints except the session totals are within one day,
+so they hold across week boundaries as well.
+
+Remaining sessions are rebalanced at every step: a request may use at most
+its share of the remaining sessions in proportion to the student's
+available slots in the window versus the rest of the period, so the early
+weeks do not take lessons that later weeks could have placed.
+"""
+
+import collections
+import contextlib
+import io
+import math
+import time
+
+import pandas as pd
+
+from allocation.engines import is_solution_status, make_engine
+from allocation.model import build_model, solution_keys
+from allocation.monitor import PeakMemory
+from allocation.prep import prepare_data
+from allocation.report import build_outputs
+
+
+def horizon_weeks(df_slots):
+    """Lesson dates of I05 grouped into calendar weeks (starting Monday), in date order."""
+    weeks = collections.OrderedDict()
+    for date in sorted(df_slots['date'].unique(), key=str):
+        day = pd.Timestamp(str(date))
+        weeks.setdefault(day - pd.Timedelta(days=day.weekday()), []).append(date)
+    return list(weeks.values())
+
+
+def _window_dfs(dfs, slot_ids):
+    """Input DataFrames with the availabilities (I51/I52) restricted to the window slots."""
+    sub = dict(dfs)
+    for key in ['student_avail', 'teacher_avail']:
+        sub[key] = dfs[key][dfs[key]['slot_id'].isin(slot_ids)]
+    return sub
+
+
+def _restrict_to_dates(data, dates):
+    """Limit the per-date / per-slot loops of build_model to the window dates."""
+    data['slots_by_date'] = collections.defaultdict(
+        list, {date: slots for date, slots in data['slots_by_date'].items() if date in dates}
+    )
+    data['all_slots'] = [slid for slid in data['all_slots'] if data['slot_to_date'][slid] in dates]
+
+
+def _rebalance(requests, student_avail, window_slots, horizon_slots):
+    """Cap each request at its share of the remaining sessions for this window; returns the number capped."""
+    capped = 0
+    for req in requests:
+        avail = student_avail.get(req['sid'], set())
+        in_horizon = len(avail & horizon_slots)
+        if in_horizon == 0:
+            continue
+        cap = math.ceil(req['sessions'] * len(avail & window_slots) / in_horizon)
+        if cap < req['sessions']:
+            req['sessions'] = cap
+            capped += 1
+    return capped
+
+
+def rolling_stats(week_stats):
+    """
+    Run-record summary of the weekly solves (monitor.RunRecord.solver):
+    variables, constraints and search statistics summed over the weeks.
+    Objective, bound and gap belong to one week's model only, so they are
+    left empty.
+    """
+    stats = {'objective': None, 'bound': None, 'gap': None, 'weeks': len(week_stats)}
+    for row in week_stats:
+        for key, val in row.items():
+            if key != 'seconds':
+                stats[key] = stats.get(key, 0) + val
+    stats['max_week_seconds'] = round(max((row['seconds'] for row in week_stats), default=0.0), 3)
+    return stats
+
+
+def solve_monolithic(dfs, df_existing, constraint_flags, engine_name='SCIP', time_limit=30,
+                     num_workers=8, c5_encoding='pairwise'):
+    """Solve the whole period as one model (for comparison); returns a summary dict."""
+    t0 = time.perf_counter()
+    with PeakMemory() as mem, contextlib.redirect_stdout(io.StringIO()):
+        data = prepare_data(dfs, df_existing)
+        engine = make_engine(engine_name, time_limit, num_workers)
+        model = build_model(data, constraint_flags, engine, c5_encoding)
+        status = engine.solve()
+        solved = is_solution_status(status)
+        lessons = len(solution_keys(model)) if solved else 0
+    return {
+        'status': status,
+        'lessons': lessons,
+        'objective': engine.objective_value() if solved else None,
+        'variables': len(model['x']),
+        'wall_time': time.perf_counter() - t0,
+        'peak_mb': mem.peak_mb - mem.start_mb,
+    }
+
+
+def solve_rolling(dfs, df_existing, constraint_flags, engine_name='SCIP', time_limit=30,
+                  num_workers=8, lookahead_weeks=1, c5_encoding='pairwise', compare=False):
+    """
+    Solve the period week by week.
+
+    Args:
+        dfs: normalized input DataFrames
+        df_existing: O01 rows to keep fixed, or None
+        constraint_flags: {code: {'activated', 'value'}}
+        engine_name, time_limit, num_workers: engine settings for every week
+            (time_limit is per week, not for the whole period)
+        lookahead_weeks: weeks after the current one included in each model
+        c5_encoding: passed to build_model
+        compare: also solve the whole period as one model and print the
+            wall time / peak memory / lessons of both
+
+    Returns:
+        (status, data, model, df_new, stats): data and model of the last
+        step, so build_outputs(data, model) gives the merged O01/O02/O03,
+        df_new with every lesson placed by the rolling solve and stats, the
+        solver statistics summed over the weeks (rolling_stats). On
+        failure, the failing week's status, data and model, df_new = None
+        and the statistics of the weeks solved so far.
+    """
+    weeks = horizon_weeks(dfs['slots'])
+    slot_to_date = dict(zip(dfs['slots']['id'], dfs['slots']['date']))
+    student_avail = dfs['student_avail'].groupby('student_id')['slot_id'].apply(set).to_dict()
+    fixed = [df_existing] if df_existing is not None and not df_existing.empty else []
+    committed = []
+    week_stats = []
+    print(f"  📅 ローリング計算: {len(weeks)} 週（先読み {lookahead_weeks} 週）")
+
+    t0 = time.perf_counter()
+    with PeakMemory() as mem:
+        for k, week in enumerate(weeks):
+            window_dates = {date for w in weeks[k:k + 1 + lookahead_weeks] for date in w}
+            horizon_dates = {date for w in weeks[k:] for date in w}
+            window_slots = {slid for slid, date in slot_to_date.items() if date in window_dates}
+            horizon_slots = {slid for slid, date in slot_to_date.items() if date in horizon_dates}
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                df_fixed = pd.concat(fixed, ignore_index=True) if fixed else None
+                data = prepare_data(_window_dfs(dfs, window_slots), df_fixed)
+                _restrict_to_dates(data, window_dates)
+                capped = _rebalance(data['requests'], student_avail, window_slots, horizon_slots)
+                engine = make_engine(engine_name, time_limit, num_workers)
+                model = build_model(data, constraint_flags, engine, c5_encoding)
+                status = engine.solve()
+            week_stats.append(dict(engine.stats(), variables=engine.num_variables(),
+                                   constraints=engine.num_constraints(), seconds=engine.wall_time))
+
+            if not is_solution_status(status):
+                print(f"  ❌ 第{k + 1}週 ({week[0]}〜{week[-1]}) で解が得られませんでした: {status}")
+                return status, data, model, None, rolling_stats(week_stats)
+
+            df_new = build_outputs(data, model)[1]
+            df_week = df_new[df_new['slot_id'].map(slot_to_date).isin(set(week))]
+            fixed.append(df_week)
+            committed.append(df_week)
+            print(f"    第{k + 1}週 {week[0]}〜{week[-1]}: {len(df_week)} コマ確定 "
+                  f"(変数 {len(model['x'])}, 配分調整 {capped} 件, {status}, {engine.wall_time:.1f}秒)")
+
+    wall_time = time.perf_counter() - t0
+    df_new = pd.concat(committed, ignore_index=True)
+    print(f"  ⏱ ローリング合計: {wall_time:.1f}秒, ピークメモリ +{mem.peak_mb - mem.start_mb:.0f} MB, "
+          f"{len(df_new)} コマ配置")
+
+    if compare:
+        mono = solve_monolithic(dfs, df_existing, constraint_flags, engine_name, time_limit,
+                                num_workers, c5_encoding)
+        print(f"  ⏱ 一括計算（比較）: {mono['wall_time']:.1f}秒, ピークメモリ +{mono['peak_mb']:.0f} MB, "
+              f"{mono['lessons']} コマ配置 ({mono['status']}, 変数 {mono['variables']})")
+
+    # 週ごとの最適解をつないだ解なので全体の最適性は保証されない
+    model['engine'].wall_time = wall_time
+    return ('FEASIBLE' if len(weeks) > 1 else status), data, model, df_new, rolling_stats(week_stats)
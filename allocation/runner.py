@@ -0,0 +1,481 @@
+"""
+Headless runner: one allocation run without Colab or gspread.
+
+The same steps as the Colab cells 02 / 03 - input diagnostics, existing O01
+handling (fix or hint), preprocessing, model build, solve (single model,
+group decomposition or rolling horizon), INFEASIBLE diagnostics and the
+O01/O02/O03 tables - as functions. run_csv_dir() reads a directory in the
+sample_sheet/ layout (what scripts/parse_pdfs.py writes) and writes the
+output sheets back as CSV files; the Colab cells use the same functions and
+only add the spreadsheet reads and writes.
+
+Usage:
+    from allocation.runner import run_csv_dir
+    result = run_csv_dir('sample_sheet', out_dir='out', engine_name='CP-SAT')
+"""
+
+import os
+import time
+
+import pandas as pd
+
+from allocation.anytime import print_progress, solve_anytime
+from allocation.decompose import solve_decomposed
+from allocation.elastic import diagnose_infeasible, print_elastic_report
+from allocation.engines import STATUS_LABELS, is_solution_status, make_engine
+from allocation.input_cache import SOURCE_LABELS, load_inputs_cached, print_cache_report
+from allocation.inputs import (
+    ALLOCATED_SHEET,
+    DAILY_UTILIZATION_SHEET,
+    FULFILLMENT_SHEET,
+    RUN_RECORD_SHEET,
+    SCENARIO_SHEET,
+    SHEET_NAMES,
+    TEACHER_UTILIZATION_SHEET,
+    UNALLOCATED_SHEET,
+    CsvWorkbook,
+    load_inputs,
+    normalize_inputs,
+    parse_constraint_flags,
+    read_existing_csv,
+)
+from allocation.lexicographic import phase_stats, solve_lexicographic
+from allocation.lns import solve_lns
+from allocation.model import build_model, solution_keys
+from allocation.model_cache import (
+    DEFAULT_MAX_MB,
+    cache_keys,
+    load_model,
+    load_solution,
+    print_model_cache_report,
+    save_model,
+    save_solution,
+)
+from allocation.monitor import RunRecord
+from allocation.prep import prepare_data
+from allocation.preview import preview_schedule, preview_stats, print_preview
+from allocation.report import (
+    build_outputs,
+    fulfillment_summary,
+    outputs_from_keys,
+    print_infeasible_report,
+    print_input_report,
+    utilization_report,
+)
+from allocation.rolling import solve_rolling
+from allocation.scenarios import print_scenarios, scenario_grid, solve_scenarios
+from allocation.warmstart import apply_hint, load_solution_file, print_hint_result, save_solution_file
+
+
+def split_existing(df_existing, existing_mode='fix', hint_file=None):
+    """
+    Decide how existing O01 rows are used.
+
+    Args:
+        df_existing: rows of O01 (empty DataFrame when there are none)
+        existing_mode: 'fix' keeps them and adds the remaining lessons,
+            'hint' re-optimizes everything with them as the initial solution
+        hint_file: solution file (O01 layout CSV) used as the hint instead
+
+    Returns:
+        (df_fixed or None, df_hint or None)
+    """
+    if df_existing is not None and not df_existing.empty and 'slot_id' in df_existing.columns:
+        print(f"ℹ️ 既存の配置データが見つかりました ({len(df_existing)} 件)。")
+        if existing_mode == 'hint':
+            print("   これらを【初期解】として、全体を再最適化します。")
+            df_fixed = None
+        else:
+            print("   これらを【固定】して、残りの授業を配置します。")
+            df_fixed = df_existing
+    else:
+        print("ℹ️ 既存の配置データはありません。新規に配置します。")
+        df_existing, df_fixed = pd.DataFrame(), None
+
+    # 初期解（ヒント）: 解ファイル指定があればそれを、hint モードなら既存配置を使う
+    df_hint = None
+    if hint_file:
+        df_hint = load_solution_file(hint_file)
+        print(f"ℹ️ 解ファイル {hint_file} を初期解として読み込みました ({len(df_hint)} 件)。")
+    elif existing_mode == 'hint' and not df_existing.empty:
+        df_hint = df_existing
+    return df_fixed, df_hint
+
+
+def run_allocation(dfs, constraint_flags, df_fixed=None, df_hint=None, engine_name='SCIP', time_limit=30,
+                   num_workers=8, decompose=False, decompose_processes=None, rolling=False,
+                   lookahead_weeks=1, rolling_compare=False, elastic=True, snapshot=None, gap_limit=None,
+                   lexicographic=False, phase2_time_limit=None, symmetry=False, preview=False, lns=False,
+                   scenarios=None, model_cache_dir=None, model_cache_max_mb=DEFAULT_MAX_MB, record=None):
+    """
+    Preprocess, build, solve and build the output tables.
+
+    Args:
+        dfs: normalized input DataFrames (read_csv_dir / the spreadsheet)
+        constraint_flags: {code: {'activated', 'value'}}
+        df_fixed, df_hint: from split_existing
+        engine_name, time_limit, num_workers: engine settings
+        decompose, decompose_processes: solve independent groups in parallel
+            (decompose.solve_decomposed; the hint is not used)
+        lns: improve a schedule of the full model by re-solving neighborhoods
+            (dates / teachers / subject) in decompose_processes worker
+            processes within time_limit (lns.solve_lns; the hint is not used)
+        rolling, lookahead_weeks, rolling_compare: week-by-week solve
+            (rolling.solve_rolling; time_limit applies to every week)
+        elastic: when INFEASIBLE, solve once more with slack on every hard
+            row and report the rows that must be violated (allocation.elastic)
+        snapshot, gap_limit: single-model solve only - stream every improved
+            schedule to the snapshot files <snapshot>_O01/_O03/_progress.csv
+            and stop once the relative gap is at most gap_limit
+            (allocation.anytime); either one switches the anytime solve on
+        lexicographic, phase2_time_limit: single-model solve only - maximize
+            the lessons first, then the soft constraints with the lessons
+            kept, phase 2 within phase2_time_limit (allocation.lexicographic;
+            takes precedence over snapshot / gap_limit)
+        symmetry: single-model solve without a hint only - order
+            interchangeable teachers / students by their new lessons
+            (allocation.symmetry)
+        preview: skip the MIP - print the max-flow upper bound and return
+            the greedy schedule as the outputs (allocation.preview)
+        scenarios: {code: [setting, ...]} grid of constraint-sheet changes -
+            skip the normal solve and solve the base flags and every
+            combination in decompose_processes worker processes instead,
+            each within time_limit (allocation.scenarios; no outputs)
+        model_cache_dir, model_cache_max_mb: single-model solve only - load
+            the built model from this directory when the inputs, engine and
+            build options are unchanged, and return the stored schedule
+            without solving when the time limit, workers and hint are
+            unchanged too (plain solve only; allocation.model_cache, at most
+            model_cache_max_mb on disk)
+        record: optional monitor.RunRecord receiving the phase laps and
+            solver statistics
+
+    Returns:
+        dict with 'status', 'data', 'model', 'engine', 'hint_info',
+        'outputs' ((df_final, df_new, df_un, df_fulfill)) and 'utilization'
+        ((df_teacher, df_daily)) - both None without a solution - and
+        'violations' (elastic diagnosis DataFrame when INFEASIBLE) and
+        'progress' (incumbents of the anytime solve, or the objective per
+        round of the LNS), 'phases' (per-phase
+        status and time of the lexicographic solve), 'preview'
+        (preview_schedule result; model and engine are None then) and
+        'scenarios' (comparison table of the scenario sweep; status is the
+        base scenario's, model and engine are None), or None when every
+        request is already allocated.
+    """
+    record = record or RunRecord()
+    # キャッシュのキーは前処理の前の入力から作る
+    use_symmetry = symmetry and df_hint is None
+    keys = cache_keys(dfs, df_fixed, df_hint, constraint_flags, engine_name, time_limit, num_workers, gap_limit,
+                      symmetry=use_symmetry) if model_cache_dir else None
+    data = prepare_data(dfs, df_fixed)
+    record.lap('prepare')
+
+    if not data['requests']:
+        print("🎉 全ての授業が既に配置済みです。計算を終了します。")
+        return None
+
+    if preview:
+        # MIP は解かず、上限（最大フロー）と貪欲法の配置だけを出す
+        print("  プレビュー: 最大フローの上限と貪欲法の配置を計算します（最適化は行いません）")
+        result_preview = preview_schedule(data, constraint_flags)
+        record.lap('solve')
+        record.solver = preview_stats(result_preview)
+        print_preview(result_preview)
+        outputs = outputs_from_keys(data, result_preview['keys'])
+        utilization = utilization_report(dfs, outputs[0], data['t_map'])
+        record.lap('outputs')
+        return {'status': record.solver['status'], 'data': data, 'model': None, 'engine': None, 'hint_info': None,
+                'outputs': outputs, 'utilization': utilization, 'violations': None, 'progress': None,
+                'phases': None, 'preview': result_preview, 'scenarios': None}
+
+    if scenarios:
+        # 制約シートの変更（on/off・値）の組み合わせごとに並列で計算し、比較表だけを作る
+        df_scenarios = solve_scenarios(data, scenario_grid(constraint_flags, scenarios), engine_name,
+                                       time_limit, num_workers, decompose_processes)
+        record.lap('solve')
+        print_scenarios(df_scenarios)
+        return {'status': df_scenarios['ステータス'].iloc[0], 'data': data, 'model': None, 'engine': None,
+                'hint_info': None, 'outputs': None, 'utilization': None, 'violations': None,
+                'progress': None, 'phases': None, 'preview': None, 'scenarios': df_scenarios}
+
+    # --------------------------------------------------
+    # 4. 最適化モデル作成
+    # --------------------------------------------------
+    print(f"  ソルバー: {engine_name} (制限時間 {time_limit}秒)")
+    hint_info = None
+    df_rolling_new = rolling_summary = None
+    anytime = None
+    lexi = None
+    lns_progress = None
+    if rolling:
+        # 週ごとに計算し、確定した配置を既存配置として次の週へ引き継ぐ
+        print("  計算中（ローリング）...")
+        status, data, model, df_rolling_new, rolling_summary = solve_rolling(
+            dfs, df_fixed, constraint_flags, engine_name, time_limit, num_workers,
+            lookahead_weeks, compare=rolling_compare
+        )
+        engine = model['engine']
+        record.lap('solve')
+    elif decompose:
+        # 独立したグループごとに並列で計算し、統合結果を単一モデルで検証
+        print("  計算中（グループ分割）...")
+        status, model = solve_decomposed(data, constraint_flags, engine_name, time_limit,
+                                         num_workers, decompose_processes)
+        engine = model['engine']
+        record.lap('solve')
+    elif lns:
+        # 全体モデルの初期解を、近傍（日付・講師・科目）ごとの小さなモデルで並列に改善
+        print("  計算中（近傍探索 LNS）...")
+        status, model, lns_progress = solve_lns(data, constraint_flags, engine_name, time_limit,
+                                                num_workers, decompose_processes)
+        engine = model['engine']
+        record.lap('solve')
+    else:
+        # 解のキャッシュは途中解の保存・ギャップ打ち切り・2段階の最適化をしない通常の計算だけ
+        plain = not (lexicographic or snapshot or gap_limit is not None)
+        if keys is not None and plain:
+            cached = load_solution(model_cache_dir, keys['solution'])
+            record.cache['solution'] = 'hit' if cached is not None else 'miss'
+            if cached is not None:
+                print("  🗃 同じ入力・設定の解がキャッシュにあります（モデル作成・計算を省略）")
+                outputs = outputs_from_keys(data, cached['keys'])
+                record.lap('solve')
+                record.solver = cached['solver']
+                print_model_cache_report(record.cache)
+                print(f"  ★ 計算完了（キャッシュ）。[{cached['solver']['status']}, "
+                      f"計算時 {cached['solver']['wall_time']:.1f}秒]")
+                utilization = utilization_report(dfs, outputs[0], data['t_map'])
+                record.lap('outputs')
+                return {'status': cached['solver']['status'], 'data': data, 'model': None, 'engine': None,
+                        'hint_info': None, 'outputs': outputs, 'utilization': utilization, 'violations': None,
+                        'progress': None, 'phases': None, 'preview': None, 'scenarios': None}
+
+        engine = make_engine(engine_name, time_limit, num_workers)
+        if symmetry and df_hint is not None:
+            print("  ℹ️ 初期解を使うため、対称性の除去は行いません（初期解が並び順の制約に反する場合があるため）。")
+        model = None
+        if keys is not None:
+            model = load_model(model_cache_dir, keys['model'], engine, data['slot_to_date'])
+            record.cache['model'] = 'hit' if model is not None else 'miss'
+        if model is not None:
+            print(f"  🗃 モデルをキャッシュから読み込みました（変数 {len(model['x'])}個, "
+                  f"制約 {engine.num_constraints()}件）")
+            record.lap('model_cache', engine)
+        else:
+            model = build_model(data, constraint_flags, engine, record=record, symmetry=use_symmetry)
+            if keys is not None:
+                record.cache['evicted'] = save_model(model_cache_dir, keys['model'], model, model_cache_max_mb)
+        print_model_cache_report(record.cache)
+
+        if df_hint is not None:
+            hint_info = apply_hint(model, df_hint)
+            record.lap('hint')
+
+        # 計算実行（途中解のスナップショット / ギャップ基準の打ち切りがあれば逐次モード）
+        print("  計算中...")
+        if lexicographic:
+            # 配置数 → ソフト制約の順に2段階で最適化
+            lexi = solve_lexicographic(model, phase2_time_limit)
+            status = lexi['status']
+        elif snapshot or gap_limit is not None:
+            anytime = solve_anytime(data, model, snapshot, gap_limit)
+            status = anytime['status']
+            print_progress(anytime, gap_limit, snapshot)
+        else:
+            status = engine.solve()
+        record.lap('solve', engine)
+    record.solver_stats(engine, status)
+    if rolling_summary is not None:
+        # 最終週のモデルの値ではなく、全週の合計（目的関数値・上界・ギャップは記録しない）
+        record.solver.update(rolling_summary)
+    if model.get('merged'):
+        # グループ分割の統合解: 確認用モデル（x 固定）の上界は全体の上界ではないので記録しない
+        record.solver.update(bound=None, gap=None)
+    if lexi is not None:
+        record.solver.update(phase_stats(lexi))
+    if 'solution' in record.cache and is_solution_status(status):
+        record.cache['evicted'] = record.cache.get('evicted', 0) + save_solution(
+            model_cache_dir, keys['solution'], solution_keys(model), record.solver, model_cache_max_mb)
+
+    result = {'status': status, 'data': data, 'model': model, 'engine': engine,
+              'hint_info': hint_info, 'outputs': None, 'utilization': None, 'violations': None,
+              'progress': anytime['progress'] if anytime is not None else lns_progress,
+              'phases': lexi['phases'] if lexi is not None else None, 'preview': None, 'scenarios': None}
+
+    if not is_solution_status(status):
+        print(f"\n❌ 計算できませんでした。")
+        print(f"   ソルバーステータス: {STATUS_LABELS.get(status, f'不明({status})')}")
+        print(f"   変数数: {len(model['x'])}, 制約数: {model['constraint_count'] + model['extra_count']}")
+
+        # --- INFEASIBLE デバッグ情報 ---
+        if status == 'INFEASIBLE':
+            print_infeasible_report(data, model, constraint_flags)
+            if elastic:
+                print("\n  制約違反を最小化するモデルで原因を調べています...")
+                elastic_status, result['violations'] = diagnose_infeasible(
+                    data, constraint_flags, engine_name, time_limit, num_workers)
+                print_elastic_report(elastic_status, result['violations'])
+                record.lap('elastic')
+        return result
+
+    if lexi is not None:
+        seconds = lexi['phases']['seconds'].sum()
+        print(f"  ★ 計算完了（すべてのハード制約を満たしています）。[{status}, 2段階 計{seconds:.1f}秒]")
+        soft = f"{lexi['soft']:+.2f}" if lexi['soft'] is not None else "未計算"
+        print(f"    配置 {lexi['lessons']}コマ + ソフト制約 {soft} = {lexi['objective']:.2f}")
+    else:
+        print(f"  ★ 計算完了（すべてのハード制約を満たしています）。[{status}, {engine.wall_time:.1f}秒]")
+    print_hint_result(hint_info, engine, lexi['objective'] if lexi is not None else None)
+    if df_fixed is not None:
+        print("  既存データとマージします。")
+
+    # 中断・フェーズ2失敗の場合もソルバーの状態ではなく、記録した最良解から出力する
+    values = anytime['values'] if anytime is not None else lexi['values'] if lexi is not None else None
+    df_final, df_new, df_un, df_fulfill = build_outputs(data, model, values)
+    if df_rolling_new is not None:
+        df_new = df_rolling_new  # 最終週だけでなく全週の新規配置
+    result['outputs'] = (df_final, df_new, df_un, df_fulfill)
+    result['utilization'] = utilization_report(dfs, df_final, data['t_map'])
+    record.lap('outputs')
+    return result
+
+
+def print_result(outputs, show=None):
+    """Print the final schedule tail, unallocated lessons and fulfillment (show: e.g. Colab display)."""
+    show = show or (lambda df: print(df.to_string(index=False)))
+    df_final, df_new, df_un, df_fulfill = outputs
+
+    print(f"\n✅ 最終結果: 全 {len(df_final)} コマ (うち新規 {len(df_new)} コマ)")
+    show(df_final[['日時', '生徒名', '講師名', '科目名']].tail())
+
+    if not df_un.empty:
+        print(f"⚠️ 未配置: {len(df_un)} 件（制約を満たす範囲で最大限配置しました）")
+        show(df_un)
+    else:
+        print("✅ 未配置なし: すべてのリクエストが配置されました。")
+
+    # 充足率サマリー表示
+    total_allocated, total_requested, overall_rate = fulfillment_summary(df_fulfill)
+    print(f"\n📊 充足率: {total_allocated}/{total_requested} コマ ({overall_rate}%)")
+    show(df_fulfill)
+
+
+def print_utilization(utilization, show=None):
+    """Print the overall, per-teacher (lowest first) and per-day utilization."""
+    if utilization is None:
+        return
+    show = show or (lambda df: print(df.to_string(index=False)))
+    df_teacher, df_daily = utilization
+    allocated, free = df_teacher['配置コマ数'].sum(), df_teacher['空きコマ数'].sum()
+    rate = round(allocated / free * 100, 1) if free > 0 else 0.0
+    print(f"\n📊 講師稼働率: {allocated}/{free} コマ ({rate}%)")
+    show(df_teacher.sort_values('稼働率(%)', kind='stable'))
+    print(f"\n📊 日付別稼働率 ({len(df_daily)} 日)")
+    show(df_daily)
+
+
+def write_outputs(out_dir, outputs, record=None, utilization=None, scenarios=None):
+    """
+    Write O01/O02/O03, O05/O06 (utilization), O07 (scenario comparison) and
+    the run record as O04 .csv / .json to out_dir.
+
+    O01 is written in the sample_sheet layout, so the next run_csv_dir on the
+    same directory reads it back as existing allocations.
+
+    Returns:
+        list of written paths
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    if outputs is not None:
+        df_final, _, df_un, df_fulfill = outputs
+        for name, df in [(ALLOCATED_SHEET, df_final), (UNALLOCATED_SHEET, df_un), (FULFILLMENT_SHEET, df_fulfill)]:
+            path = os.path.join(out_dir, f'{name}.csv')
+            df.to_csv(path, index=False, encoding='utf-8')
+            paths.append(path)
+    if utilization is not None:
+        for name, df in zip([TEACHER_UTILIZATION_SHEET, DAILY_UTILIZATION_SHEET], utilization):
+            path = os.path.join(out_dir, f'{name}.csv')
+            df.to_csv(path, index=False, encoding='utf-8')
+            paths.append(path)
+    if scenarios is not None:
+        path = os.path.join(out_dir, f'{SCENARIO_SHEET}.csv')
+        scenarios.to_csv(path, index=False, encoding='utf-8')
+        paths.append(path)
+    if record is not None:
+        paths.extend(record.save(os.path.join(out_dir, RUN_RECORD_SHEET)))
+    return paths
+
+
+def run_csv_dir(csv_dir, out_dir=None, existing_mode='fix', hint_file=None, save_solution=None,
+                diagnostics=True, cache_dir=None, **options):
+    """
+    Run the whole allocation on a CSV directory.
+
+    Args:
+        csv_dir: input directory in the sample_sheet/ layout (an existing
+            O01_output_allocated_lessons.csv there is used per existing_mode)
+        out_dir: where O01-O07 are written (None: csv_dir itself,
+            like the spreadsheet; '': nothing is written)
+        existing_mode, hint_file: see split_existing
+        save_solution: also save the schedule as a solution file here
+        diagnostics: print the input diagnostic report first
+        cache_dir: input cache directory (see input_cache; None reads every
+            file again)
+        **options: run_allocation settings (engine_name, time_limit, ...)
+
+    Returns:
+        run_allocation result (None when nothing was left to allocate)
+    """
+    record = RunRecord().start()
+    record.meta = dict({'csv_dir': csv_dir, 'existing_mode': existing_mode},
+                       **{k: v for k, v in options.items() if k != 'record'})
+
+    print("--- 📥 データを読み込んでいます... ---")
+    t_load = time.perf_counter()
+    wb = CsvWorkbook(csv_dir)
+    if cache_dir:
+        dfs, missing_sheets, cache_sources = load_inputs_cached(wb, cache_dir)
+    else:
+        (dfs, missing_sheets), cache_sources = load_inputs(wb), {}
+    for key, sheet_name in SHEET_NAMES.items():
+        if sheet_name in missing_sheets:
+            print(f"⚠️ 警告: {sheet_name}.csv が見つかりません！")
+        else:
+            source = f" [{SOURCE_LABELS[cache_sources[sheet_name]]}]" if sheet_name in cache_sources else ""
+            print(f"・{sheet_name}: {len(dfs[key])}行 読み込みOK{source}")
+    print_cache_report(cache_sources, time.perf_counter() - t_load)
+    normalize_inputs(dfs)
+    constraint_flags = parse_constraint_flags(dfs['constraints'])
+    if diagnostics:
+        print_input_report(dfs, constraint_flags)
+    record.lap('read_inputs')
+
+    print("\n--- 🧠 最適化計算を開始します ---")
+    df_fixed, df_hint = split_existing(read_existing_csv(csv_dir), existing_mode, hint_file)
+    record.lap('read_existing')
+    result = run_allocation(dfs, constraint_flags, df_fixed, df_hint, record=record, **options)
+
+    outputs = result['outputs'] if result is not None else None
+    utilization = result['utilization'] if result is not None else None
+    if outputs is not None:
+        print_result(outputs)
+        print_utilization(utilization)
+        if save_solution:
+            save_solution_file(save_solution, outputs[0])
+            print(f"\n💾 解ファイルを保存しました: {save_solution}")
+
+    record.stop()
+    print()
+    record.print_summary()
+    if out_dir is None and options.get('preview'):
+        # プレビューの配置で入力ディレクトリの O01（次回の既存配置）を上書きしない
+        print("ℹ️ プレビューのため、入力ディレクトリには書き出しません（--out-dir / --save-solution で保存できます）。")
+        out_dir = ''
+    out_dir = csv_dir if out_dir is None else out_dir
+    if out_dir:
+        paths = write_outputs(out_dir, outputs, record, utilization,
+                              result['scenarios'] if result is not None else None)
+        print(f"💾 {len(paths)} ファイルを {out_dir} に書き出しました")
+    return result
@@ -0,0 +1,221 @@
+"""
+What-if scenario sweep over the constraint sheet.
+
+Admins often rerun the whole allocation only to see how switching a
+constraint row on/off (e.g. max_teacher_continuous_vacant_slot) or changing
+its value (max_lesson_per_timeslot = 3 vs 4, a soft-constraint weight)
+changes the fulfillment. solve_scenarios() solves a list of constraint_flags
+variants (scenario_grid() builds them from a grid) in one job:
+
+  1. the inputs are preprocessed once (prep.prepare_data) and the candidate
+     set is built once (candidates.build_candidates only depends on the
+     inputs, not on the flags),
+  2. both are handed to every worker process of a process pool once (pool
+     initializer), and each scenario is a task of its flags only,
+  3. every worker builds and solves the model of its scenario (presolve and
+     the rows follow the scenario's flags) and returns one summary row.
+
+The result is one comparison table (SCENARIO_COLUMNS): new and total lessons,
+充足率, unallocated lessons, solve time and gap per scenario. The schedules
+themselves are not kept; run the chosen scenario normally to write O01.
+"""
+
+import concurrent.futures
+import contextlib
+import copy
+import io
+import itertools
+import time
+
+import pandas as pd
+
+from allocation.candidates import build_candidates
+from allocation.decompose import DEFAULT_PROCESSES
+from allocation.engines import STATUS_LABELS, is_solution_status, make_engine, mip_gap
+from allocation.model import build_model
+from allocation.report import PER_PERSON_CONSTRAINTS, build_outputs, fulfillment_summary
+
+SCENARIO_COLUMNS = ['シナリオ', '変更内容', 'ステータス', '新規コマ数', '配置コマ数', '希望コマ数',
+                    '充足率(%)', '未配置コマ数', '作成時間(秒)', '計算時間(秒)', 'ギャップ(%)']
+
+BASE_SCENARIO = '基準'
+
+# on/off の指定（コマンドラインの --scenario など）
+_SWITCHES = {'on': True, 'off': False, 'true': True, 'false': False}
+
+# ワーカープロセスで共有する前処理済みデータと候補（_init_worker で1回だけ受け取る）
+_shared = {}
+
+
+def _describe(code, setting):
+    """One change as text: 'code=on' / 'code=off' / 'code=4'."""
+    if isinstance(setting, bool):
+        return f"{code}={'on' if setting else 'off'}"
+    return f"{code}={setting:g}"
+
+
+def apply_setting(constraint_flags, code, setting):
+    """
+    Return a copy of constraint_flags with one constraint row changed.
+
+    Args:
+        constraint_flags: {code: {'activated', 'value'}}
+        code: constraint code of the row (must be on the constraint sheet)
+        setting: True / False switches the row on / off (the value is kept),
+            a number sets the value and switches it on. Per-person
+            constraints (value in the teacher / student sheets) and
+            constraints without a value only take True / False.
+    """
+    if code not in constraint_flags:
+        raise ValueError(f"制約シートにない制約です: {code}")
+    flags = copy.deepcopy(constraint_flags)
+    if isinstance(setting, bool):
+        flags[code]['activated'] = setting
+    elif code in PER_PERSON_CONSTRAINTS:
+        raise ValueError(f"{code} は講師・生徒ごとの設定のため、on / off だけを指定できます")
+    else:
+        flags[code] = {'activated': True, 'value': float(setting)}
+    return flags
+
+
+def scenario_grid(constraint_flags, grid):
+    """
+    Scenarios for every combination of the grid settings.
+
+    Args:
+        constraint_flags: flags of the constraint sheet (the base scenario)
+        grid: {code: [setting, ...]} (see apply_setting), e.g.
+            {'max_lesson_per_timeslot': [3, 4],
+             'max_teacher_continuous_vacant_slot': [True, False]}
+
+    Returns:
+        list of {'name', 'changes', 'flags'}: the base scenario (the sheet
+        as it is) first, then one per combination; combinations that give
+        the same flags as an earlier scenario are left out.
+    """
+    scenarios = [{'name': BASE_SCENARIO, 'changes': '', 'flags': copy.deepcopy(constraint_flags)}]
+    codes = list(grid)
+    for settings in itertools.product(*(grid[code] for code in codes)):
+        flags = constraint_flags
+        for code, setting in zip(codes, settings):
+            flags = apply_setting(flags, code, setting)
+        if any(flags == s['flags'] for s in scenarios):
+            continue
+        changes = ', '.join(_describe(code, setting) for code, setting in zip(codes, settings))
+        scenarios.append({'name': f'S{len(scenarios)}', 'changes': changes, 'flags': flags})
+    return scenarios
+
+
+def parse_scenario_option(text):
+    """
+    'code=v1,v2,...' (command line) -> (code, [setting, ...]).
+
+    on / off (true / false) switch the row, numbers set its value.
+    """
+    code, sep, values = text.partition('=')
+    if not sep or not values:
+        raise ValueError(f"シナリオの指定は code=値1,値2 の形式です: {text}")
+    settings = []
+    for raw in values.split(','):
+        raw = raw.strip()
+        if raw.lower() in _SWITCHES:
+            settings.append(_SWITCHES[raw.lower()])
+        else:
+            try:
+                settings.append(float(raw))
+            except ValueError:
+                raise ValueError(f"シナリオの値は on / off か数値です: {raw}") from None
+    return code.strip(), settings
+
+
+def _init_worker(data, df_candidates):
+    """Pool initializer: keep the shared data and candidates in the worker process."""
+    _shared['data'] = data
+    _shared['candidates'] = df_candidates
+
+
+def _solve_scenario(flags, engine_name, time_limit, num_workers):
+    """Build and solve one scenario (runs in a worker process); returns a picklable summary."""
+    data = _shared['data']
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine = make_engine(engine_name, time_limit, num_workers)
+        t0 = time.perf_counter()
+        model = build_model(data, flags, engine, candidates=_shared['candidates'])
+        build_s = time.perf_counter() - t0
+        status = engine.solve()
+        outputs = build_outputs(data, model) if is_solution_status(status) else None
+    summary = {'status': status, 'build_s': build_s, 'solve_s': engine.wall_time,
+               'gap': mip_gap(engine, status)}
+    if outputs is not None:
+        _, df_new, df_un, df_fulfill = outputs
+        allocated, requested, rate = fulfillment_summary(df_fulfill)
+        summary.update(new=len(df_new), allocated=int(allocated), requested=int(requested), rate=rate,
+                       unallocated=int(df_un['不足数'].sum()) if not df_un.empty else 0)
+    return summary
+
+
+def solve_scenarios(data, scenarios, engine_name='SCIP', time_limit=30, num_workers=8, processes=None):
+    """
+    Solve every scenario in a process pool and compare them.
+
+    Args:
+        data: output of prep.prepare_data (shared by every scenario)
+        scenarios: list of {'name', 'changes', 'flags'} (scenario_grid)
+        engine_name, time_limit: engine and time limit of each scenario
+        num_workers: CP-SAT search workers, shared among the processes
+        processes: size of the process pool (default: CPU count)
+
+    Returns:
+        DataFrame with SCENARIO_COLUMNS, one row per scenario in the given
+        order (lesson columns empty when the scenario has no solution)
+    """
+    t0 = time.perf_counter()
+    processes = max(1, min(processes or DEFAULT_PROCESSES, len(scenarios)))
+    workers_each = max(1, num_workers // processes)
+    df_candidates = build_candidates(
+        data['requests'], data['dfs']['teachable'], data['dfs']['student_avail'],
+        data['dfs']['teacher_avail'], data['df_existing'] if data['use_existing'] else None,
+        data['limit_constraints']
+    )
+    print(f"  🔀 シナリオ比較: {len(scenarios)} シナリオ（候補 {len(df_candidates)} 件を共有, "
+          f"{processes} プロセス, 各 {time_limit}秒まで）")
+
+    results = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                                initargs=(data, df_candidates)) as pool:
+        futures = {
+            pool.submit(_solve_scenario, scenario['flags'], engine_name, time_limit, workers_each): i
+            for i, scenario in enumerate(scenarios)
+        }
+        for future in concurrent.futures.as_completed(futures):
+            i = futures[future]
+            results[i] = future.result()
+            print(f"    {scenarios[i]['name']}: {STATUS_LABELS.get(results[i]['status'], results[i]['status'])} "
+                  f"({results[i]['solve_s']:.1f}秒)")
+
+    rows = []
+    for i, scenario in enumerate(scenarios):
+        res = results[i]
+        rows.append([
+            scenario['name'], scenario['changes'], res['status'], res.get('new'), res.get('allocated'),
+            res.get('requested'), res.get('rate'), res.get('unallocated'), round(res['build_s'], 2),
+            round(res['solve_s'], 2), round(res['gap'] * 100, 2) if res['gap'] is not None else None,
+        ])
+    print(f"  -> シナリオ比較完了 ({time.perf_counter() - t0:.1f}秒)")
+    return pd.DataFrame(rows, columns=SCENARIO_COLUMNS)
+
+
+def print_scenarios(df_scenarios, show=None):
+    """Print the comparison table (show: e.g. Colab display) with the base scenario's lessons as reference."""
+    show = show or (lambda df: print(df.to_string(index=False)))
+    print(f"\n📊 シナリオ比較 ({len(df_scenarios)} シナリオ)")
+    show(df_scenarios)
+    base = df_scenarios[df_scenarios['シナリオ'] == BASE_SCENARIO]
+    if base.empty or pd.isna(base['配置コマ数'].iloc[0]):
+        return
+    base_allocated = base['配置コマ数'].iloc[0]
+    for row in df_scenarios[df_scenarios['シナリオ'] != BASE_SCENARIO].to_dict('records'):
+        if pd.isna(row['配置コマ数']):
+            continue
+        diff = int(row['配置コマ数'] - base_allocated)
+        print(f"  {row['シナリオ']} ({row['変更内容']}): 基準との差 {diff:+d}コマ, 充足率 {row['充足率(%)']}%")
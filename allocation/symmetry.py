@@ -0,0 +1,134 @@
+"""
+Symmetry breaking for interchangeable teachers and students.
+
+Teachers with the same availability, teachable subjects, I04 settings and
+existing lessons (busy slots) that no request names as desired_teacher_* are
+interchangeable: swapping the whole schedules of two of them gives another
+solution with the same objective. The same holds for students with the same
+availability, settings, existing lessons and requests (subject, remaining
+sessions, allowed / desired teachers and their limits). Each such class
+makes the MIP explore every permutation of the same schedule again.
+
+find_symmetry_classes() groups people by a signature of everything the
+model reads about them, and add_symmetry_breaking() orders each class by
+its number of new lessons (first id >= second id >= ...). Any solution can
+be permuted into that order, teacher and student classes independently, so
+the optimum is unchanged - only which of two identical people gets the
+extra lesson is fixed.
+"""
+
+import collections
+
+import pandas as pd
+
+_NAME_COLUMNS = {'id', 'teacher_name', 'student_name'}
+
+
+def _settings_key(settings):
+    """Hashable I03/I04 settings of one person (id and name left out, blanks unified)."""
+    return tuple(sorted(
+        (col, None if value == '' or pd.isna(value) else value)
+        for col, value in (settings or {}).items() if col not in _NAME_COLUMNS
+    ))
+
+
+def _classes(signatures):
+    """[[id, ...], ...]: ids with equal signatures, classes of two or more, sorted."""
+    groups = collections.defaultdict(list)
+    for pid, signature in signatures.items():
+        if signature is not None:
+            groups[signature].append(pid)
+    return sorted(sorted(ids) for ids in groups.values() if len(ids) >= 2)
+
+
+def find_symmetry_classes(data):
+    """
+    Interchangeable teachers and students.
+
+    Args:
+        data: output of prep.prepare_data
+
+    Returns:
+        {'teachers': [[tid, ...], ...], 'students': [[sid, ...], ...]}
+    """
+    # 希望講師として指名されている講師は入れ替えられない
+    named = {tid for (_, _, tid) in data['limit_constraints']}
+    subject_limits = data['student_subject_daily_limit']
+    ex_dates = collections.defaultdict(list)
+    for (sid, cid, date), count in data['existing_student_subject_date_counts'].items():
+        if count:
+            ex_dates[sid].append((cid, date, count))
+
+    teacher_signatures = {}
+    for tid in data['t_map'].keys():
+        avail = data['teacher_avail_set'].get(tid)
+        if tid in named or not avail:
+            continue
+        teacher_signatures[tid] = (
+            frozenset(avail),
+            frozenset(data['teachable_dict'].get(tid, ())),
+            frozenset(data['teacher_busy_slots'].get(tid, ())),
+            _settings_key(data['teacher_settings'].get(tid)),
+        )
+
+    requests_by_student = collections.defaultdict(list)
+    for req in data['requests']:
+        sid, cid = req['sid'], req['cid']
+        limits = tuple((tid, data['limit_constraints'].get((sid, cid, tid))) for tid in req['allowed_teachers'])
+        requests_by_student[sid].append((cid, req['sessions'], limits, subject_limits.get((sid, cid))))
+
+    student_signatures = {}
+    for sid, reqs in requests_by_student.items():
+        avail = data['student_avail_set'].get(sid)
+        if not avail:
+            continue
+        student_signatures[sid] = (
+            frozenset(avail),
+            frozenset(reqs),
+            frozenset(data['student_busy_slots'].get(sid, ())),
+            frozenset(ex_dates.get(sid, ())),
+            _settings_key(data['student_settings'].get(sid)),
+        )
+
+    return {'teachers': _classes(teacher_signatures), 'students': _classes(student_signatures)}
+
+
+def add_symmetry_breaking(engine, x, classes):
+    """
+    Order every class by its new lessons: sum(x of id_1) >= sum(x of id_2) >= ...
+
+    Args:
+        engine: the model's engine
+        x: registry.VarRegistry of the model
+        classes: find_symmetry_classes output
+
+    Returns:
+        number of rows added
+    """
+    rows = 0
+    for column, key in [('tid', 'teachers'), ('sid', 'students')]:
+        if not classes[key]:
+            continue
+        by_person = x.group(column)
+        for ids in classes[key]:
+            for a, b in zip(ids, ids[1:]):
+                vars_a, vars_b = by_person.get(a, []), by_person.get(b, [])
+                if not vars_b:
+                    continue
+                engine.add(engine.sum(vars_a) >= engine.sum(vars_b))
+                rows += 1
+    return rows
+
+
+def print_symmetry_report(classes, rows):
+    """One line per kind: classes, people in them and the rows added."""
+    if not classes['teachers'] and not classes['students']:
+        print("  対称性: 入れ替え可能な講師・生徒はいません")
+        return
+    for key, label in [('teachers', '講師'), ('students', '生徒')]:
+        groups = classes[key]
+        if groups:
+            sizes = ', '.join(str(len(ids)) for ids in groups[:10]) + (' ...' if len(groups) > 10 else '')
+            print(f"  対称性: 入れ替え可能な{label} {len(groups)} グループ "
+                  f"({sum(len(ids) for ids in groups)} 人; 人数 {sizes})")
+    print(f"  対称性の除去: +{rows} 制約（グループ内で新規コマ数の多い順に並べる）")
@@ -0,0 +1,225 @@
+"""
+Synthetic instance generator in the sample_sheet schema.
+
+Produces the input sheets (I01-I07, I51, I52) as DataFrames with the same
+columns as sample_sheet/*.csv so that the optimizer can be exercised on
+campuses of arbitrary size, and writes them (plus constraint.csv) as a
+CSV directory in the sample_sheet layout.
+"""
+
+import os
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from allocation.inputs import CONSTRAINT_CODES, SHEET_NAMES
+
+SUBJECT_NAMES = ['数学', '英語', '国語', '理科', '社会']
+
+# constraint シートの value 列の既定値（sample_sheet/constraint.csv と同じ）
+CONSTRAINT_VALUES = {
+    'max_lesson_per_timeslot': 3,
+    'soft_spread_subject_across_days': 0.1,
+    'soft_student_consecutive_slots': 0.05,
+}
+
+
+def generate_instance(n_students=8, n_teachers=5, n_days=5, slots_per_day=4,
+                      n_subjects=5, avail_density=0.5, pref_rate=0.3,
+                      subjects_per_student=2, sessions_per_subject=(1, 3),
+                      subject_limit_rate=0.3, seed=0):
+    """
+    Generate a random campus.
+
+    Args:
+        n_students, n_teachers: number of people
+        n_days, slots_per_day: size of the I05 slot grid
+        n_subjects: number of subjects in I01
+        avail_density: probability that a person is available in a slot
+        pref_rate: probability that a request names a desired_teacher_1
+        subjects_per_student: requests per student
+        sessions_per_subject: (min, max) sessions per request
+        subject_limit_rate: probability that a request has a
+            max_daily_subject_slot (1 or 2, constraint 6); drawn from a
+            separate RNG stream, so the other columns do not depend on it
+        seed: RNG seed
+
+    Returns:
+        dict of {sheet_name: DataFrame}
+    """
+    rng = np.random.default_rng(seed)
+    n_subjects = max(1, n_subjects)
+
+    df_subjects = pd.DataFrame({
+        'id': np.arange(1, n_subjects + 1),
+        'subject_name': [SUBJECT_NAMES[i] if i < len(SUBJECT_NAMES) else f'科目{i + 1}'
+                         for i in range(n_subjects)],
+    })
+    df_time_ranges = pd.DataFrame({
+        'id': np.arange(1, slots_per_day + 1),
+        'description': [f'{i}限' for i in range(1, slots_per_day + 1)],
+    })
+
+    start = date(2025, 7, 1)
+    dates = [(start + timedelta(days=d)).isoformat() for d in range(n_days)]
+    n_slots = n_days * slots_per_day
+    df_slots = pd.DataFrame({
+        'id': np.arange(1, n_slots + 1),
+        'date': np.repeat(dates, slots_per_day),
+        'time_range_id': np.tile(np.arange(1, slots_per_day + 1), n_days),
+    })
+
+    df_students = pd.DataFrame({
+        'id': np.arange(1, n_students + 1),
+        'student_name': [f'生徒{i}' for i in range(1, n_students + 1)],
+        'max_continuous_slot': rng.integers(2, 4, n_students),
+        'max_daily_slot': rng.integers(3, 5, n_students),
+    })
+    df_teachers = pd.DataFrame({
+        'id': np.arange(1, n_teachers + 1),
+        'teacher_name': [f'講師{i}' for i in range(1, n_teachers + 1)],
+        'max_daily_slot': rng.integers(3, slots_per_day + 1, n_teachers),
+        'max_continuous_vacant_slot': rng.integers(1, 3, n_teachers),
+    })
+
+    # 各講師は1〜3科目を指導可能。全科目に少なくとも1人の講師を割り当てる
+    teachable = set()
+    for tid in range(1, n_teachers + 1):
+        k = int(rng.integers(1, min(3, n_subjects) + 1))
+        for cid in rng.choice(n_subjects, size=k, replace=False) + 1:
+            teachable.add((tid, int(cid)))
+    for cid in range(1, n_subjects + 1):
+        teachable.add((int(rng.integers(1, n_teachers + 1)), cid))
+    df_teachable = pd.DataFrame(sorted(teachable), columns=['teacher_id', 'subject_id'])
+    teachers_by_subject = df_teachable.groupby('subject_id')['teacher_id'].apply(list).to_dict()
+
+    k = min(subjects_per_student, n_subjects)
+    req_rows = []
+    for sid in range(1, n_students + 1):
+        for cid in sorted(rng.choice(n_subjects, size=k, replace=False) + 1):
+            cid = int(cid)
+            sessions = int(rng.integers(sessions_per_subject[0], sessions_per_subject[1] + 1))
+            row = {'student_id': sid, 'subject_id': cid, 'sessions': sessions}
+            for i in range(1, 4):
+                row[f'desired_teacher_{i}'] = ''
+                row[f'max_slot_{i}'] = ''
+            if rng.random() < pref_rate:
+                row['desired_teacher_1'] = int(rng.choice(teachers_by_subject[cid]))
+            req_rows.append(row)
+    df_reqs = pd.DataFrame(req_rows)
+    # 制約6 の上限は別の乱数列で決める（subject_limit_rate を変えても他の列は同じ）
+    limit_rng = np.random.default_rng([seed, 6])
+    limited = limit_rng.random(len(df_reqs)) < subject_limit_rate
+    limits = limit_rng.integers(1, 3, len(df_reqs))
+    df_reqs['max_daily_subject_slot'] = [int(v) if m else '' for m, v in zip(limited, limits)]
+
+    def availability(n_people, col):
+        mask = rng.random((n_people, n_slots)) < avail_density
+        pid, slot_idx = np.nonzero(mask)
+        return pd.DataFrame({col: pid + 1, 'slot_id': slot_idx + 1})
+
+    return {
+        'I01_subject': df_subjects,
+        'I02_time_range': df_time_ranges,
+        'I03_student_list': df_students,
+        'I04_teacher_list': df_teachers,
+        'I05_lesson_slot': df_slots,
+        'I06_teachable_subjects': df_teachable,
+        'I07_student_subject': df_reqs,
+        'I51_student_availability': availability(n_students, 'student_id'),
+        'I52_teacher_availability': availability(n_teachers, 'teacher_id'),
+    }
+
+
+def generate_multi_course(n_courses=3, seed=0, **kwargs):
+    """
+    Generate a campus made of independent courses (e.g. 小学部 / 中学部 / 高校部).
+
+    Each course is a generate_instance() campus with its own students,
+    teachers and subjects (IDs offset per course); the time ranges and lesson
+    slots are shared, so the courses only interact through the booth cap of
+    constraint 4.
+
+    Args:
+        n_courses: number of courses
+        seed: RNG seed (course k uses seed + k)
+        **kwargs: passed to generate_instance for every course
+
+    Returns:
+        dict of {sheet_name: DataFrame}
+    """
+    courses = [generate_instance(seed=seed + k, **kwargs) for k in range(n_courses)]
+    # 生徒・講師・科目の ID を部ごとにずらす列
+    offsets = {
+        'I01_subject': {'id': 'subject'},
+        'I03_student_list': {'id': 'student'},
+        'I04_teacher_list': {'id': 'teacher'},
+        'I06_teachable_subjects': {'teacher_id': 'teacher', 'subject_id': 'subject'},
+        'I07_student_subject': {'student_id': 'student', 'subject_id': 'subject',
+                                'desired_teacher_1': 'teacher'},
+        'I51_student_availability': {'student_id': 'student'},
+        'I52_teacher_availability': {'teacher_id': 'teacher'},
+    }
+    sheets = {}
+    for name, columns in offsets.items():
+        frames = []
+        base = {'student': 0, 'teacher': 0, 'subject': 0}
+        for course_no, course in enumerate(courses, start=1):
+            df = course[name].copy()
+            for col, kind in columns.items():
+                if df[col].dtype == object:  # desired_teacher_1 は空欄 '' を含む
+                    df[col] = [v + base[kind] if v != '' else '' for v in df[col]]
+                else:
+                    df[col] = df[col] + base[kind]
+            if name == 'I01_subject':
+                df['subject_name'] = df['subject_name'] + f'（{course_no}部）'
+            frames.append(df)
+            base = {kind: base[kind] + len(course[sheet])
+                    for kind, sheet in [('student', 'I03_student_list'), ('teacher', 'I04_teacher_list'),
+                                        ('subject', 'I01_subject')]}
+        sheets[name] = pd.concat(frames, ignore_index=True)
+    for name in ['I02_time_range', 'I05_lesson_slot']:
+        sheets[name] = courses[0][name]
+    # 名前も部をまたいで一意にする
+    sheets['I03_student_list']['student_name'] = [f'生徒{i}' for i in sheets['I03_student_list']['id']]
+    sheets['I04_teacher_list']['teacher_name'] = [f'講師{i}' for i in sheets['I04_teacher_list']['id']]
+    return {name: sheets[name] for name in courses[0]}
+
+
+def constraint_frame(activated=None, values=None):
+    """
+    Build the constraint sheet.
+
+    Args:
+        activated: {code: bool}; codes not given are ON
+        values: {code: value} overriding CONSTRAINT_VALUES
+
+    Returns:
+        DataFrame with the columns of sample_sheet/constraint.csv
+    """
+    activated = activated or {}
+    values = dict(CONSTRAINT_VALUES, **(values or {}))
+    return pd.DataFrame([
+        {'code': code, 'description': description,
+         'activated': 'TRUE' if activated.get(code, True) else 'FALSE',
+         'value': values.get(code, '')}
+        for code, description in CONSTRAINT_CODES.items()
+    ])
+
+
+def write_instance(sheets, out_dir, constraints=None):
+    """
+    Write a generated campus as a CSV directory in the sample_sheet layout.
+
+    Args:
+        sheets: output of generate_instance / generate_multi_course
+        out_dir: directory to create / overwrite
+        constraints: constraint sheet DataFrame (default: constraint_frame())
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    for name, df in sheets.items():
+        df.to_csv(os.path.join(out_dir, f'{name}.csv'), index=False, encoding='utf-8')
+    if constraints is None:
+        constraints = constraint_frame()
+    constraints.to_csv(os.path.join(out_dir, f"{SHEET_NAMES['constraints']}.csv"), index=False, encoding='utf-8')
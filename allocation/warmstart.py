@@ -0,0 +1,101 @@
+"""
+Warm start (初期解) for the allocation model.
+
+An incumbent schedule - the previous run's O01 rows used as a hint instead
+of being fixed, or a solution file saved by an earlier run - is mapped onto
+the model's x variables and passed to the engine as a MIP start (SCIP) or
+solution hint (CP-SAT). Before the real solve the incumbent is evaluated
+with its x values fixed, so the log can show whether it is feasible under
+today's constraints and how far the final objective moved from it.
+"""
+
+import os
+
+import pandas as pd
+
+from allocation.engines import is_solution_status
+from allocation.inputs import read_csv_sheet
+
+HINT_COLUMNS = ['slot_id', 'student_id', 'teacher_id', 'subject_id']
+
+
+def load_solution_file(path):
+    """Read a solution file (O01 layout CSV); empty DataFrame when it does not exist."""
+    if not path or not os.path.exists(path):
+        return pd.DataFrame(columns=HINT_COLUMNS)
+    return read_csv_sheet(path)
+
+
+def save_solution_file(path, df_final):
+    """Save the schedule (O01 layout) so the next run can use it as a hint."""
+    if not path:
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    df_final.to_csv(path, index=False, encoding='utf-8')
+
+
+def hint_keys(df_hint):
+    """Set of (sid, cid, tid, slid) allocated in a hint DataFrame."""
+    if df_hint is None or df_hint.empty or not set(HINT_COLUMNS) <= set(df_hint.columns):
+        return set()
+    cols = df_hint[HINT_COLUMNS].apply(pd.to_numeric, errors='coerce').dropna().astype('int64')
+    return set(zip(cols['student_id'], cols['subject_id'], cols['teacher_id'], cols['slot_id']))
+
+
+def apply_hint(model, df_hint, eval_time_limit=10):
+    """
+    Evaluate the incumbent and pass it to the engine as a hint.
+
+    Every x variable is hinted (1 for hinted allocations, 0 otherwise).
+    Allocations that are no longer candidates (availability changed, slot
+    already fixed, ...) are dropped. When the incumbent is feasible, the
+    solution of the evaluation (every variable, auxiliaries included) is
+    the hint, so the engine starts from it and the final objective is at
+    least the incumbent's; otherwise the x values are hinted for repair.
+
+    Returns:
+        dict with 'hinted' (allocations mapped onto x), 'dropped',
+        'status' / 'objective' of the incumbent with x fixed, and 'accepted'
+        (the incumbent is feasible and was passed as a complete start).
+    """
+    engine = model['engine']
+    x = model['x']
+    keys = hint_keys(df_hint)
+    # x を1回だけ走査してヒントの組を探す（候補ごとのキー辞書は作らない）
+    pairs = [(var, 1 if key in keys else 0) for key, var in x.items()]
+    hinted = sum(value for _, value in pairs)
+    status, objective = engine.evaluate(pairs, eval_time_limit)
+    if is_solution_status(status):
+        # 補助変数（ソフト制約・制約5）も含めた評価解全体をヒントにする。
+        # x だけでは CP-SAT が初期解として使わず、最終結果が初期解より悪くなることがある
+        engine.set_hint(engine.solution_pairs(), repair=False)
+    else:
+        engine.set_hint(pairs)
+
+    info = {
+        'hinted': hinted,
+        'dropped': len(keys) - hinted,
+        'status': status,
+        'objective': objective,
+        'accepted': is_solution_status(status),
+    }
+
+    print(f"  💡 初期解: {info['hinted']} コマをヒントとして設定"
+          + (f"（候補外のため {info['dropped']} コマを除外）" if info['dropped'] else ""))
+    if info['accepted']:
+        print(f"     → 実行可能な初期解として採用されました（目的関数値 {objective:.2f}）")
+    else:
+        print(f"     → 現在の制約では実行不能な初期解です（{status}）。ソルバーが修復を試みます")
+    return info
+
+
+def print_hint_result(info, engine, final=None):
+    """Log how far the final objective moved from the incumbent (final: objective when not the engine's)."""
+    if info is None:
+        return
+    final = engine.objective_value() if final is None else final
+    if info['objective'] is None:
+        print(f"  💡 初期解は実行不能でした。最終目的関数値: {final:.2f}")
+    else:
+        print(f"  💡 初期解 {info['objective']:.2f} → 最終 {final:.2f} "
+              f"(差 {final - info['objective']:+.2f})")
@@ -3,12 +3,51 @@
 # ==========================================
 !pip install ortools gspread pandas --quiet
 
+# 最適化エンジン（allocation パッケージ）の取得
+# 既定ブランチの最新ではなく、このノートブックと同じ版のコミットに固定しています。
+# ノートブックを更新したら ENGINE_REF も合わせて更新してください。
+ENGINE_REPO = 'https://github.com/noritaketakamichi/manabie_auto_allocation_test.git'
+ENGINE_REF = '2247d448546af723b4ede8e188f92f80823dc52e'
+ENGINE_DIR = '/content/autoScheduling'
+
+import os
+import subprocess
+import sys
+
+
+def _engine_git(*args):
+    proc = subprocess.run(['git', '-C', ENGINE_DIR, *args], capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"最適化エンジンの取得に失敗しました（git {' '.join(args)}）:\n{proc.stderr.strip()}")
+
+
+if not os.path.isdir(os.path.join(ENGINE_DIR, '.git')):
+    os.makedirs(ENGINE_DIR, exist_ok=True)
+    _engine_git('init', '--quiet')
+    _engine_git('remote', 'add', 'origin', ENGINE_REPO)
+_engine_git('fetch', '--quiet', '--depth', '1', 'origin', ENGINE_REF)
+_engine_git('checkout', '--quiet', '--force', 'FETCH_HEAD')
+print(f"✅ 最適化エンジン: {ENGINE_REF[:7]}")
+
+if ENGINE_DIR not in sys.path:
+    sys.path.insert(0, ENGINE_DIR)
+
 import gspread
 import pandas as pd
 from google.colab import auth
 from google.auth import default
 from ortools.linear_solver import pywraplp
 import collections
+import time
+from allocation import (
+    ALLOCATED_SHEET, DAILY_UTILIZATION_SHEET, FULFILLMENT_SHEET, RUN_RECORD_SHEET, SCENARIO_SHEET, SHEET_NAMES,
+    SOURCE_LABELS, STATUS_LABELS, TEACHER_UTILIZATION_SHEET, UNALLOCATED_SHEET, RunRecord, apply_hint,
+    build_model, build_outputs, fulfillment_summary, is_solution_status, keep_revision, load_inputs,
+    load_inputs_cached, load_sheets, load_solution_file, make_engine, normalize_inputs, parse_constraint_flags,
+    prepare_data, print_cache_report, print_hint_result, print_infeasible_report, print_input_report,
+    print_result, print_utilization, run_allocation, save_solution_file, solve_decomposed, solve_rolling,
+    split_existing,
+)
 
 # 認証処理
 print("認証を開始します...")
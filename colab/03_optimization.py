@@ -2,644 +2,127 @@
 # 3. 最適化計算の実行 (追記配置対応 + 制約条件)
 # ==========================================
 
+# ▼▼▼ ソルバー設定 ▼▼▼
+SOLVER_ENGINE = 'SCIP'   # 'SCIP' または 'CP-SAT'
+TIME_LIMIT_SEC = 30      # 計算の制限時間（秒, ROLLING_HORIZON では1週ごと）
+NUM_WORKERS = 8          # CP-SAT の並列探索ワーカー数（SCIP は1コアのみ）
+EXISTING_MODE = 'fix'    # 'fix': 既存配置を固定して追記 / 'hint': 既存配置を初期解にして全体を再最適化
+HINT_FILE = None         # 前回保存した解ファイル（CSV）を初期解として使う場合のパス
+SAVE_SOLUTION_FILE = '/content/last_solution.csv'  # 計算結果の保存先（次回の HINT_FILE に指定可）
+DECOMPOSE = False        # True: 講師を共有しない生徒・講師グループに分割して並列計算（初期解は使わない）
+DECOMPOSE_PROCESSES = None  # 分割・近傍探索（LNS）・シナリオ比較のプロセス数（None = CPU コア数）
+ROLLING_HORIZON = False  # True: 期間を1週間ずつ（先読み付きで）計算して確定していく（長期の通常期向け）
+LOOKAHEAD_WEEKS = 1      # ローリング計算で先読みする週数
+ROLLING_COMPARE = False  # True: 比較のため一括計算も実行し、計算時間・ピークメモリを表示
+ELASTIC_DIAGNOSIS = True  # INFEASIBLE のとき、制約違反を最小化するモデルをもう1回解いて原因の行（講師・生徒・日付）を表示
+ANYTIME_SNAPSHOT = None  # 例 '/content/anytime': 解が改善するたびに最良解を <パス>_O01.csv / _O03.csv / _progress.csv に保存（途中で停止しても最良解が残る。SCIP は時間枠に分けて解き直す）
+GAP_LIMIT_PERCENT = None  # 最適性ギャップがこの値（%）以下になったら計算を打ち切る（None: 制限時間まで / 最適解まで）
+LEXICOGRAPHIC = False    # True: ①配置数だけを最大化 → ②配置数を保ったままソフト制約（科目分散・連続配置）を最適化、の2段階で計算
+PHASE2_TIME_LIMIT_SEC = None  # 2段階目（ソフト制約）の制限時間（秒, None: TIME_LIMIT_SEC と同じ）
+SYMMETRY_BREAKING = False  # True: 条件が全く同じ講師・生徒を検出し、新規コマ数の順に並べる制約を追加（初期解を使う場合は無効）
+PREVIEW_ONLY = False     # True: 最適化せず、配置数の上限（最大フロー）と貪欲法の配置だけを1秒程度で表示（シートには書き込まず、SAVE_SOLUTION_FILE に仮の O01 を保存）
+LNS = False              # True: 全体モデルの解を、日付・講師・科目ごとの小さなモデルを並列に解き直して制限時間まで改善（大規模校向け。初期解は使わない）
+MODEL_CACHE_DIR = '/content/model_cache'  # 作成したモデルと計算結果の保存先（入力・設定が同じ再実行はモデル作成・計算を省略、None で無効）
+MODEL_CACHE_MAX_MB = 500  # MODEL_CACHE_DIR の上限（MB、超えると最後に使ったのが古いものから削除）
+SCENARIOS = None         # 例 {'max_lesson_per_timeslot': [3, 4], 'max_teacher_continuous_vacant_slot': [True, False]}: 制約シートの値・on/off の組み合わせごとに並列で計算し、比較表だけを O07 シートに書き込む（配置は保存しない）
+RUN_RECORD_FILE = '/content/run_record'  # 実行記録（工程別の時間・メモリ・ソルバー統計）の保存先（.json / .csv、None で保存しない）
+# ▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲
+
 print("--- 🧠 最適化計算を開始します ---")
 
+# 実行記録: 工程ごとの時間・ピークメモリ・追加された変数/制約数とソルバー統計（O04 シートにも保存）
+record = RunRecord().start()
+record.meta = {'engine': SOLVER_ENGINE, 'time_limit': TIME_LIMIT_SEC, 'num_workers': NUM_WORKERS,
+               'existing_mode': EXISTING_MODE, 'decompose': DECOMPOSE, 'rolling_horizon': ROLLING_HORIZON}
+
 try:
     # --------------------------------------------------
     # 0. 既存配置データの読み込みとモード判定
     # --------------------------------------------------
-    try:
-        ws_allocated = wb.worksheet('O01_output_allocated_lessons')
-        existing_data = ws_allocated.get_all_records()
-        df_existing = pd.DataFrame(existing_data)
-
-        if not df_existing.empty and 'slot_id' in df_existing.columns:
-            print(f"ℹ️ 既存の配置データが見つかりました ({len(df_existing)} 件)。")
-            print("   これらを【固定】して、残りの授業を配置します。")
-            use_existing = True
-        else:
-            print("ℹ️ 既存の配置データはありません。新規に配置します。")
-            use_existing = False
-            df_existing = pd.DataFrame()
-    except gspread.WorksheetNotFound:
+    df_existing = load_sheets(wb, [ALLOCATED_SHEET]).get(ALLOCATED_SHEET)
+    if df_existing is None:
         print("ℹ️ O01_output_allocated_lessons シートが見つかりません。新規に配置します。")
-        use_existing = False
         df_existing = pd.DataFrame()
-
-    # --------------------------------------------------
-    # 1. 前処理
-    # --------------------------------------------------
-    slot_map = {row['id']: f"{row['date']} ({tr_map.get(row['time_range_id'], row['time_range_id'])})" for _, row in df_slots.iterrows()}
-
-    # 指導可能辞書
-    teachable_dict = collections.defaultdict(set)
-    for _, row in df_teachable.iterrows():
-        teachable_dict[row['teacher_id']].add(row['subject_id'])
-
-    # 空き状況セット (Base Availability)
-    student_avail_set = collections.defaultdict(set)
-    for _, row in df_s_avail.iterrows():
-        student_avail_set[row['student_id']].add(row['slot_id'])
-
-    teacher_avail_set = collections.defaultdict(set)
-    for _, row in df_t_avail.iterrows():
-        teacher_avail_set[row['teacher_id']].add(row['slot_id'])
-
-    # スロットのヘルパー構造
-    slot_to_date = dict(zip(df_slots['id'], df_slots['date']))
-    slot_to_tr = dict(zip(df_slots['id'], df_slots['time_range_id']))
-
-    # 日付ごとのスロット一覧 (time_range_id昇順)
-    slots_by_date = collections.defaultdict(list)
-    for _, row in df_slots.iterrows():
-        slots_by_date[row['date']].append((row['time_range_id'], row['id']))
-    for date in slots_by_date:
-        slots_by_date[date].sort()
-
-    # --------------------------------------------------
-    # 2. 既存配置によるリソース消費の反映
-    # --------------------------------------------------
-    student_busy_slots = collections.defaultdict(set)
-    teacher_busy_slots = collections.defaultdict(set)
-
-    existing_counts = collections.defaultdict(int)
-    existing_teacher_counts = collections.defaultdict(int)
-    existing_slot_counts = collections.defaultdict(int)
-    existing_student_subject_date_counts = collections.defaultdict(int)
-
-    if use_existing:
-        for _, row in df_existing.iterrows():
-            sid = row['student_id']
-            tid = row['teacher_id']
-            cid = row['subject_id']
-            slid = row['slot_id']
-
-            student_busy_slots[sid].add(slid)
-            teacher_busy_slots[tid].add(slid)
-
-            existing_counts[(sid, cid)] += 1
-            existing_teacher_counts[(sid, cid, tid)] += 1
-            existing_slot_counts[slid] += 1
-            existing_student_subject_date_counts[(sid, cid, slot_to_date[slid])] += 1
-
-    # --------------------------------------------------
-    # 3. リクエスト情報の構築 (残りコマ数の計算)
-    # --------------------------------------------------
-    all_slots = df_slots['id'].tolist()
-    all_teachers = df_teachers['id'].tolist()
-
-    requests = []
-    limit_constraints = {}
-    student_subject_daily_limit = {}
-
-    for _, row in df_reqs.iterrows():
-        sid = int(row['student_id']) if pd.notna(row['student_id']) else 0
-        cid = int(row['subject_id']) if pd.notna(row['subject_id']) else 0
-        total_sessions = int(row['sessions']) if pd.notna(row['sessions']) else 0
-
-        already_assigned = existing_counts[(sid, cid)]
-        remaining_sessions = total_sessions - already_assigned
-
-        if remaining_sessions <= 0:
-            continue
-
-        # 科目ごとの1日受講コマ数上限
-        mdss_col = 'max_daily_subject_slot'
-        if mdss_col in row and pd.notna(row[mdss_col]) and row[mdss_col] != '':
-            mdss_val = int(row[mdss_col])
-            if mdss_val > 0:
-                student_subject_daily_limit[(sid, cid)] = mdss_val
-
-        desired_teachers = []
-        for i in range(1, 4):
-            t_col = f'desired_teacher_{i}'
-            limit_col = f'max_slot_{i}'
-
-            if t_col in row and pd.notna(row[t_col]) and row[t_col] != '' and int(row[t_col]) != 0:
-                tid = int(row[t_col])
-                desired_teachers.append(tid)
-
-                if limit_col in row and pd.notna(row[limit_col]) and row[limit_col] != '' and int(row[limit_col]) != 0:
-                    raw_limit = int(row[limit_col])
-                    already_by_teacher = existing_teacher_counts[(sid, cid, tid)]
-                    remaining_limit = max(0, raw_limit - already_by_teacher)
-                    limit_constraints[(sid, cid, tid)] = remaining_limit
-                else:
-                    limit_constraints[(sid, cid, tid)] = remaining_sessions
-
-        if not desired_teachers:
-            desired_teachers = [t for t in all_teachers if cid in teachable_dict.get(t, set())]
-
-        requests.append({
-            'sid': sid,
-            'cid': cid,
-            'sessions': remaining_sessions,
-            'allowed_teachers': desired_teachers
-        })
-
-    if not requests:
-        print("🎉 全ての授業が既に配置済みです。計算を終了します。")
+    df_fixed, df_hint = split_existing(df_existing, EXISTING_MODE, HINT_FILE)
+    record.lap('read_existing')
+
+    # 前処理・モデル作成・計算・出力作成（allocation.runner、ヘッドレス実行と共通）
+    result = run_allocation(
+        dfs, constraint_flags, df_fixed, df_hint, SOLVER_ENGINE, TIME_LIMIT_SEC, NUM_WORKERS,
+        decompose=DECOMPOSE, decompose_processes=DECOMPOSE_PROCESSES, rolling=ROLLING_HORIZON,
+        lookahead_weeks=LOOKAHEAD_WEEKS, rolling_compare=ROLLING_COMPARE, elastic=ELASTIC_DIAGNOSIS,
+        snapshot=ANYTIME_SNAPSHOT,
+        gap_limit=GAP_LIMIT_PERCENT / 100 if GAP_LIMIT_PERCENT is not None else None,
+        lexicographic=LEXICOGRAPHIC, phase2_time_limit=PHASE2_TIME_LIMIT_SEC,
+        symmetry=SYMMETRY_BREAKING, preview=PREVIEW_ONLY, lns=LNS, scenarios=SCENARIOS,
+        model_cache_dir=MODEL_CACHE_DIR, model_cache_max_mb=MODEL_CACHE_MAX_MB,
+        record=record,
+    )
+    if result is None:
         raise Exception("新規に配置すべき授業がありませんでした。")
+    status, data, model, engine = result['status'], result['data'], result['model'], result['engine']
+    x = model['x'] if model is not None else None
 
-    # --------------------------------------------------
-    # 4. 最適化モデル作成
-    # --------------------------------------------------
-    solver = pywraplp.Solver.CreateSolver('SCIP')
-    solver.SetTimeLimit(30000)
-
-    x = {}
-    print(f"  残り {len(requests)} 件のリクエストについて変数を生成中...")
-
-    for req in requests:
-        sid, cid = req['sid'], req['cid']
-
-        candidate_teachers = [t for t in req['allowed_teachers'] if cid in teachable_dict.get(t, set())]
-
-        for tid in candidate_teachers:
-            base_avail = student_avail_set[sid].intersection(teacher_avail_set[tid])
-
-            real_avail = []
-            for slid in base_avail:
-                if (slid not in student_busy_slots[sid]) and (slid not in teacher_busy_slots[tid]):
-                    real_avail.append(slid)
-
-            limit = limit_constraints.get((sid, cid, tid), 999)
-            if limit <= 0:
-                continue
-
-            for slid in real_avail:
-                x[(sid, cid, tid, slid)] = solver.IntVar(0, 1, f'x_{sid}_{cid}_{tid}_{slid}')
-
-    print(f"  -> 生成された変数数: {len(x)}")
-
-    # --- インデックス辞書の構築（制約生成の高速化） ---
-    x_by_student_subject = collections.defaultdict(list)
-    x_by_student_subject_teacher = collections.defaultdict(list)
-    x_by_student_slot = collections.defaultdict(list)
-    x_by_teacher_slot = collections.defaultdict(list)
-    x_by_slot = collections.defaultdict(list)
-    x_by_student_subject_date = collections.defaultdict(list)
-
-    for (sid, cid, tid, slid), var in x.items():
-        x_by_student_subject[(sid, cid)].append(var)
-        x_by_student_subject_teacher[(sid, cid, tid)].append(var)
-        x_by_student_slot[(sid, slid)].append(var)
-        x_by_teacher_slot[(tid, slid)].append(var)
-        x_by_slot[slid].append(var)
-        x_by_student_subject_date[(sid, cid, slot_to_date[slid])].append(var)
-
-    print(f"  -> インデックス構築完了")
-
-    # ==============================================
-    # 制約条件
-    # ==============================================
-    constraint_count = 0
-
-    # --- 基本制約: 残りコマ数上限（合計） ---
-    for req in requests:
-        sid, cid, sessions = req['sid'], req['cid'], req['sessions']
-        relevant_vars = x_by_student_subject.get((sid, cid), [])
-        if relevant_vars:
-            solver.Add(solver.Sum(relevant_vars) <= sessions)
-            constraint_count += 1
-
-    # --- 基本制約: 講師ごとの残りコマ数上限 ---
-    for (sid, cid, tid), limit in limit_constraints.items():
-        relevant_vars = x_by_student_subject_teacher.get((sid, cid, tid), [])
-        if relevant_vars:
-            solver.Add(solver.Sum(relevant_vars) <= limit)
-            constraint_count += 1
-
-    # --- 基本制約: 同時受講禁止（生徒は同一スロットに1つまで） ---
-    for (sid, slid), vars_s in x_by_student_slot.items():
-        if vars_s:
-            solver.Add(solver.Sum(vars_s) <= 1)
-            constraint_count += 1
+    if result['outputs'] is not None:
+        df_final, df_new, df_un, df_fulfill = result['outputs']
+        print_result(result['outputs'], show=display)
+        df_teacher_util, df_daily_util = result['utilization']
+        print_utilization(result['utilization'], show=display)
 
-    # --- 基本制約: 同時指導禁止（講師は同一スロットに1つまで） ---
-    for (tid, slid), vars_t in x_by_teacher_slot.items():
-        if vars_t:
-            solver.Add(solver.Sum(vars_t) <= 1)
-            constraint_count += 1
+        # 次回の初期解として保存
+        if SAVE_SOLUTION_FILE:
+            save_solution_file(SAVE_SOLUTION_FILE, df_final)
+            print(f"\n💾 解ファイルを保存しました: {SAVE_SOLUTION_FILE}")
 
-    print(f"  基本制約: {constraint_count} 件")
-
-    # ==============================================
-    # 追加制約（constraint シートで ON/OFF 制御）
-    # すべてハード制約。配置数は目的関数で最大化する。
-    # ==============================================
-    extra_count = 0
-
-    # 個人別設定のマッピング作成
-    teacher_settings = {}
-    for _, row in df_teachers.iterrows():
-        teacher_settings[row['id']] = row.to_dict()
-
-    student_settings = {}
-    for _, row in df_students.iterrows():
-        student_settings[row['id']] = row.to_dict()
-
-    # --- 制約1: 講師の1日あたりの授業数上限（講師ごと） ---
-    c1 = constraint_flags.get('max_teacher_daily_slot', {})
-    if c1.get('activated'):
-        for tid in t_map.keys():
-            t_setting = teacher_settings.get(tid, {})
-            val_raw = t_setting.get('max_daily_slot', '')
-            if val_raw == '' or pd.isna(val_raw):
-                continue
-            val = int(val_raw)
-            for date, tr_slots in slots_by_date.items():
-                date_slot_ids = set(sl for _, sl in tr_slots)
-                existing_count = sum(1 for sl in date_slot_ids if sl in teacher_busy_slots[tid])
-                remaining = max(0, val - existing_count)
-                vars_td = [v for slid in date_slot_ids for v in x_by_teacher_slot.get((tid, slid), [])]
-                if vars_td:
-                    solver.Add(solver.Sum(vars_td) <= remaining)
-                    extra_count += 1
-        print(f"  制約1 ON: 講師1日上限（個人別） (+{extra_count}件)")
-
-    # --- 制約2: 生徒の連続コマ上限（生徒ごと） ---
-    c2 = constraint_flags.get('max_student_continuous_slot', {})
-    if c2.get('activated'):
-        before = extra_count
-        for sid in s_map.keys():
-            s_setting = student_settings.get(sid, {})
-            val_raw = s_setting.get('max_continuous_slot', '')
-            if val_raw == '' or pd.isna(val_raw):
-                continue
-            val = int(val_raw)
-            window_size = val + 1
-            for date, tr_slots in slots_by_date.items():
-                if len(tr_slots) < window_size:
-                    continue
-                for start in range(len(tr_slots) - window_size + 1):
-                    window = tr_slots[start:start + window_size]
-                    window_slot_ids = [sl for _, sl in window]
-                    existing_in_window = sum(1 for sl in window_slot_ids if sl in student_busy_slots[sid])
-                    remaining = max(0, val - existing_in_window)
-                    vars_w = [v for slid in window_slot_ids for v in x_by_student_slot.get((sid, slid), [])]
-                    if vars_w:
-                        solver.Add(solver.Sum(vars_w) <= remaining)
-                        extra_count += 1
-        print(f"  制約2 ON: 生徒連続上限（個人別） (+{extra_count - before}件)")
-
-    # --- 制約3: 生徒の1日あたり上限コマ数（生徒ごと） ---
-    c3 = constraint_flags.get('max_student_daily_slot', {})
-    if c3.get('activated'):
-        before = extra_count
-        for sid in s_map.keys():
-            s_setting = student_settings.get(sid, {})
-            val_raw = s_setting.get('max_daily_slot', '')
-            if val_raw == '' or pd.isna(val_raw):
-                continue
-            val = int(val_raw)
-            for date, tr_slots in slots_by_date.items():
-                date_slot_ids = set(sl for _, sl in tr_slots)
-                existing_count = sum(1 for sl in date_slot_ids if sl in student_busy_slots[sid])
-                remaining = max(0, val - existing_count)
-                vars_sd = [v for slid in date_slot_ids for v in x_by_student_slot.get((sid, slid), [])]
-                if vars_sd:
-                    solver.Add(solver.Sum(vars_sd) <= remaining)
-                    extra_count += 1
-        print(f"  制約3 ON: 生徒1日上限（個人別） (+{extra_count - before}件)")
-
-    # --- 制約4: 同一時限の上限コマ数（ブース上限） ---
-    c4 = constraint_flags.get('max_lesson_per_timeslot', {})
-    if c4.get('activated'):
-        val = c4['value']
-        before = extra_count
-        for slid in all_slots:
-            existing_count = existing_slot_counts[slid]
-            remaining = max(0, val - existing_count)
-            vars_slot = x_by_slot.get(slid, [])
-            if vars_slot:
-                solver.Add(solver.Sum(vars_slot) <= remaining)
-                extra_count += 1
-        print(f"  制約4 ON: 同一時限上限 {val}コマ (+{extra_count - before}件)")
-
-    # --- 制約5: 講師の空きコマ上限数（講師ごと） ---
-    c5 = constraint_flags.get('max_teacher_continuous_vacant_slot', {})
-    if c5.get('activated'):
-        before = extra_count
-        c5_warnings = []
-        for tid in t_map.keys():
-            t_setting = teacher_settings.get(tid, {})
-            val_raw = t_setting.get('max_continuous_vacant_slot', '')
-            if val_raw == '' or pd.isna(val_raw):
-                continue
-            val = int(val_raw)
-            for date, tr_slots in slots_by_date.items():
-                n = len(tr_slots)
-                for i in range(n):
-                    for j in range(i + 1, n):
-                        gap = j - i - 1
-                        if gap <= val:
-                            continue
-
-                        slot_a = tr_slots[i][1]
-                        slot_b = tr_slots[j][1]
-                        intermediate_slots = [tr_slots[k][1] for k in range(i + 1, j)]
-                        needed = gap - val
-
-                        vars_a = x_by_teacher_slot.get((tid, slot_a), [])
-                        vars_b = x_by_teacher_slot.get((tid, slot_b), [])
-                        vars_inter = [v for slid in intermediate_slots for v in x_by_teacher_slot.get((tid, slid), [])]
-
-                        has_a = 1 if slot_a in teacher_busy_slots[tid] else 0
-                        has_b = 1 if slot_b in teacher_busy_slots[tid] else 0
-                        existing_inter = sum(1 for sl in intermediate_slots if sl in teacher_busy_slots[tid])
-
-                        if has_a and has_b:
-                            # 両端が既存配置（固定）の場合
-                            remaining_needed = needed - existing_inter
-                            if remaining_needed <= 0:
-                                pass  # 既存配置で充足済み
-                            elif vars_inter:
-                                solver.Add(solver.Sum(vars_inter) >= remaining_needed)
-                                extra_count += 1
-                            else:
-                                # 埋められるスロットがない → 制約追加をスキップ（既存データの問題）
-                                c5_warnings.append(
-                                    f"{t_map.get(tid)} {date}: 既存配置間の空きコマ({gap}コマ)が上限({val})を超えていますが、埋められる候補がありません"
-                                )
-                        elif has_a and vars_b:
-                            solver.Add(solver.Sum(vars_inter) + existing_inter >= needed * solver.Sum(vars_b))
-                            extra_count += 1
-                        elif has_b and vars_a:
-                            solver.Add(solver.Sum(vars_inter) + existing_inter >= needed * solver.Sum(vars_a))
-                            extra_count += 1
-                        elif vars_a and vars_b:
-                            solver.Add(
-                                solver.Sum(vars_inter) + existing_inter >=
-                                needed * (solver.Sum(vars_a) + solver.Sum(vars_b) - 1)
-                            )
-                            extra_count += 1
-
-        print(f"  制約5 ON: 講師空きコマ上限（個人別） (+{extra_count - before}件)")
-        for w in c5_warnings:
-            print(f"    ⚠️ {w}")
-
-    # --- 制約6: 生徒の科目ごとの1日受講コマ数上限（I07のmax_daily_subject_slot） ---
-    c6 = constraint_flags.get('max_student_subject_daily_slot', {})
-    if c6.get('activated'):
-        before = extra_count
-        for (sid, cid, date), vars_list in x_by_student_subject_date.items():
-            limit = student_subject_daily_limit.get((sid, cid))
-            if limit is None:
-                continue
-            existing_count = existing_student_subject_date_counts[(sid, cid, date)]
-            remaining = max(0, limit - existing_count)
-            if vars_list:
-                solver.Add(solver.Sum(vars_list) <= remaining)
-                extra_count += 1
-        print(f"  制約6 ON: 生徒科目別1日上限（個人別） (+{extra_count - before}件)")
-
-    print(f"  制約合計: {constraint_count + extra_count} 件")
-
-    # ==============================================
-    # ソフト制約（目的関数へのペナルティ/ボーナス）
-    # 重み < 1.0 なので配置数は絶対に減らない
-    # ==============================================
-    soft_vars = []  # [(var, coefficient), ...]
-
-    # --- ソフト制約1: 科目分散（同じ科目は同じ日に固まらないほうがよい） ---
-    cs1 = constraint_flags.get('soft_spread_subject_across_days', {})
-    if cs1.get('activated') and cs1.get('value') is not None:
-        w1 = cs1['value']
-        soft1_count = 0
-        for (sid, cid, date), vars_list in x_by_student_subject_date.items():
-            if not vars_list:
-                continue
-            existing_count = existing_student_subject_date_counts[(sid, cid, date)]
-            total_in_day = len(vars_list) + existing_count
-            if total_in_day <= 1:
-                continue  # 最大でも1コマなのでペナルティ不要
-            excess = solver.NumVar(0, solver.infinity(), f'spread_{sid}_{cid}_{date}')
-            solver.Add(excess >= solver.Sum(vars_list) + existing_count - 1)
-            soft_vars.append((excess, -w1))
-            soft1_count += 1
-        print(f"  ソフト制約1 ON: 科目分散 weight={w1} (+{soft1_count}個の補助変数)")
-
-    # --- ソフト制約2: 連続配置ボーナス（生徒のコマはなるべく連続） ---
-    cs2 = constraint_flags.get('soft_student_consecutive_slots', {})
-    if cs2.get('activated') and cs2.get('value') is not None:
-        w2 = cs2['value']
-        soft2_count = 0
-        for sid in s_map.keys():
-            for date, tr_slots in slots_by_date.items():
-                for idx in range(len(tr_slots) - 1):
-                    slot_i = tr_slots[idx][1]
-                    slot_j = tr_slots[idx + 1][1]
-
-                    has_i_existing = slot_i in student_busy_slots[sid]
-                    has_j_existing = slot_j in student_busy_slots[sid]
-                    vars_i = x_by_student_slot.get((sid, slot_i), [])
-                    vars_j = x_by_student_slot.get((sid, slot_j), [])
-
-                    # 両方が既存配置の場合はスキップ（定数なので最適化に影響なし）
-                    if has_i_existing and has_j_existing:
-                        continue
-                    # どちらかにも変数がない＆既存もない場合はスキップ
-                    if not has_i_existing and not vars_i:
-                        continue
-                    if not has_j_existing and not vars_j:
-                        continue
-
-                    adj = solver.NumVar(0, 1, f'adj_{sid}_{date}_{idx}')
-                    # adj <= z_i
-                    if has_i_existing:
-                        pass  # z_i = 1, adj <= 1 は変数定義で保証済み
-                    else:
-                        solver.Add(adj <= solver.Sum(vars_i))
-                    # adj <= z_j
-                    if has_j_existing:
-                        pass  # z_j = 1, adj <= 1 は変数定義で保証済み
-                    else:
-                        solver.Add(adj <= solver.Sum(vars_j))
-
-                    soft_vars.append((adj, w2))
-                    soft2_count += 1
-        print(f"  ソフト制約2 ON: 連続配置ボーナス weight={w2} (+{soft2_count}個の補助変数)")
-
-    if soft_vars:
-        print(f"  ソフト制約 補助変数合計: {len(soft_vars)} 個")
-
-    # 目的関数: 配置数を最大化 + ソフト制約
-    objective = solver.Objective()
-    for v in x.values():
-        objective.SetCoefficient(v, 1)
-    for var, coeff in soft_vars:
-        objective.SetCoefficient(var, coeff)
-    objective.SetMaximization()
-
-    # 計算実行
-    print("  計算中...")
-    status = solver.Solve()
-
-    if status in [pywraplp.Solver.OPTIMAL, pywraplp.Solver.FEASIBLE]:
-        print("  ★ 計算完了（すべてのハード制約を満たしています）。")
-        if use_existing:
-            print("  既存データとマージします。")
-
-        new_allocated = []
-        new_counts = collections.defaultdict(int)
-
-        for (sid, cid, tid, slid), v in x.items():
-            if v.solution_value() > 0.5:
-                new_allocated.append([
-                    slid, sid, tid, cid,
-                    slot_map.get(slid, str(slid)),
-                    s_map.get(sid), t_map.get(tid), c_map.get(cid)
-                ])
-                new_counts[(sid, cid)] += 1
-                student_busy_slots[sid].add(slid)
-                teacher_busy_slots[tid].add(slid)
-
-        df_new = pd.DataFrame(new_allocated, columns=['slot_id', 'student_id', 'teacher_id', 'subject_id', '日時', '生徒名', '講師名', '科目名'])
-        df_final = pd.concat([df_existing, df_new], ignore_index=True)
-        df_final = df_final.sort_values(['slot_id', 'student_id'])
-
-        # 未配置検証
-        unallocated = []
-        total_counts = collections.defaultdict(int)
-
-        for _, row in df_final.iterrows():
-            total_counts[(row['student_id'], row['subject_id'])] += 1
-
-        for _, row in df_reqs.iterrows():
-            sid, cid, total_req = row['student_id'], row['subject_id'], row['sessions']
-            current_total = total_counts[(sid, cid)]
-            diff = total_req - current_total
-
-            if diff > 0:
-                if (sid, cid) not in [(req['sid'], req['cid']) for req in requests]:
-                     msg = "要確認（データ不整合?）"
-                else:
-                     msg = "枠確保できず（制約による上限）"
-
-                unallocated.append([sid, cid, diff, s_map.get(sid), c_map.get(cid), msg])
-
-        un_columns = ['student_id', 'subject_id', '不足数', '生徒名', '科目名', '理由']
-        if unallocated:
-            df_un = pd.DataFrame(unallocated, columns=un_columns)
-        else:
-            df_un = pd.DataFrame(columns=un_columns)
-
-        # 充足率レポート作成
-        fulfillment_rows = []
-        for _, row in df_reqs.iterrows():
-            sid = row['student_id']
-            cid = row['subject_id']
-            requested = row['sessions']
-            allocated = total_counts[(sid, cid)]
-            rate = allocated / requested if requested > 0 else 0.0
-            fulfillment_rows.append([
-                sid, s_map.get(sid), cid, c_map.get(cid),
-                requested, allocated, round(rate * 100, 1)
-            ])
-
-        df_fulfill = pd.DataFrame(fulfillment_rows, columns=[
-            'student_id', '生徒名', 'subject_id', '科目名',
-            '希望コマ数', '配置コマ数', '充足率(%)'
-        ])
-        df_fulfill = df_fulfill.sort_values(['student_id', 'subject_id'])
-
-        print(f"\n✅ 最終結果: 全 {len(df_final)} コマ (うち新規 {len(df_new)} コマ)")
-        display(df_final[['日時', '生徒名', '講師名', '科目名']].tail())
-
-        if not df_un.empty:
-            print(f"⚠️ 未配置: {len(df_un)} 件（制約を満たす範囲で最大限配置しました）")
-            display(df_un)
-        else:
-            print("✅ 未配置なし: すべてのリクエストが配置されました。")
-
-        # 充足率サマリー表示
-        total_requested = df_fulfill['希望コマ数'].sum()
-        total_allocated = df_fulfill['配置コマ数'].sum()
-        overall_rate = round(total_allocated / total_requested * 100, 1) if total_requested > 0 else 0.0
-        print(f"\n📊 充足率: {total_allocated}/{total_requested} コマ ({overall_rate}%)")
-        display(df_fulfill)
-
-        # シートへの書き込み
-        import traceback
+    # シートへの書き込み
+    import traceback
 
-        def save_sheet(name, df):
-            print(f"\n  --- save_sheet('{name}') 開始 ---")
-            print(f"  DataFrame shape: {df.shape}")
+    def save_sheet(name, df):
+        print(f"\n  --- save_sheet('{name}') 開始 ---")
+        print(f"  DataFrame shape: {df.shape}")
+        try:
             try:
-                try:
-                    ws = wb.worksheet(name)
-                    print(f"  既存シート '{name}' を取得しました。")
-                except Exception as e_ws:
-                    print(f"  シート '{name}' が見つかりません。新規作成します。({e_ws})")
-                    ws = wb.add_worksheet(name, 1000, 20)
-                ws.clear()
-                print(f"  シートをクリアしました。")
-                data = [df.columns.values.tolist()] + df.values.tolist()
-                print(f"  書き込みデータ: {len(data)} 行")
-                ws.update(data)
-                print(f"  ✅ シート '{name}' に保存完了。")
-            except Exception as e:
-                print(f"  ❌ 書き込みエラー({name}): {e}")
-                traceback.print_exc()
-
-        save_sheet('O01_output_allocated_lessons', df_final)
-        save_sheet('O02_output_unallocated_lessons', df_un)
-        save_sheet('O03_output_fulfillment', df_fulfill)
-
-    else:
-        status_names = {
-            pywraplp.Solver.OPTIMAL: "OPTIMAL",
-            pywraplp.Solver.FEASIBLE: "FEASIBLE",
-            pywraplp.Solver.INFEASIBLE: "INFEASIBLE（解なし）",
-            pywraplp.Solver.UNBOUNDED: "UNBOUNDED（非有界）",
-            pywraplp.Solver.ABNORMAL: "ABNORMAL（ソルバー異常）",
-            pywraplp.Solver.NOT_SOLVED: "NOT_SOLVED（未計算）",
-        }
-        print(f"\n❌ 計算できませんでした。")
-        print(f"   ソルバーステータス: {status_names.get(status, f'不明({status})')}")
-        print(f"   変数数: {len(x)}, 制約数: {constraint_count + extra_count}")
-
-        # --- INFEASIBLE デバッグ情報 ---
-        if status == pywraplp.Solver.INFEASIBLE:
-            print(f"\n{'='*50}")
-            print("🔍 INFEASIBLE 診断レポート")
-            print(f"{'='*50}")
-
-            # リクエストごとの配置可能性チェック
-            print(f"\n📌 リクエスト別 配置可能性:")
-            for req in requests:
-                sid, cid, sessions = req['sid'], req['cid'], req['sessions']
-                relevant_keys = [(s, c, t, sl) for (s, c, t, sl) in x.keys() if s == sid and c == cid]
-                unique_slots = set(k[3] for k in relevant_keys)
-                unique_teachers = set(k[2] for k in relevant_keys)
-                status_icon = "✅" if len(unique_slots) >= sessions else "⚠️"
-                print(f"  {status_icon} {s_map.get(sid)} x {c_map.get(cid)}: "
-                      f"希望{sessions}コマ / 候補スロット{len(unique_slots)}個 / 候補講師{len(unique_teachers)}名")
-
-            # リソース利用状況
-            print(f"\n📌 リソース利用状況:")
-            for tid in t_map.keys():
-                t_slots_set = set(slid for (t, slid) in x_by_teacher_slot.keys() if t == tid)
-                t_var_count = sum(len(v) for (t, slid), v in x_by_teacher_slot.items() if t == tid)
-                existing = len(teacher_busy_slots.get(tid, set()))
-                print(f"  講師 {t_map.get(tid)}: 候補変数{t_var_count}個 / "
-                      f"候補スロット{len(t_slots_set)}個 / 既存{existing}コマ")
-
-            # 制約影響分析
-            print(f"\n📌 有効な追加制約:")
-            for code, flags in constraint_flags.items():
-                if flags.get('activated'):
-                    print(f"  ✅ {code}")
-                else:
-                    print(f"  ⬜ {code} (無効)")
-
-            print(f"\n💡 対処法:")
-            print(f"  1. 制約条件を一部OFFにして再実行してみてください")
-            print(f"  2. 生徒・講師の空き枠を増やしてください")
-            print(f"  3. 講師の指導可能科目を確認してください")
-            print(f"  4. 制約5(空きコマ上限)が有効な場合、値を緩めてみてください")
-            print(f"{'='*50}")
+                ws = wb.worksheet(name)
+                print(f"  既存シート '{name}' を取得しました。")
+            except Exception as e_ws:
+                print(f"  シート '{name}' が見つかりません。新規作成します。({e_ws})")
+                ws = wb.add_worksheet(name, 1000, 20)
+            ws.clear()
+            print(f"  シートをクリアしました。")
+            values = [df.columns.values.tolist()] + df.values.tolist()
+            print(f"  書き込みデータ: {len(values)} 行")
+            ws.update(values)
+            print(f"  ✅ シート '{name}' に保存完了。")
+        except Exception as e:
+            print(f"  ❌ 書き込みエラー({name}): {e}")
+            traceback.print_exc()
+
+    if PREVIEW_ONLY and result['outputs'] is not None:
+        # プレビューの配置で O01 シート（次回の既存配置）を上書きしない
+        hint_note = "HINT_FILE に指定できます" if result['preview']['feasible'] else "制約5 を満たさないため、HINT_FILE に指定するとソルバーが修復します"
+        print(f"\nℹ️ プレビューのため、シートには書き込みません（仮の配置は SAVE_SOLUTION_FILE に保存され、{hint_note}）。")
+    elif result['outputs'] is not None:
+        # 出力シートへの書き込みで入力キャッシュが無効にならないようにする
+        with keep_revision(wb, INPUT_CACHE_DIR):
+            save_sheet(ALLOCATED_SHEET, df_final)
+            save_sheet(UNALLOCATED_SHEET, df_un)
+            save_sheet(FULFILLMENT_SHEET, df_fulfill)
+            save_sheet(TEACHER_UTILIZATION_SHEET, df_teacher_util)
+            save_sheet(DAILY_UTILIZATION_SHEET, df_daily_util)
+            record.lap('save_sheets')
+            save_sheet(RUN_RECORD_SHEET, record.to_frame().astype(object).fillna(''))
+    elif result['scenarios'] is not None:
+        # シナリオ比較は比較表だけを書き込む（O01 などはそのまま）
+        with keep_revision(wb, INPUT_CACHE_DIR):
+            save_sheet(SCENARIO_SHEET, result['scenarios'].astype(object).fillna(''))
+
+    # 実行記録の表示と保存（計算できなかった場合も残す）
+    record.stop()
+    print()
+    record.print_summary()
+    if RUN_RECORD_FILE:
+        json_path, csv_path = record.save(RUN_RECORD_FILE)
+        print(f"💾 実行記録を保存しました: {json_path}, {csv_path}")
 
 except Exception as e:
     import traceback
@@ -0,0 +1,100 @@
+#!/usr/local/bin/python3.11
+"""
+Benchmark: constraint 5 (max_teacher_continuous_vacant_slot) encodings.
+
+Builds the model with the pairwise encoding (default) and with the span
+(first/last-lesson) encoding on synthetic campuses, and reports rows /
+auxiliary variables, build time, solve time, status and objective for each. With
+--with-existing, part of a first solution is fixed as existing O01
+allocations to exercise the 追記配置 paths.
+
+Usage:
+    python3.11 scripts/bench_c5.py [--engine SCIP] [--time-limit 60] [--with-existing]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allocation import build_model, build_outputs, is_solution_status, make_engine, prepare_data  # noqa: E402
+from allocation.inputs import SHEET_NAMES, normalize_inputs  # noqa: E402
+from allocation.synthetic import generate_instance  # noqa: E402
+
+C5_ONLY = {'max_teacher_continuous_vacant_slot': {'activated': True, 'value': None}}
+ALL_HARD = dict(C5_ONLY, **{
+    code: {'activated': True, 'value': value}
+    for code, value in [('max_teacher_daily_slot', None), ('max_student_continuous_slot', None),
+                        ('max_student_daily_slot', None), ('max_lesson_per_timeslot', 6.0)]
+})
+
+
+def solve(dfs, df_existing, flags, encoding, args):
+    """Build and solve once; return (summary row, df_new or None)."""
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        data = prepare_data(dfs, df_existing)
+        engine = make_engine(args.engine, args.time_limit, args.workers)
+        t0 = time.perf_counter()
+        model = build_model(data, flags, engine, c5_encoding=encoding)
+        build_s = time.perf_counter() - t0
+        status = engine.solve()
+        df_new = build_outputs(data, model)[1] if is_solution_status(status) else None
+    c5_line = next((line for line in log.getvalue().splitlines() if '制約5' in line), '')
+    return {
+        'encoding': encoding,
+        'variables': len(model['x']),
+        'rows_total': engine.num_constraints(),
+        'c5': c5_line.split('(')[-1].rstrip(')') if c5_line else '',
+        'build_s': round(build_s, 2),
+        'solve_s': round(engine.wall_time, 2),
+        'status': status,
+        'objective': round(engine.objective_value(), 3) if df_new is not None else None,
+        'bound': round(engine.best_bound(), 3) if df_new is not None else None,
+    }, df_new
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--engine', default='SCIP')
+    parser.add_argument('--time-limit', type=float, default=60)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--all-constraints', action='store_true', help='also enable constraints 1-4')
+    parser.add_argument('--with-existing', action='store_true')
+    parser.add_argument('--density', type=float, default=0.4, help='availability density')
+    parser.add_argument('--slots-per-day', type=int, default=8)
+    args = parser.parse_args()
+
+    flags = ALL_HARD if args.all_constraints else C5_ONLY
+    # (生徒数, 講師数, 日数, 1日のコマ数)
+    spd = args.slots_per_day
+    sizes = [(20, 5, 5, spd), (60, 15, 10, spd), (120, 30, 10, spd)]
+
+    rows = []
+    for n_students, n_teachers, n_days, spd in sizes:
+        sheets = generate_instance(n_students, n_teachers, n_days, spd,
+                                   avail_density=args.density, pref_rate=0.3, seed=2)
+        dfs = normalize_inputs({key: sheets.get(name, pd.DataFrame()) for key, name in SHEET_NAMES.items()})
+        df_existing = None
+        if args.with_existing:
+            _, df_new = solve(dfs, None, flags, 'pairwise', args)
+            df_existing = df_new.iloc[::2].reset_index(drop=True)
+
+        for encoding in ['pairwise', 'span']:
+            row, _ = solve(dfs, df_existing, flags, encoding, args)
+            row = dict({'size': f'{n_students}x{n_teachers}x{n_days * spd}'}, **row)
+            rows.append(row)
+            print(row, flush=True)
+
+    print()
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/local/bin/python3.11
+"""
+Benchmark: candidate-variable generation (loop vs columnar).
+
+Compares the original nested-loop construction of x[(sid, cid, tid, slid)]
+keys in colab/03_optimization.py with allocation.candidates.build_candidates
+on synthetic campuses, up to about 10^6 candidates.
+
+Usage:
+    python3.11 scripts/bench_candidates.py [--max-students 400] [--skip-loop-above 2000000]
+"""
+
+import argparse
+import collections
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allocation.candidates import build_candidates  # noqa: E402
+from allocation.synthetic import generate_instance  # noqa: E402
+
+
+def simple_requests(inst):
+    """Request list as built in 03_optimization.py section 3 (no existing allocations)."""
+    df_teachable = inst['I06_teachable_subjects']
+    teachers_by_subject = df_teachable.groupby('subject_id')['teacher_id'].apply(list).to_dict()
+    requests = []
+    for row in inst['I07_student_subject'].to_dict('records'):
+        tid = row['desired_teacher_1']
+        allowed = [int(tid)] if tid != '' else teachers_by_subject.get(row['subject_id'], [])
+        requests.append({'sid': row['student_id'], 'cid': row['subject_id'],
+                         'sessions': row['sessions'], 'allowed_teachers': allowed})
+    return requests
+
+
+def loop_candidates(requests, df_teachable, df_s_avail, df_t_avail):
+    """Reference implementation: the original per-request / per-teacher / per-slot loop."""
+    teachable_dict = collections.defaultdict(set)
+    for t, c in zip(df_teachable['teacher_id'], df_teachable['subject_id']):
+        teachable_dict[t].add(c)
+    student_avail_set = collections.defaultdict(set)
+    for s, sl in zip(df_s_avail['student_id'], df_s_avail['slot_id']):
+        student_avail_set[s].add(sl)
+    teacher_avail_set = collections.defaultdict(set)
+    for t, sl in zip(df_t_avail['teacher_id'], df_t_avail['slot_id']):
+        teacher_avail_set[t].add(sl)
+    student_busy_slots = collections.defaultdict(set)
+    teacher_busy_slots = collections.defaultdict(set)
+
+    keys = []
+    for req in requests:
+        sid, cid = req['sid'], req['cid']
+        for tid in [t for t in req['allowed_teachers'] if cid in teachable_dict.get(t, set())]:
+            base_avail = student_avail_set[sid].intersection(teacher_avail_set[tid])
+            for slid in base_avail:
+                if slid not in student_busy_slots[sid] and slid not in teacher_busy_slots[tid]:
+                    keys.append((sid, cid, tid, slid))
+    return keys
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--max-students', type=int, default=400)
+    parser.add_argument('--skip-loop-above', type=int, default=2_000_000,
+                        help='skip the loop reference when the candidate count exceeds this')
+    args = parser.parse_args()
+
+    # (生徒数, 講師数, 日数, 1日のコマ数)
+    sizes = [(25, 5, 5, 4), (50, 10, 10, 8), (100, 20, 20, 8), (200, 40, 20, 8), (400, 80, 20, 8)]
+    sizes = [s for s in sizes if s[0] <= args.max_students]
+
+    rows = []
+    for n_students, n_teachers, n_days, spd in sizes:
+        inst = generate_instance(n_students, n_teachers, n_days, spd,
+                                 avail_density=0.5, pref_rate=0.0, seed=1)
+        requests = simple_requests(inst)
+        args_in = (requests, inst['I06_teachable_subjects'],
+                   inst['I51_student_availability'], inst['I52_teacher_availability'])
+
+        t0 = time.perf_counter()
+        cand = build_candidates(*args_in)
+        t_vec = time.perf_counter() - t0
+
+        t_loop = None
+        if len(cand) <= args.skip_loop_above:
+            t0 = time.perf_counter()
+            keys = loop_candidates(*args_in)
+            t_loop = time.perf_counter() - t0
+            assert set(keys) == set(map(tuple, cand.to_numpy().tolist())), 'candidate sets differ'
+
+        rows.append({
+            'students': n_students, 'teachers': n_teachers, 'slots': n_days * spd,
+            'candidates': len(cand),
+            'loop_s': round(t_loop, 3) if t_loop is not None else None,
+            'columnar_s': round(t_vec, 3),
+            'speedup': round(t_loop / t_vec, 1) if t_loop else None,
+        })
+        print(rows[-1], flush=True)
+
+    print()
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/local/bin/python3.11
+"""
+Benchmark: single model vs. connected-component decomposition.
+
+Generates multi-course campuses (independent groups of students, teachers
+and subjects sharing the booths of constraint 4), solves each one as a single
+model and with allocation.decompose.solve_decomposed, and reports status,
+objective, wall time and the number of components.
+
+Usage:
+    python3.11 scripts/bench_decompose.py [--engine SCIP] [--time-limit 60] [--processes 8] [--booths 6]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allocation import build_model, is_solution_status, make_engine, prepare_data  # noqa: E402
+from allocation.decompose import find_components, solve_decomposed  # noqa: E402
+from allocation.inputs import SHEET_NAMES, normalize_inputs  # noqa: E402
+from allocation.synthetic import generate_multi_course  # noqa: E402
+
+ALL_HARD = {
+    code: {'activated': True, 'value': value}
+    for code, value in [('max_teacher_daily_slot', None), ('max_student_continuous_slot', None),
+                        ('max_student_daily_slot', None), ('max_teacher_continuous_vacant_slot', None),
+                        ('max_student_subject_daily_slot', None)]
+}
+
+
+def run(dfs, flags, mode, args):
+    """Solve once in the given mode ('single' / 'decomposed'); return a summary row."""
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        data = prepare_data(dfs)
+        if mode == 'single':
+            engine = make_engine(args.engine, args.time_limit, args.workers)
+            build_model(data, flags, engine)
+            status = engine.solve()
+        else:
+            status, model = solve_decomposed(data, flags, args.engine, args.time_limit,
+                                             args.workers, args.processes)
+            engine = model['engine']
+    return {
+        'mode': mode,
+        'status': status,
+        'objective': round(engine.objective_value(), 2) if is_solution_status(status) else None,
+        'total_s': round(time.perf_counter() - t0, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--engine', default='SCIP')
+    parser.add_argument('--time-limit', type=float, default=60)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--processes', type=int, default=None, help='process pool size (default: CPU count)')
+    parser.add_argument('--booths', type=float, default=None,
+                        help='enable constraint 4 with this many booths per slot')
+    args = parser.parse_args()
+
+    flags = dict(ALL_HARD)
+    if args.booths:
+        flags['max_lesson_per_timeslot'] = {'activated': True, 'value': args.booths}
+
+    # (部の数, 1部あたりの生徒数, 講師数, 日数, 1日のコマ数)
+    sizes = [(3, 20, 5, 10, 6), (6, 30, 8, 10, 6), (10, 40, 10, 14, 6)]
+
+    rows = []
+    for n_courses, n_students, n_teachers, n_days, spd in sizes:
+        sheets = generate_multi_course(n_courses, seed=1, n_students=n_students, n_teachers=n_teachers,
+                                       n_days=n_days, slots_per_day=spd, avail_density=0.4)
+        dfs = normalize_inputs({key: sheets.get(name, pd.DataFrame()) for key, name in SHEET_NAMES.items()})
+        with contextlib.redirect_stdout(io.StringIO()):
+            n_components = len(find_components(prepare_data(dfs)))
+        for mode in ['single', 'decomposed']:
+            row = dict({'size': f'{n_courses}部x{n_students}x{n_teachers}x{n_days * spd}',
+                        'components': n_components}, **run(dfs, flags, mode, args))
+            rows.append(row)
+            print(row, flush=True)
+
+    print()
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
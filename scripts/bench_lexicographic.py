@@ -0,0 +1,97 @@
+#!/usr/local/bin/python3.11
+"""
+Benchmark: weighted single objective vs two-phase (lexicographic) solve.
+
+Builds the same model (all constraints of constraint_frame() ON, soft
+constraints S1/S2 included) on synthetic campuses and solves it once with
+the weighted objective (lessons + soft terms) and once with
+allocation.lexicographic.solve_lexicographic. Reports the time per phase,
+status, lessons and soft-term value of each, so the time spent proving
+optimality over the small soft weights can be compared.
+
+Usage:
+    python3.11 scripts/bench_lexicographic.py [--engine SCIP] [--time-limit 60]
+        [--sizes 20,5,5,8 60,15,10,8]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allocation import build_model, is_solution_status, make_engine, prepare_data  # noqa: E402
+from allocation.inputs import SHEET_NAMES, normalize_inputs, parse_constraint_flags  # noqa: E402
+from allocation.lexicographic import soft_value, solve_lexicographic  # noqa: E402
+from allocation.synthetic import constraint_frame, generate_instance  # noqa: E402
+
+
+def build(dfs, flags, args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        data = prepare_data(dfs)
+        engine = make_engine(args.engine, args.time_limit, args.workers)
+        model = build_model(data, flags, engine)
+    return model
+
+
+def run_weighted(dfs, flags, args):
+    model = build(dfs, flags, args)
+    engine = model['engine']
+    status = engine.solve()
+    row = {'mode': 'weighted', 'status': status, 'phase1_s': round(engine.wall_time, 2), 'phase2_s': None,
+           'total_s': round(engine.wall_time, 2), 'lessons': None, 'soft': None}
+    if is_solution_status(status):
+        row['lessons'] = int(round(float(engine.values(list(model['x'].values())).sum())))
+        row['soft'] = round(soft_value(engine, model['soft_vars']), 3)
+    return row
+
+
+def run_lexicographic(dfs, flags, args):
+    model = build(dfs, flags, args)
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = solve_lexicographic(model, args.phase2_time_limit)
+    seconds = result['phases']['seconds'].tolist()
+    return {
+        'mode': 'lexicographic',
+        'status': result['status'],
+        'phase1_s': round(seconds[0], 2),
+        'phase2_s': round(seconds[1], 2) if len(seconds) > 1 else None,
+        'total_s': round(sum(seconds), 2),
+        'lessons': result['lessons'],
+        'soft': round(result['soft'], 3) if result['soft'] is not None else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--engine', default='SCIP')
+    parser.add_argument('--time-limit', type=float, default=60)
+    parser.add_argument('--phase2-time-limit', type=float, help='default: --time-limit')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--sizes', nargs='+', default=['20,5,5,8', '60,15,10,8', '120,30,10,8'],
+                        help='n_students,n_teachers,n_days,slots_per_day')
+    parser.add_argument('--seed', type=int, default=2)
+    args = parser.parse_args()
+
+    flags = parse_constraint_flags(constraint_frame())
+    rows = []
+    for size in args.sizes:
+        n_students, n_teachers, n_days, spd = (int(v) for v in size.split(','))
+        sheets = generate_instance(n_students, n_teachers, n_days, spd, avail_density=0.4,
+                                   pref_rate=0.3, seed=args.seed)
+        dfs = normalize_inputs({key: sheets.get(name, pd.DataFrame()) for key, name in SHEET_NAMES.items()})
+        for run in (run_weighted, run_lexicographic):
+            row = dict({'size': f'{n_students}x{n_teachers}x{n_days * spd}'}, **run(dfs, flags, args))
+            rows.append(row)
+            print(row, flush=True)
+
+    print()
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
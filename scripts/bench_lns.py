@@ -0,0 +1,107 @@
+#!/usr/local/bin/python3.11
+"""
+Benchmark: LNS improvement (allocation.lns) vs plain SCIP on the same budget.
+
+For synthetic campuses (all constraints of constraint_frame() ON, booths
+per slot set with --booths) the full model is solved once by the engine
+alone, recording every incumbent (allocation.anytime), and once with
+solve_lns, both within --time-limit seconds including the model build. The
+table shows the best objective reached at 25/50/75/100% of the budget
+(wall-clock from the start of the build) and the final status; with
+--trajectory the objective-over-time rows of both runs are printed too.
+
+Usage:
+    python3.11 scripts/bench_lns.py [--sizes 150,30,20,6 300,60,20,6]
+        [--booths 12] [--engine SCIP] [--time-limit 120] [--processes 8]
+        [--trajectory]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allocation import build_model, is_solution_status, make_engine, prepare_data  # noqa: E402
+from allocation.anytime import solve_anytime  # noqa: E402
+from allocation.inputs import SHEET_NAMES, normalize_inputs, parse_constraint_flags  # noqa: E402
+from allocation.lns import solve_lns  # noqa: E402
+from allocation.synthetic import constraint_frame, generate_instance  # noqa: E402
+
+CHECKPOINTS = (0.25, 0.5, 0.75, 1.0)
+
+
+def run_plain(data, flags, args):
+    """Engine alone; (status, final objective, [(elapsed_s, objective), ...])."""
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine = make_engine(args.engine, args.time_limit, args.workers)
+        model = build_model(data, flags, engine)
+        build_s = time.perf_counter() - t0
+        # モデル作成を含めて同じ予算にする
+        engine.time_limit = max(args.time_limit - build_s, 1)
+        anytime = solve_anytime(data, model)
+    points = [(build_s + row['elapsed_s'], row['objective']) for row in anytime['progress'].to_dict('records')]
+    return anytime['status'], anytime['objective'], points
+
+
+def run_lns(data, flags, args):
+    """solve_lns; (status, final objective, [(elapsed_s, objective), ...])."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        status, model, progress = solve_lns(data, flags, args.engine, args.time_limit, args.workers,
+                                            args.processes)
+    objective = model['engine'].objective_value() if is_solution_status(status) else None
+    return status, objective, list(zip(progress['elapsed_s'], progress['objective']))
+
+
+def best_at(points, seconds):
+    """Best objective recorded up to the given time (None before the first one)."""
+    values = [objective for elapsed, objective in points if elapsed <= seconds]
+    return round(max(values), 2) if values else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sizes', nargs='+', default=['150,30,20,6', '300,60,20,6'],
+                        help='n_students,n_teachers,n_days,slots_per_day')
+    parser.add_argument('--booths', type=int, default=12, help='constraint 4 value (lessons per slot)')
+    parser.add_argument('--engine', default='SCIP')
+    parser.add_argument('--time-limit', type=float, default=120)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--processes', type=int, default=None, help='LNS worker processes (default: CPU count)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--trajectory', action='store_true', help='also print the objective over time')
+    args = parser.parse_args()
+
+    flags = parse_constraint_flags(constraint_frame(values={'max_lesson_per_timeslot': args.booths}))
+    rows = []
+    for size in args.sizes:
+        n_students, n_teachers, n_days, spd = (int(v) for v in size.split(','))
+        sheets = generate_instance(n_students, n_teachers, n_days, spd, avail_density=0.4,
+                                   pref_rate=0.3, seed=args.seed)
+        dfs = normalize_inputs({key: sheets.get(name, pd.DataFrame()) for key, name in SHEET_NAMES.items()})
+        for method, run in [('plain', run_plain), ('lns', run_lns)]:
+            with contextlib.redirect_stdout(io.StringIO()):
+                data = prepare_data(dfs)
+            status, objective, points = run(data, flags, args)
+            row = {'size': f'{n_students}x{n_teachers}x{n_days * spd}', 'method': method, 'status': status}
+            for share in CHECKPOINTS:
+                row[f'@{int(share * 100)}%'] = best_at(points, args.time_limit * share)
+            row['final'] = round(objective, 2) if objective is not None else None
+            rows.append(row)
+            print(row, flush=True)
+            if args.trajectory:
+                for elapsed, value in points:
+                    print(f'    {elapsed:8.1f}s  {value:.2f}')
+
+    print()
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
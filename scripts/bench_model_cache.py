@@ -0,0 +1,90 @@
+#!/usr/local/bin/python3.11
+"""
+Benchmark: model / solution cache (allocation.model_cache).
+
+For synthetic campuses (all constraints of constraint_frame() ON) the same
+run_allocation is repeated three times on one cache directory: a cold run
+(model built and stored, schedule stored), a run with a different time
+limit (model loaded from the cache, solved again) and an identical rerun
+(schedule returned from the cache). The table shows the cache results, the
+model build / load time, the total time of run_allocation, the new lessons
+and the size of the cache directory after each run.
+
+Usage:
+    python3.11 scripts/bench_model_cache.py [--sizes 120,30,10,6 300,60,10,6]
+        [--engine SCIP] [--time-limit 30]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allocation import RunRecord, run_allocation  # noqa: E402
+from allocation.inputs import SHEET_NAMES, normalize_inputs, parse_constraint_flags  # noqa: E402
+from allocation.synthetic import constraint_frame, generate_instance  # noqa: E402
+
+# モデル作成（または読み込み）に当たる工程
+MODEL_PHASES = ('model_', 'hint')
+
+
+def dir_mb(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sizes', nargs='+', default=['120,30,10,6', '300,60,10,6'],
+                        help='n_students,n_teachers,n_days,slots_per_day')
+    parser.add_argument('--engine', default='SCIP')
+    parser.add_argument('--time-limit', type=float, default=30)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    flags = parse_constraint_flags(constraint_frame())
+    rows = []
+    for size in args.sizes:
+        n_students, n_teachers, n_days, spd = (int(v) for v in size.split(','))
+        sheets = generate_instance(n_students, n_teachers, n_days, spd, avail_density=0.4,
+                                   pref_rate=0.3, seed=args.seed)
+        dfs = normalize_inputs({key: sheets.get(name, pd.DataFrame()) for key, name in SHEET_NAMES.items()})
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for run, time_limit in [('cold', args.time_limit), ('time limit changed', args.time_limit + 1),
+                                    ('identical rerun', args.time_limit + 1)]:
+                record = RunRecord().start()
+                t0 = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = run_allocation(dfs, flags, engine_name=args.engine, time_limit=time_limit,
+                                            num_workers=args.workers, elastic=False,
+                                            model_cache_dir=cache_dir, record=record)
+                total_s = time.perf_counter() - t0
+                record.stop()
+                row = {
+                    'size': f'{n_students}x{n_teachers}x{n_days * spd}',
+                    'run': run,
+                    'solution': record.cache.get('solution'),
+                    'model': record.cache.get('model', '-'),
+                    'model_s': round(sum(p['seconds'] for p in record.phases
+                                         if p['phase'].startswith(MODEL_PHASES)), 2),
+                    'total_s': round(total_s, 2),
+                    'status': result['status'],
+                    'new_lessons': len(result['outputs'][1]) if result['outputs'] is not None else None,
+                    'cache_mb': round(dir_mb(cache_dir), 2),
+                }
+                rows.append(row)
+                print(row, flush=True)
+
+    print()
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
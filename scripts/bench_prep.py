@@ -0,0 +1,219 @@
+#!/usr/local/bin/python3.11
+"""
+Benchmark: preprocessing and O02/O03 reporting (iterrows vs vectorized).
+
+Compares the original row-by-row (iterrows) construction of the prepare_data
+structures and of the unallocated / fulfillment tables with
+allocation.prep.prepare_data and allocation.report.request_report at about
+1k, 10k and 100k availability rows, with a share of the lessons given as
+existing O01 allocations, and checks that the outputs are identical.
+
+Usage:
+    python3.11 scripts/bench_prep.py [--sizes 1000 10000 100000] [--repeat 3]
+"""
+
+import argparse
+import collections
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allocation.inputs import SHEET_NAMES, normalize_inputs  # noqa: E402
+from allocation.prep import prepare_data  # noqa: E402
+from allocation.report import request_report  # noqa: E402
+from allocation.synthetic import generate_instance  # noqa: E402
+
+
+def iterrows_prepare(dfs, df_existing):
+    """Reference implementation: the original iterrows preprocessing (sections 1-3 and settings)."""
+    df_slots, df_teachers, df_students = dfs['slots'], dfs['teachers'], dfs['students']
+    tr_map = dict(zip(dfs['time_ranges']['id'], dfs['time_ranges']['description']))
+    slot_map = {row['id']: f"{row['date']} ({tr_map.get(row['time_range_id'], row['time_range_id'])})"
+                for _, row in df_slots.iterrows()}
+    teachable_dict = collections.defaultdict(set)
+    for _, row in dfs['teachable'].iterrows():
+        teachable_dict[row['teacher_id']].add(row['subject_id'])
+    student_avail_set = collections.defaultdict(set)
+    for _, row in dfs['student_avail'].iterrows():
+        student_avail_set[row['student_id']].add(row['slot_id'])
+    teacher_avail_set = collections.defaultdict(set)
+    for _, row in dfs['teacher_avail'].iterrows():
+        teacher_avail_set[row['teacher_id']].add(row['slot_id'])
+    slot_to_date = dict(zip(df_slots['id'], df_slots['date']))
+    slots_by_date = collections.defaultdict(list)
+    for _, row in df_slots.iterrows():
+        slots_by_date[row['date']].append((row['time_range_id'], row['id']))
+    for date in slots_by_date:
+        slots_by_date[date].sort()
+
+    student_busy_slots = collections.defaultdict(set)
+    teacher_busy_slots = collections.defaultdict(set)
+    existing_counts = collections.defaultdict(int)
+    existing_teacher_counts = collections.defaultdict(int)
+    existing_slot_counts = collections.defaultdict(int)
+    existing_student_subject_date_counts = collections.defaultdict(int)
+    for _, row in df_existing.iterrows():
+        sid, tid, cid, slid = row['student_id'], row['teacher_id'], row['subject_id'], row['slot_id']
+        student_busy_slots[sid].add(slid)
+        teacher_busy_slots[tid].add(slid)
+        existing_counts[(sid, cid)] += 1
+        existing_teacher_counts[(sid, cid, tid)] += 1
+        existing_slot_counts[slid] += 1
+        existing_student_subject_date_counts[(sid, cid, slot_to_date[slid])] += 1
+
+    all_teachers = df_teachers['id'].tolist()
+    requests, limit_constraints, student_subject_daily_limit = [], {}, {}
+    for _, row in dfs['student_reqs'].iterrows():
+        sid = int(row['student_id']) if pd.notna(row['student_id']) else 0
+        cid = int(row['subject_id']) if pd.notna(row['subject_id']) else 0
+        total_sessions = int(row['sessions']) if pd.notna(row['sessions']) else 0
+        remaining_sessions = total_sessions - existing_counts[(sid, cid)]
+        if remaining_sessions <= 0:
+            continue
+        mdss_col = 'max_daily_subject_slot'
+        if mdss_col in row and pd.notna(row[mdss_col]) and row[mdss_col] != '':
+            if int(row[mdss_col]) > 0:
+                student_subject_daily_limit[(sid, cid)] = int(row[mdss_col])
+        desired_teachers = []
+        for i in range(1, 4):
+            t_col, limit_col = f'desired_teacher_{i}', f'max_slot_{i}'
+            if t_col in row and pd.notna(row[t_col]) and row[t_col] != '' and int(row[t_col]) != 0:
+                tid = int(row[t_col])
+                desired_teachers.append(tid)
+                if limit_col in row and pd.notna(row[limit_col]) and row[limit_col] != '' and int(row[limit_col]) != 0:
+                    limit_constraints[(sid, cid, tid)] = max(0, int(row[limit_col]) - existing_teacher_counts[(sid, cid, tid)])
+                else:
+                    limit_constraints[(sid, cid, tid)] = remaining_sessions
+        if not desired_teachers:
+            desired_teachers = [t for t in all_teachers if cid in teachable_dict.get(t, set())]
+        requests.append({'sid': sid, 'cid': cid, 'sessions': remaining_sessions,
+                         'allowed_teachers': desired_teachers})
+
+    teacher_settings = {row['id']: row.to_dict() for _, row in df_teachers.iterrows()}
+    student_settings = {row['id']: row.to_dict() for _, row in df_students.iterrows()}
+    return {
+        'slot_map': slot_map, 'teachable_dict': teachable_dict,
+        'student_avail_set': student_avail_set, 'teacher_avail_set': teacher_avail_set,
+        'slots_by_date': slots_by_date,
+        'student_busy_slots': student_busy_slots, 'teacher_busy_slots': teacher_busy_slots,
+        'existing_counts': existing_counts, 'existing_teacher_counts': existing_teacher_counts,
+        'existing_slot_counts': existing_slot_counts,
+        'existing_student_subject_date_counts': existing_student_subject_date_counts,
+        'requests': requests, 'limit_constraints': limit_constraints,
+        'student_subject_daily_limit': student_subject_daily_limit,
+        'teacher_settings': teacher_settings, 'student_settings': student_settings,
+    }
+
+
+def iterrows_report(df_final, df_reqs, requests, s_map, c_map):
+    """Reference implementation: the original iterrows unallocated / fulfillment tables."""
+    total_counts = collections.defaultdict(int)
+    for _, row in df_final.iterrows():
+        total_counts[(row['student_id'], row['subject_id'])] += 1
+    unallocated, fulfillment = [], []
+    for _, row in df_reqs.iterrows():
+        sid, cid, total_req = row['student_id'], row['subject_id'], row['sessions']
+        diff = total_req - total_counts[(sid, cid)]
+        if diff > 0:
+            msg = ("要確認（データ不整合?）" if (sid, cid) not in [(r['sid'], r['cid']) for r in requests]
+                   else "枠確保できず（制約による上限）")
+            unallocated.append([sid, cid, diff, s_map.get(sid), c_map.get(cid), msg])
+    for _, row in df_reqs.iterrows():
+        sid, cid, requested = row['student_id'], row['subject_id'], row['sessions']
+        allocated = total_counts[(sid, cid)]
+        rate = allocated / requested if requested > 0 else 0.0
+        fulfillment.append([sid, s_map.get(sid), cid, c_map.get(cid), requested, allocated, round(rate * 100, 1)])
+    return unallocated, fulfillment
+
+
+def same_structures(ref, new):
+    """Names of the prepare_data entries that differ from the reference."""
+    diff = []
+    for key, val in ref.items():
+        other = new[key]
+        if isinstance(val, dict):
+            val = {k: v for k, v in val.items() if v}  # defaultdict が参照時に作る空要素（0, 空集合）を除く
+            other = {k: v for k, v in other.items() if v}
+        if val != other:
+            diff.append(key)
+    return diff
+
+
+def make_campus(target_rows, seed=0):
+    """Normalized inputs with about target_rows student availability rows, and fixed O01 rows."""
+    n_students = max(10, int(round((target_rows / 100) ** 0.5 * 5)))
+    n_days = max(5, target_rows // (n_students * 10 // 2))
+    sheets = generate_instance(n_students, max(5, n_students // 5), n_days, 10, avail_density=0.5,
+                               pref_rate=0.3, seed=seed)
+    dfs = normalize_inputs({key: sheets.get(name, pd.DataFrame()) for key, name in SHEET_NAMES.items()})
+
+    # 既存配置: 生徒の空きの一部に、リクエストの科目と指導可能な講師を割り当てる
+    rng = np.random.default_rng(seed)
+    reqs = dfs['student_reqs']
+    teachers_by_subject = dfs['teachable'].groupby('subject_id')['teacher_id'].apply(list).to_dict()
+    subjects_by_student = reqs.groupby('student_id')['subject_id'].apply(list).to_dict()
+    avail = dfs['student_avail'].sample(frac=0.05, random_state=seed)
+    rows = []
+    for sid, slid in zip(avail['student_id'].tolist(), avail['slot_id'].tolist()):
+        cid = int(rng.choice(subjects_by_student[sid]))
+        tid = int(rng.choice(teachers_by_subject[cid]))
+        rows.append({'slot_id': slid, 'student_id': sid, 'teacher_id': tid, 'subject_id': cid})
+    return dfs, pd.DataFrame(rows)
+
+
+def best_of(repeat, fn, *args):
+    times, out = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        times.append(time.perf_counter() - t0)
+    return min(times), out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000],
+                        help='target student availability rows')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rows = []
+    for target in args.sizes:
+        dfs, df_existing = make_campus(target)
+        t_old, ref = best_of(args.repeat, iterrows_prepare, dfs, df_existing)
+        t_new, data = best_of(args.repeat, prepare_data, dfs, df_existing)
+        differ = same_structures(ref, data)
+        assert not differ, f'prepare_data differs: {differ}'
+
+        df_final = df_existing.copy()
+        args_report = (df_final, dfs['student_reqs'], data['requests'], data['s_map'], data['c_map'])
+        t_old_r, (un_ref, ful_ref) = best_of(args.repeat, iterrows_report, *args_report)
+        t_new_r, (df_un, df_fulfill) = best_of(args.repeat, request_report, *args_report)
+        assert df_un.values.tolist() == un_ref, 'O02 differs'
+        assert df_fulfill.values.tolist() == sorted(ful_ref, key=lambda r: (r[0], r[2])), 'O03 differs'
+
+        rows.append({
+            'avail_rows': len(dfs['student_avail']) + len(dfs['teacher_avail']),
+            'requests': len(dfs['student_reqs']),
+            'existing': len(df_existing),
+            'prep_iterrows_s': round(t_old, 4),
+            'prep_vector_s': round(t_new, 4),
+            'prep_speedup': round(t_old / t_new, 1),
+            'report_iterrows_s': round(t_old_r, 4),
+            'report_vector_s': round(t_new_r, 4),
+            'report_speedup': round(t_old_r / t_new_r, 1),
+        })
+        print(rows[-1], flush=True)
+
+    print()
+    print(pd.DataFrame(rows).to_string(index=False))
+    print("\n出力は旧実装と一致しました。")
+
+
+if __name__ == '__main__':
+    main()
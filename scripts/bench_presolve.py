@@ -0,0 +1,94 @@
+#!/usr/local/bin/python3.11
+"""
+Benchmark: model size and build time with and without the presolve.
+
+Builds the model with presolve off and on (allocation.presolve) on
+synthetic campuses with all constraints enabled and part of a first
+solution fixed as existing O01 allocations, and reports variables, rows,
+build time, solve time, status and objective for each.
+
+Usage:
+    python3.11 scripts/bench_presolve.py [--engine SCIP] [--time-limit 60] [--booths 4]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allocation import build_model, build_outputs, is_solution_status, make_engine, prepare_data  # noqa: E402
+from allocation.inputs import SHEET_NAMES, normalize_inputs  # noqa: E402
+from allocation.synthetic import generate_instance  # noqa: E402
+
+ALL_HARD = {
+    code: {'activated': True, 'value': value}
+    for code, value in [('max_teacher_daily_slot', None), ('max_student_continuous_slot', None),
+                        ('max_student_daily_slot', None), ('max_teacher_continuous_vacant_slot', None),
+                        ('max_student_subject_daily_slot', None)]
+}
+
+
+def solve(dfs, df_existing, flags, presolve, args):
+    """Build and solve once; return (summary row, df_new or None)."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        data = prepare_data(dfs, df_existing)
+        engine = make_engine(args.engine, args.time_limit, args.workers)
+        t0 = time.perf_counter()
+        model = build_model(data, flags, engine, presolve=presolve)
+        build_s = time.perf_counter() - t0
+        status = engine.solve()
+        df_new = build_outputs(data, model)[1] if is_solution_status(status) else None
+    return {
+        'presolve': presolve,
+        'variables': len(model['x']),
+        'rows': engine.num_constraints(),
+        'build_s': round(build_s, 2),
+        'solve_s': round(engine.wall_time, 2),
+        'status': status,
+        'objective': round(engine.objective_value(), 3) if df_new is not None else None,
+    }, df_new
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--engine', default='SCIP')
+    parser.add_argument('--time-limit', type=float, default=60)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--booths', type=float, default=4, help='constraint 4 booths per slot')
+    parser.add_argument('--fixed-share', type=float, default=0.5,
+                        help='share of the first solution fixed as existing O01')
+    args = parser.parse_args()
+
+    flags = dict(ALL_HARD, max_lesson_per_timeslot={'activated': True, 'value': args.booths},
+                 soft_spread_subject_across_days={'activated': True, 'value': 0.1},
+                 soft_student_consecutive_slots={'activated': True, 'value': 0.05})
+    # (生徒数, 講師数, 日数, 1日のコマ数)
+    sizes = [(30, 8, 10, 6), (80, 20, 14, 8), (150, 40, 20, 8)]
+
+    rows = []
+    for n_students, n_teachers, n_days, spd in sizes:
+        sheets = generate_instance(n_students, n_teachers, n_days, spd, avail_density=0.5,
+                                   sessions_per_subject=(2, 6), seed=4)
+        sheets['I07_student_subject']['max_daily_subject_slot'] = 1
+        dfs = normalize_inputs({key: sheets.get(name, pd.DataFrame()) for key, name in SHEET_NAMES.items()})
+        _, df_first = solve(dfs, None, flags, True, args)
+        df_existing = df_first.sample(frac=args.fixed_share, random_state=0).reset_index(drop=True)
+
+        for presolve in [False, True]:
+            row, _ = solve(dfs, df_existing, flags, presolve, args)
+            row = dict({'size': f'{n_students}x{n_teachers}x{n_days * spd}'}, **row)
+            rows.append(row)
+            print(row, flush=True)
+
+    print()
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
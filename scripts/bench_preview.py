@@ -0,0 +1,93 @@
+#!/usr/local/bin/python3.11
+"""
+Benchmark: preview (max-flow bound + greedy schedule) vs the full solve.
+
+For synthetic campuses (all constraints of constraint_frame() ON, booths
+per slot set with --booths) the preview is timed and its greedy schedule is
+checked against the model: it is passed to the MIP as a hint, which
+evaluates it with x fixed ('greedy_ok' = feasible for every hard
+constraint). With --time-limit > 0 the MIP is also solved with the lessons
+only as objective, so the optimum can be compared with the two preview
+numbers.
+
+Usage:
+    python3.11 scripts/bench_preview.py [--sizes 60,15,5,6 200,50,10,6]
+        [--booths 12] [--engine SCIP] [--time-limit 120]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allocation import build_model, is_solution_status, make_engine, prepare_data  # noqa: E402
+from allocation.inputs import SHEET_NAMES, normalize_inputs, parse_constraint_flags  # noqa: E402
+from allocation.preview import preview_schedule  # noqa: E402
+from allocation.synthetic import constraint_frame, generate_instance  # noqa: E402
+from allocation.warmstart import apply_hint  # noqa: E402
+
+
+def solve_lessons(data, flags, keys, args):
+    """Check the greedy schedule as a hint, then maximize the lessons (time_limit > 0)."""
+    df_hint = pd.DataFrame(keys, columns=['student_id', 'subject_id', 'teacher_id', 'slot_id'])
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine = make_engine(args.engine, max(args.time_limit, 1), args.workers)
+        model = build_model(data, flags, engine)
+        info = apply_hint(model, df_hint)
+        if args.time_limit <= 0:
+            return info['accepted'], None, None
+        engine.maximize([(v, 1) for v in model['x'].values()])
+        status = engine.solve()
+    if not is_solution_status(status):
+        return info['accepted'], status, None
+    return info['accepted'], status, round(engine.objective_value())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sizes', nargs='+', default=['60,15,5,6', '200,50,10,6'],
+                        help='n_students,n_teachers,n_days,slots_per_day')
+    parser.add_argument('--booths', type=int, default=12, help='constraint 4 value (lessons per slot)')
+    parser.add_argument('--engine', default='SCIP')
+    parser.add_argument('--time-limit', type=float, default=120, help='0: preview and feasibility check only')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    flags = parse_constraint_flags(constraint_frame(values={'max_lesson_per_timeslot': args.booths}))
+    rows = []
+    for size in args.sizes:
+        n_students, n_teachers, n_days, spd = (int(v) for v in size.split(','))
+        sheets = generate_instance(n_students, n_teachers, n_days, spd, avail_density=0.4,
+                                   pref_rate=0.3, seed=args.seed)
+        dfs = normalize_inputs({key: sheets.get(name, pd.DataFrame()) for key, name in SHEET_NAMES.items()})
+        with contextlib.redirect_stdout(io.StringIO()):
+            data = prepare_data(dfs)
+        preview = preview_schedule(data, flags)
+        greedy_ok, status, optimum = solve_lessons(data, flags, preview['keys'], args)
+        seconds = preview['seconds']
+        rows.append({
+            'size': f'{n_students}x{n_teachers}x{n_days * spd}',
+            'requested': preview['requested'],
+            'candidates': preview['candidates'],
+            'bound': preview['bound'],
+            'bound_s': round(seconds['bound'], 2),
+            'greedy': preview['lessons'],
+            'greedy_s': round(seconds['greedy'], 2),
+            'greedy_ok': greedy_ok,
+            'mip_status': status,
+            'mip_lessons': optimum,
+        })
+        print(rows[-1], flush=True)
+
+    print()
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/local/bin/python3.11
+"""
+Benchmark: memory of the x variable index (dict + defaultdict lists vs VarRegistry).
+
+Builds the candidate table of synthetic campuses (allocation.synthetic,
+the same candidates build_model would create) and, for the same list of
+variable stand-ins, both the former structures - x as a dict keyed by
+(sid, cid, tid, slid) plus the six defaultdict(list) indexes - and the
+array-backed allocation.registry.VarRegistry with its six CSR groupings.
+Reports the traced Python memory (tracemalloc) and the build time of each
+and checks that both give the same groups in the same order. The solver's
+own memory for the variables is the same in both and not included.
+
+Usage:
+    python3.11 scripts/bench_registry.py [--sizes 100,20,20,8 300,60,40,8]
+"""
+
+import argparse
+import collections
+import contextlib
+import gc
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allocation.candidates import build_candidates  # noqa: E402
+from allocation.inputs import SHEET_NAMES, normalize_inputs  # noqa: E402
+from allocation.prep import prepare_data  # noqa: E402
+from allocation.registry import VarRegistry  # noqa: E402
+from allocation.synthetic import generate_instance  # noqa: E402
+
+GROUPS = {
+    'x_by_student_subject': ('sid', 'cid'),
+    'x_by_student_subject_teacher': ('sid', 'cid', 'tid'),
+    'x_by_student_slot': ('sid', 'slid'),
+    'x_by_teacher_slot': ('tid', 'slid'),
+    'x_by_slot': ('slid',),
+    'x_by_student_subject_date': ('sid', 'cid', 'date'),
+}
+
+
+def make_candidates(n_students, n_teachers, n_days, slots_per_day, seed=0):
+    """Candidate table of a synthetic campus (allocation.synthetic + build_candidates) and slot -> date."""
+    sheets = generate_instance(n_students, n_teachers, n_days, slots_per_day, avail_density=0.5,
+                               pref_rate=0.3, seed=seed)
+    dfs = normalize_inputs({key: sheets.get(name, pd.DataFrame()) for key, name in SHEET_NAMES.items()})
+    with contextlib.redirect_stdout(io.StringIO()):
+        data = prepare_data(dfs)
+    df = build_candidates(data['requests'], dfs['teachable'], dfs['student_avail'], dfs['teacher_avail'],
+                          None, data['limit_constraints'])
+    return df, data['slot_to_date']
+
+
+def dict_index(df, variables, slot_to_date):
+    """The former structures: x dict and defaultdict(list) indexes."""
+    x = {}
+    for key, var in zip(df.itertuples(index=False, name=None), variables):
+        x[key] = var
+    indexes = {name: collections.defaultdict(list) for name in GROUPS}
+    for (sid, cid, tid, slid), var in x.items():
+        indexes['x_by_student_subject'][(sid, cid)].append(var)
+        indexes['x_by_student_subject_teacher'][(sid, cid, tid)].append(var)
+        indexes['x_by_student_slot'][(sid, slid)].append(var)
+        indexes['x_by_teacher_slot'][(tid, slid)].append(var)
+        indexes['x_by_slot'][slid].append(var)
+        indexes['x_by_student_subject_date'][(sid, cid, slot_to_date[slid])].append(var)
+    return x, indexes
+
+
+def registry_index(df, variables, slot_to_date):
+    x = VarRegistry(df, variables, slot_to_date)
+    return x, {name: x.group(*cols) for name, cols in GROUPS.items()}
+
+
+def measure(build, *args):
+    """(result, traced MB, seconds) of one build."""
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = build(*args)
+    seconds = time.perf_counter() - t0
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current / 2**20, seconds
+
+
+def same_groups(old, new):
+    """True when every grouping has the same keys in the same order and the same members."""
+    for name in GROUPS:
+        a, b = old[name], new[name]
+        if list(a.keys()) != list(b.keys()):
+            return False
+        if any(a[key] != b[key] for key in list(a.keys())[:2000]):
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sizes', nargs='+', default=['100,20,20,8', '300,60,40,8'],
+                        help='n_students,n_teachers,n_days,slots_per_day')
+    args = parser.parse_args()
+
+    rows = []
+    for size in args.sizes:
+        df, slot_to_date = make_candidates(*(int(v) for v in size.split(',')))
+        n = len(df)
+        variables = [object() for _ in range(n)]  # ソルバー変数の代わり（どちらの方式でも同じリストを参照）
+
+        (x_new, new), new_mb, new_s = measure(registry_index, df, variables, slot_to_date)
+        (x_old, old), old_mb, old_s = measure(dict_index, df, variables, slot_to_date)
+        assert list(x_old.keys())[:1000] == list(x_new.keys())[:1000], 'x keys differ'
+        assert same_groups(old, new), 'groupings differ'
+        del x_old, old, x_new, new
+
+        rows.append({
+            'instance': size,
+            'candidates': n,
+            'dict_mb': round(old_mb, 1),
+            'registry_mb': round(new_mb, 1),
+            'dict_bytes_per_var': round(old_mb * 2**20 / n),
+            'registry_bytes_per_var': round(new_mb * 2**20 / n),
+            'ratio': round(old_mb / new_mb, 1),
+            'dict_build_s': round(old_s, 2),
+            'registry_build_s': round(new_s, 2),
+        })
+        print(rows[-1], flush=True)
+
+    print()
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+#!/usr/local/bin/python3.11
+"""
+Scaling benchmark: synthetic campuses x constraint ON/OFF combinations.
+
+For each instance size a campus is generated with allocation.synthetic,
+written as a CSV directory and read back like real input. The model is then
+built and solved for every ON/OFF combination of constraints 1-6 and soft
+constraints S1/S2 (or a subset, see --combos). Each run records model build
+time, variable and constraint counts, solve time, status, objective, bound
+and MIP gap. The rows are written to a CSV. With --baseline, an earlier
+results CSV is compared and slower runs or changed objectives are reported,
+so performance regressions show up.
+
+Usage:
+    python3.11 scripts/bench_scaling.py [--sizes 20,5,5,4 80,20,10,8] [--combos all]
+        [--time-limit 10] [--out bench_scaling.csv] [--baseline old.csv]
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allocation import (  # noqa: E402
+    build_model, is_solution_status, make_engine, mip_gap, normalize_inputs, parse_constraint_flags,
+    prepare_data, read_csv_dir,
+)
+from allocation.inputs import CONSTRAINT_CODES  # noqa: E402
+from allocation.synthetic import generate_instance, write_instance  # noqa: E402
+
+# 結果 CSV の列名（制約1〜6, ソフト制約1〜2）
+SHORT_NAMES = dict(zip(CONSTRAINT_CODES, ['c1', 'c2', 'c3', 'c4', 'c5', 'c6', 's1', 's2']))
+KEY_COLUMNS = ['instance', 'combo']
+
+
+def combinations(mode):
+    """ON/OFF patterns: 'all' (2^8), 'single' (none, each alone, all) or 'none' / 'full'."""
+    codes = list(CONSTRAINT_CODES)
+    if mode == 'all':
+        return [dict(zip(codes, bits)) for bits in itertools.product([False, True], repeat=len(codes))]
+    if mode == 'single':
+        return ([{code: False for code in codes}]
+                + [{code: code == on for code in codes} for on in codes]
+                + [{code: True for code in codes}])
+    return [{code: mode == 'full' for code in codes}]
+
+
+def combo_label(pattern):
+    """'c1+c4+s2' style label ('none' when everything is OFF)."""
+    return '+'.join(SHORT_NAMES[code] for code, on in pattern.items() if on) or 'none'
+
+
+def run_one(data, base_flags, pattern, args):
+    """Build and solve one combination; return the result columns."""
+    flags = {code: dict(base_flags.get(code, {'value': None}), activated=on) for code, on in pattern.items()}
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine = make_engine(args.engine, args.time_limit, args.workers)
+        t0 = time.perf_counter()
+        model = build_model(data, flags, engine)
+        build_s = time.perf_counter() - t0
+        status = engine.solve()
+    solved = is_solution_status(status)
+    objective = engine.objective_value() if solved else None
+    bound = engine.best_bound() if solved else None
+    gap = mip_gap(engine, status)
+    return {
+        'variables': len(model['x']),
+        'constraints': engine.num_constraints(),
+        'build_s': round(build_s, 3),
+        'solve_s': round(engine.wall_time, 3),
+        'status': status,
+        'objective': round(objective, 4) if solved else None,
+        'bound': round(bound, 4) if solved else None,
+        'gap': round(gap, 6) if solved else None,
+    }
+
+
+def compare_baseline(df, path, tolerance):
+    """Print runs that got slower than tolerance x baseline or whose objective changed."""
+    base = pd.read_csv(path)
+    merged = df.merge(base, on=KEY_COLUMNS, suffixes=('', '_base'))
+    slow_build = merged['build_s'] > tolerance * merged['build_s_base'] + 0.05
+    slow_solve = merged['solve_s'] > tolerance * merged['solve_s_base'] + 0.05
+    changed = ~((merged['objective'] - merged['objective_base']).abs().fillna(0) < 1e-6) \
+        | (merged['status'] != merged['status_base'])
+    print(f"\n📊 ベースライン比較 ({path}, {len(merged)} 件)")
+    for label, mask in [('構築時間の悪化', slow_build), ('求解時間の悪化', slow_solve), ('結果の変化', changed)]:
+        print(f"  {label}: {int(mask.sum())} 件")
+        if mask.any():
+            cols = KEY_COLUMNS + ['build_s', 'build_s_base', 'solve_s', 'solve_s_base',
+                                  'status', 'status_base', 'objective', 'objective_base']
+            print(merged.loc[mask, cols].head(20).to_string(index=False))
+    return int((slow_build | slow_solve | changed).sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sizes', nargs='+', default=['20,5,5,4', '60,15,10,6', '150,30,10,8'],
+                        help='n_students,n_teachers,n_days,slots_per_day[,density[,pref_rate]]')
+    parser.add_argument('--combos', choices=['all', 'single', 'full', 'none'], default='all')
+    parser.add_argument('--engine', default='SCIP')
+    parser.add_argument('--time-limit', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--instances-dir', help='keep the generated CSV directories here')
+    parser.add_argument('--out', default='bench_scaling.csv')
+    parser.add_argument('--baseline', help='earlier results CSV to compare against')
+    parser.add_argument('--tolerance', type=float, default=1.5, help='slowdown factor reported as regression')
+    args = parser.parse_args()
+
+    patterns = combinations(args.combos)
+    tmp = tempfile.TemporaryDirectory() if not args.instances_dir else None
+    root = args.instances_dir or tmp.name
+
+    rows = []
+    for size in args.sizes:
+        parts = size.split(',')
+        n_students, n_teachers, n_days, spd = (int(v) for v in parts[:4])
+        density = float(parts[4]) if len(parts) > 4 else 0.5
+        pref_rate = float(parts[5]) if len(parts) > 5 else 0.3
+        instance = f'{n_students}x{n_teachers}x{n_days}x{spd}_d{density}_p{pref_rate}'
+
+        # 実データと同じく CSV ディレクトリ経由で読み込む
+        csv_dir = os.path.join(root, instance)
+        write_instance(generate_instance(n_students, n_teachers, n_days, spd, avail_density=density,
+                                         pref_rate=pref_rate, seed=args.seed), csv_dir)
+        dfs = read_csv_dir(csv_dir)
+        normalize_inputs(dfs)
+        base_flags = parse_constraint_flags(dfs['constraints'])
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            data = prepare_data(dfs)
+        prep_s = time.perf_counter() - t0
+        print(f"▶ {instance}: 前処理 {prep_s:.2f}秒, {len(patterns)} 通りの制約パターン", flush=True)
+
+        for pattern in patterns:
+            row = dict({'instance': instance, 'combo': combo_label(pattern)},
+                       **{SHORT_NAMES[code]: int(on) for code, on in pattern.items()},
+                       prep_s=round(prep_s, 3), **run_one(data, base_flags, pattern, args))
+            rows.append(row)
+
+        df_inst = pd.DataFrame([r for r in rows if r['instance'] == instance])
+        print(f"  構築 計{df_inst['build_s'].sum():.1f}秒 (最大 {df_inst['build_s'].max():.2f}), "
+              f"求解 計{df_inst['solve_s'].sum():.1f}秒 (最大 {df_inst['solve_s'].max():.2f}), "
+              f"OPTIMAL {int((df_inst['status'] == 'OPTIMAL').sum())}/{len(df_inst)}", flush=True)
+
+    df = pd.DataFrame(rows)
+    df.to_csv(args.out, index=False, encoding='utf-8')
+    print(f"\n💾 {len(df)} 件の結果を {args.out} に保存しました")
+
+    regressions = compare_baseline(df, args.baseline, args.tolerance) if args.baseline else 0
+    if tmp is not None:
+        tmp.cleanup()
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
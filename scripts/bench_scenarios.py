@@ -0,0 +1,90 @@
+#!/usr/local/bin/python3.11
+"""
+Benchmark: scenario sweep (allocation.scenarios) vs one run per scenario.
+
+For a synthetic campus the same grid of constraint-sheet changes (booths per
+slot x constraint 5 on/off, 10 scenarios by default) is solved twice:
+sequentially, each scenario as its own run (prepare_data + build_model +
+solve, what rerunning the notebook does minus the sheet reads), and as one
+solve_scenarios job (inputs and candidates prepared once, scenarios solved
+in --processes worker processes). The table shows the lessons of every
+scenario in both runs and the total wall-clock time of each.
+
+Usage:
+    python3.11 scripts/bench_scenarios.py [--size 80,20,10,6] [--booths 4,6,8,10,12]
+        [--engine SCIP] [--time-limit 30] [--processes 8]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allocation import build_model, is_solution_status, make_engine, prepare_data  # noqa: E402
+from allocation.inputs import SHEET_NAMES, normalize_inputs, parse_constraint_flags  # noqa: E402
+from allocation.scenarios import scenario_grid, solve_scenarios  # noqa: E402
+from allocation.synthetic import constraint_frame, generate_instance  # noqa: E402
+
+
+def run_sequential(dfs, scenarios, args):
+    """One run per scenario; {name: new lessons or None}."""
+    lessons = {}
+    for scenario in scenarios:
+        with contextlib.redirect_stdout(io.StringIO()):
+            data = prepare_data(dfs)
+            engine = make_engine(args.engine, args.time_limit, args.workers)
+            model = build_model(data, scenario['flags'], engine)
+            status = engine.solve()
+        lessons[scenario['name']] = (int(round(engine.values(model['x'].values()).sum()))
+                                     if is_solution_status(status) else None)
+    return lessons
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--size', default='80,20,10,6', help='n_students,n_teachers,n_days,slots_per_day')
+    parser.add_argument('--booths', default='4,6,8,10,12', help='constraint 4 values of the grid')
+    parser.add_argument('--engine', default='SCIP')
+    parser.add_argument('--time-limit', type=float, default=30)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--processes', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    n_students, n_teachers, n_days, spd = (int(v) for v in args.size.split(','))
+    sheets = generate_instance(n_students, n_teachers, n_days, spd, avail_density=0.4, pref_rate=0.3,
+                               seed=args.seed)
+    dfs = normalize_inputs({key: sheets.get(name, pd.DataFrame()) for key, name in SHEET_NAMES.items()})
+    flags = parse_constraint_flags(constraint_frame())
+    grid = {'max_lesson_per_timeslot': [int(v) for v in args.booths.split(',')],
+            'max_teacher_continuous_vacant_slot': [True, False]}
+    # 基準（制約シートそのまま）は比較に使わないので除く
+    scenarios = scenario_grid(flags, grid)[1:]
+
+    t0 = time.perf_counter()
+    sequential = run_sequential(dfs, scenarios, args)
+    sequential_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        data = prepare_data(dfs)
+        df_scenarios = solve_scenarios(data, scenarios, args.engine, args.time_limit, args.workers,
+                                       args.processes)
+    sweep_s = time.perf_counter() - t0
+
+    df = df_scenarios[['シナリオ', '変更内容', 'ステータス', '新規コマ数', '計算時間(秒)']].copy()
+    df['新規コマ数(1回ずつ)'] = df['シナリオ'].map(sequential)
+    print(df.to_string(index=False))
+    print()
+    print(f"{n_students}x{n_teachers}x{n_days * spd}, {len(scenarios)} scenarios: "
+          f"one run each {sequential_s:.1f}s, sweep {sweep_s:.1f}s ({sequential_s / sweep_s:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
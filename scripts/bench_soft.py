@@ -0,0 +1,96 @@
+#!/usr/local/bin/python3.11
+"""
+Benchmark: soft constraints S1 / S2 encodings.
+
+Builds the model with the pairwise encoding (one excess variable per
+student-subject-day, one adjacency variable per slot pair) and with the
+aggregate encoding (build_model soft_encoding, the default) on synthetic
+campuses with every constraint of constraint_frame() ON, and reports the
+auxiliary variables (every variable other than x), rows, build time, solve
+time, status, objective and bound for each. With --with-existing, part of a
+first solution is fixed as existing O01 allocations to exercise the
+追記配置 paths.
+
+Usage:
+    python3.11 scripts/bench_soft.py [--engine SCIP] [--time-limit 60] [--with-existing]
+        [--sizes 40,10,10,6 120,30,10,6]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allocation import build_model, build_outputs, is_solution_status, make_engine, prepare_data  # noqa: E402
+from allocation.inputs import SHEET_NAMES, normalize_inputs, parse_constraint_flags  # noqa: E402
+from allocation.synthetic import constraint_frame, generate_instance  # noqa: E402
+
+ENCODINGS = ('pairwise', 'aggregate')
+
+
+def solve(dfs, df_existing, flags, encoding, args):
+    """Build and solve once; return (summary row, df_new or None)."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        data = prepare_data(dfs, df_existing)
+        engine = make_engine(args.engine, args.time_limit, args.workers)
+        t0 = time.perf_counter()
+        model = build_model(data, flags, engine, soft_encoding=encoding)
+        build_s = time.perf_counter() - t0
+        status = engine.solve()
+        df_new = build_outputs(data, model)[1] if is_solution_status(status) else None
+    x_vars = len(model['x'])
+    return {
+        'encoding': encoding,
+        'variables': x_vars,
+        'aux': engine.num_variables() - x_vars,
+        'rows': engine.num_constraints(),
+        'build_s': round(build_s, 2),
+        'solve_s': round(engine.wall_time, 2),
+        'status': status,
+        'objective': round(engine.objective_value(), 3) if df_new is not None else None,
+        'bound': round(engine.best_bound(), 3) if df_new is not None else None,
+    }, df_new
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--engine', default='SCIP')
+    parser.add_argument('--time-limit', type=float, default=60)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--sizes', nargs='+', default=['40,10,10,6', '120,30,10,6'],
+                        help='n_students,n_teachers,n_days,slots_per_day')
+    parser.add_argument('--booths', type=int, default=12, help='constraint 4 value (lessons per slot)')
+    parser.add_argument('--with-existing', action='store_true')
+    parser.add_argument('--seed', type=int, default=2)
+    args = parser.parse_args()
+
+    flags = parse_constraint_flags(constraint_frame(values={'max_lesson_per_timeslot': args.booths}))
+    rows = []
+    for size in args.sizes:
+        n_students, n_teachers, n_days, spd = (int(v) for v in size.split(','))
+        sheets = generate_instance(n_students, n_teachers, n_days, spd, avail_density=0.4,
+                                   pref_rate=0.3, seed=args.seed)
+        dfs = normalize_inputs({key: sheets.get(name, pd.DataFrame()) for key, name in SHEET_NAMES.items()})
+        df_existing = None
+        if args.with_existing:
+            _, df_new = solve(dfs, None, flags, 'aggregate', args)
+            df_existing = df_new.iloc[::2].reset_index(drop=True) if df_new is not None else None
+
+        for encoding in ENCODINGS:
+            row, _ = solve(dfs, df_existing, flags, encoding, args)
+            row = dict({'size': f'{n_students}x{n_teachers}x{n_days * spd}'}, **row)
+            rows.append(row)
+            print(row, flush=True)
+
+    print()
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/local/bin/python3.11
+"""
+Run the allocation on a CSV directory without Colab or the spreadsheet.
+
+Reads the input sheets in the sample_sheet/ layout (e.g. parse_pdfs.py
+output/), prints the same diagnostics as the Colab cells, solves and writes
+O01/O02/O03 (and the run record O04 .csv / .json) as CSV files. By default
+they are written into the input directory, so a second run adds to the
+existing O01 like the spreadsheet does. The exit status is 0 when a
+solution was found (or nothing was left to allocate) and 1 otherwise.
+
+Usage:
+    python3.11 scripts/run_allocation.py sample_sheet [--out-dir out] [--engine CP-SAT]
+        [--time-limit 30] [--existing-mode fix|hint] [--hint-file last.csv]
+        [--decompose] [--rolling [--lookahead 1]] [--cache-dir .input_cache]
+        [--model-cache-dir .model_cache [--model-cache-max-mb 500]]
+        [--snapshot out/anytime] [--gap-limit 1] [--lexicographic [--phase2-time-limit 30]] [--symmetry]
+        [--preview] [--lns [--processes 8]]
+        [--scenario max_lesson_per_timeslot=3,4 --scenario max_teacher_continuous_vacant_slot=on,off]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allocation import ENGINES, run_csv_dir  # noqa: E402
+from allocation.model_cache import DEFAULT_MAX_MB  # noqa: E402
+from allocation.scenarios import parse_scenario_option  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('csv_dir')
+    parser.add_argument('--out-dir', help="output directory (default: csv_dir; '' writes nothing)")
+    parser.add_argument('--engine', choices=list(ENGINES), default='SCIP')
+    parser.add_argument('--time-limit', type=float, default=30, help='seconds (per week with --rolling)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 8)
+    parser.add_argument('--existing-mode', choices=['fix', 'hint'], default='fix')
+    parser.add_argument('--hint-file', help='solution file (O01 layout CSV) used as the initial solution')
+    parser.add_argument('--save-solution', help='also save the schedule as a solution file here')
+    parser.add_argument('--decompose', action='store_true', help='solve independent groups in parallel')
+    parser.add_argument('--processes', type=int, help='processes for --decompose / --lns / --scenario (default: CPU count)')
+    parser.add_argument('--rolling', action='store_true', help='solve week by week')
+    parser.add_argument('--lookahead', type=int, default=1, help='look-ahead weeks for --rolling')
+    parser.add_argument('--no-diagnostics', action='store_true', help='skip the input diagnostic report')
+    parser.add_argument('--no-elastic', action='store_true',
+                        help='skip the slack-minimizing re-solve when the model is INFEASIBLE')
+    parser.add_argument('--cache-dir', help='input cache (Parquet); unchanged files are not parsed again')
+    parser.add_argument('--model-cache-dir',
+                        help='model / solution cache; unchanged inputs and settings skip the build (and the solve)')
+    parser.add_argument('--model-cache-max-mb', type=float, default=DEFAULT_MAX_MB,
+                        help='size limit of --model-cache-dir (least recently used entries are removed)')
+    parser.add_argument('--snapshot', help='write every improved schedule to <SNAPSHOT>_O01/_O03/_progress.csv')
+    parser.add_argument('--gap-limit', type=float, help='stop once the optimality gap is below this many percent')
+    parser.add_argument('--lexicographic', action='store_true',
+                        help='maximize the lessons first, then the soft constraints with the lessons kept')
+    parser.add_argument('--phase2-time-limit', type=float, help='time limit of the soft-constraint phase (default: --time-limit)')
+    parser.add_argument('--symmetry', action='store_true',
+                        help='order interchangeable teachers / students by their new lessons (symmetry breaking)')
+    parser.add_argument('--preview', action='store_true',
+                        help='no MIP: print the max-flow upper bound and output the greedy schedule '
+                             '(written only with --out-dir / --save-solution)')
+    parser.add_argument('--lns', action='store_true',
+                        help='improve the schedule by re-solving dates / teachers / subjects in parallel (LNS)')
+    parser.add_argument('--scenario', action='append', default=[], metavar='CODE=V1,V2',
+                        help='compare constraint-sheet settings instead of allocating (on / off or values; '
+                             'repeat for a grid, writes O07 only)')
+    args = parser.parse_args()
+    try:
+        scenarios = dict(parse_scenario_option(text) for text in args.scenario)
+    except ValueError as e:
+        parser.error(str(e))
+
+    result = run_csv_dir(
+        args.csv_dir, args.out_dir, existing_mode=args.existing_mode, hint_file=args.hint_file,
+        save_solution=args.save_solution, diagnostics=not args.no_diagnostics, cache_dir=args.cache_dir,
+        engine_name=args.engine, time_limit=args.time_limit, num_workers=args.workers,
+        decompose=args.decompose, decompose_processes=args.processes,
+        rolling=args.rolling, lookahead_weeks=args.lookahead, elastic=not args.no_elastic,
+        snapshot=args.snapshot, gap_limit=args.gap_limit / 100 if args.gap_limit is not None else None,
+        lexicographic=args.lexicographic, phase2_time_limit=args.phase2_time_limit, symmetry=args.symmetry,
+        preview=args.preview, lns=args.lns, scenarios=scenarios,
+        model_cache_dir=args.model_cache_dir, model_cache_max_mb=args.model_cache_max_mb,
+    )
+    sys.exit(0 if result is None or result['outputs'] is not None or result['scenarios'] is not None else 1)
+
+
+if __name__ == '__main__':
+    main()